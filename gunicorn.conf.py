@@ -0,0 +1,38 @@
+import os
+import multiprocessing
+
+# Настройки gunicorn для SCVP: gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Модель: несколько рабочих процессов (по ядрам) и в каждом - пул потоков.
+# Процессы нагружают все ядра (хэширование паролей, сравнение версий,
+# упаковка архивов), а потоки держат медленные загрузки и скачивания, не
+# занимая целый процесс на каждое соединение.
+#
+# Плавный перезапуск (новый код или настройки): kill -HUP <pid мастера>.
+# Мастер запускает новые процессы, а старые перестают принимать
+# соединения и дорабатывают начатые запросы (в том числе загрузки) в
+# течение graceful_timeout.
+
+bind = os.environ.get('SCVP_BIND', '0.0.0.0:8000')
+
+workers = int(os.environ.get('SCVP_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+# То же значение приложение читает как REQUEST_THREADS (см. server/passwords.py)
+threads = int(os.environ.get('SCVP_THREADS', 4))
+
+# Приложение создаётся в каждом процессе после fork, а не в мастере:
+# иначе процессы унаследовали бы общие соединения с базой
+preload_app = False
+
+# Загрузка большого файла - это один долгий запрос; обрывать его рано нельзя
+timeout = int(os.environ.get('SCVP_TIMEOUT', 300))
+graceful_timeout = int(os.environ.get('SCVP_GRACEFUL_TIMEOUT', 300))
+keepalive = 5
+
+# Перезапускать процесс после стольких запросов (ограничивает рост памяти);
+# jitter не даёт всем процессам перезапуститься одновременно
+max_requests = 10000
+max_requests_jitter = 1000
+
+accesslog = '-'
+errorlog = '-'
@@ -0,0 +1,52 @@
+"""repository head
+
+Revision ID: 4afa4af1f11c
+Revises: beae0bd8df01
+Create Date: 2026-10-18 10:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4afa4af1f11c'
+down_revision = 'beae0bd8df01'
+branch_labels = None
+depends_on = None
+
+
+repositories = sa.table('repositories',
+    sa.column('id', sa.Integer()),
+    sa.column('head_version', sa.Integer())
+)
+commits = sa.table('commits',
+    sa.column('repo_id', sa.Integer()),
+    sa.column('version_number', sa.Integer())
+)
+
+
+def upgrade():
+    with op.batch_alter_table('repositories', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('head_version', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('head_hash', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('head_tree', sa.String(length=64), nullable=True))
+
+    # Номер последней версии; голову (head_hash) при первом коммите
+    # advance_head возьмёт из истории
+    op.execute(repositories.update().values(
+        head_version=sa.select(sa.func.coalesce(sa.func.max(commits.c.version_number), 0))
+        .where(commits.c.repo_id == repositories.c.id)
+        .scalar_subquery()
+    ))
+
+    with op.batch_alter_table('repositories', schema=None) as batch_op:
+        batch_op.alter_column('head_version', existing_type=sa.Integer(), existing_nullable=False,
+                              server_default=None)
+
+
+def downgrade():
+    with op.batch_alter_table('repositories', schema=None) as batch_op:
+        batch_op.drop_column('head_tree')
+        batch_op.drop_column('head_hash')
+        batch_op.drop_column('head_version')
@@ -0,0 +1,26 @@
+"""repository deleted_at
+
+Revision ID: 8c4e61d2a5f3
+Revises: d56b47e1add8
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4e61d2a5f3'
+down_revision = 'd56b47e1add8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('repositories', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('repositories', schema=None) as batch_op:
+        batch_op.drop_column('deleted_at')
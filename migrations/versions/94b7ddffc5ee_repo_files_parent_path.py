@@ -0,0 +1,54 @@
+"""repo_files parent_path
+
+Revision ID: 94b7ddffc5ee
+Revises: cdffa5d097c3
+Create Date: 2026-10-18 10:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '94b7ddffc5ee'
+down_revision = 'cdffa5d097c3'
+branch_labels = None
+depends_on = None
+
+
+repo_files = sa.table('repo_files',
+    sa.column('id', sa.Integer()),
+    sa.column('filepath', sa.String()),
+    sa.column('parent_path', sa.String())
+)
+
+
+def upgrade():
+    with op.batch_alter_table('repo_files', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('parent_path', sa.String(length=500), nullable=False, server_default=''))
+
+    # Папка каждого файла - путь до последнего '/'
+    bind = op.get_bind()
+    for file_id, filepath in bind.execute(sa.select(repo_files.c.id, repo_files.c.filepath)).all():
+        parent_path = filepath.rpartition('/')[0]
+        if parent_path:
+            bind.execute(repo_files.update().where(repo_files.c.id == file_id).values(parent_path=parent_path))
+
+    # Повторные записи одного пути (остаются самые новые) мешают уникальному ключу
+    op.execute(
+        'DELETE FROM repo_files WHERE id NOT IN '
+        '(SELECT MAX(id) FROM repo_files GROUP BY repo_id, filepath)'
+    )
+
+    with op.batch_alter_table('repo_files', schema=None) as batch_op:
+        batch_op.alter_column('parent_path', existing_type=sa.String(length=500), existing_nullable=False,
+                              server_default=None)
+        batch_op.create_unique_constraint('uq_repo_files_repo_path', ['repo_id', 'filepath'])
+        batch_op.create_index('ix_repo_files_repo_parent', ['repo_id', 'parent_path'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('repo_files', schema=None) as batch_op:
+        batch_op.drop_index('ix_repo_files_repo_parent')
+        batch_op.drop_constraint('uq_repo_files_repo_path', type_='unique')
+        batch_op.drop_column('parent_path')
@@ -0,0 +1,70 @@
+"""repository stats
+
+Revision ID: 9b32dac0d797
+Revises: f4f8388d9864
+Create Date: 2026-10-18 11:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b32dac0d797'
+down_revision = 'f4f8388d9864'
+branch_labels = None
+depends_on = None
+
+
+repositories = sa.table('repositories',
+    sa.column('id', sa.Integer()),
+    sa.column('commit_count', sa.Integer()),
+    sa.column('file_count', sa.Integer()),
+    sa.column('total_size', sa.BigInteger())
+)
+commits = sa.table('commits',
+    sa.column('repo_id', sa.Integer())
+)
+repo_files = sa.table('repo_files',
+    sa.column('repo_id', sa.Integer()),
+    sa.column('size', sa.BigInteger()),
+    sa.column('is_directory', sa.Boolean())
+)
+
+
+def upgrade():
+    with op.batch_alter_table('repositories', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('commit_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('file_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('total_size', sa.BigInteger(), nullable=False, server_default='0'))
+        batch_op.create_index('ix_repositories_user_updated', ['user_id', 'updated_at'], unique=False)
+
+    # Счётчики существующих репозиториев считаются по коммитам и файлам
+    files = sa.or_(repo_files.c.is_directory.is_(False), repo_files.c.is_directory.is_(None))
+    op.execute(repositories.update().values(
+        commit_count=sa.select(sa.func.count())
+        .where(commits.c.repo_id == repositories.c.id)
+        .scalar_subquery(),
+        file_count=sa.select(sa.func.count())
+        .where(repo_files.c.repo_id == repositories.c.id, files)
+        .scalar_subquery(),
+        total_size=sa.select(sa.func.coalesce(sa.func.sum(repo_files.c.size), 0))
+        .where(repo_files.c.repo_id == repositories.c.id, files)
+        .scalar_subquery()
+    ))
+
+    with op.batch_alter_table('repositories', schema=None) as batch_op:
+        batch_op.alter_column('commit_count', existing_type=sa.Integer(), existing_nullable=False,
+                              server_default=None)
+        batch_op.alter_column('file_count', existing_type=sa.Integer(), existing_nullable=False,
+                              server_default=None)
+        batch_op.alter_column('total_size', existing_type=sa.BigInteger(), existing_nullable=False,
+                              server_default=None)
+
+
+def downgrade():
+    with op.batch_alter_table('repositories', schema=None) as batch_op:
+        batch_op.drop_index('ix_repositories_user_updated')
+        batch_op.drop_column('total_size')
+        batch_op.drop_column('file_count')
+        batch_op.drop_column('commit_count')
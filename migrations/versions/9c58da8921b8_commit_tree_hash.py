@@ -0,0 +1,26 @@
+"""commit tree_hash
+
+Revision ID: 9c58da8921b8
+Revises: 3f1c2a9b7d10
+Create Date: 2026-10-18 10:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c58da8921b8'
+down_revision = '3f1c2a9b7d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('commits', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('tree_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('commits', schema=None) as batch_op:
+        batch_op.drop_column('tree_hash')
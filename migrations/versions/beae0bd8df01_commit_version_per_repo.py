@@ -0,0 +1,27 @@
+"""commit version per repository
+
+Revision ID: beae0bd8df01
+Revises: 94b7ddffc5ee
+Create Date: 2026-10-18 10:40:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'beae0bd8df01'
+down_revision = '94b7ddffc5ee'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('commits', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_commits_repo_version', ['repo_id', 'version_number'])
+        batch_op.create_index('ix_commits_repo_created', ['repo_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('commits', schema=None) as batch_op:
+        batch_op.drop_index('ix_commits_repo_created')
+        batch_op.drop_constraint('uq_commits_repo_version', type_='unique')
@@ -0,0 +1,39 @@
+"""collaborators
+
+Revision ID: d45a8f3c9e27
+Revises: b27d9e4f0c61
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd45a8f3c9e27'
+down_revision = 'b27d9e4f0c61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('collaborators',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('repo_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('role', sa.String(length=10), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['repo_id'], ['repositories.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('repo_id', 'user_id', name='uq_collaborators_repo_user')
+    )
+    with op.batch_alter_table('collaborators', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_collaborators_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('collaborators', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_collaborators_user_id'))
+
+    op.drop_table('collaborators')
@@ -0,0 +1,26 @@
+"""repo_files size bigint
+
+Revision ID: d56b47e1add8
+Revises: 9b32dac0d797
+Create Date: 2026-10-18 11:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd56b47e1add8'
+down_revision = '9b32dac0d797'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('repo_files', schema=None) as batch_op:
+        batch_op.alter_column('size', existing_type=sa.Integer(), type_=sa.BigInteger(), existing_nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('repo_files', schema=None) as batch_op:
+        batch_op.alter_column('size', existing_type=sa.BigInteger(), type_=sa.Integer(), existing_nullable=False)
@@ -0,0 +1,40 @@
+"""commit hash unique per repository
+
+Revision ID: dd64b3ef6f12
+Revises: 4afa4af1f11c
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'dd64b3ef6f12'
+down_revision = '4afa4af1f11c'
+branch_labels = None
+depends_on = None
+
+
+# Безымянное ограничение UNIQUE (commit_hash) из исходной схемы получает
+# в SQLite имя по этому шаблону, чтобы его можно было удалить
+naming_convention = {'uq': 'uq_%(table_name)s_%(column_0_name)s'}
+
+
+def upgrade():
+    name = 'uq_commits_commit_hash'
+    for constraint in sa.inspect(op.get_bind()).get_unique_constraints('commits'):
+        if constraint['column_names'] == ['commit_hash'] and constraint['name']:
+            name = constraint['name']  # PostgreSQL: commits_commit_hash_key
+
+    with op.batch_alter_table('commits', schema=None, naming_convention=naming_convention) as batch_op:
+        batch_op.drop_constraint(name, type_='unique')
+        batch_op.create_index(batch_op.f('ix_commits_commit_hash'), ['commit_hash'], unique=False)
+        batch_op.create_unique_constraint('uq_commits_repo_hash', ['repo_id', 'commit_hash'])
+
+
+def downgrade():
+    with op.batch_alter_table('commits', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_commits_repo_hash', type_='unique')
+        batch_op.drop_index(batch_op.f('ix_commits_commit_hash'))
+        batch_op.create_unique_constraint('uq_commits_commit_hash', ['commit_hash'])
@@ -0,0 +1,28 @@
+"""user api token
+
+Revision ID: f4f8388d9864
+Revises: dd64b3ef6f12
+Create Date: 2026-10-18 11:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4f8388d9864'
+down_revision = 'dd64b3ef6f12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('api_token_hash', sa.String(length=64), nullable=True))
+        batch_op.create_unique_constraint('uq_users_api_token_hash', ['api_token_hash'])
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_users_api_token_hash', type_='unique')
+        batch_op.drop_column('api_token_hash')
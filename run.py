@@ -1,24 +1,10 @@
-from server import create_app, db
+from server import create_app
+from server.commands import upgrade_database
 import os
 
 # Создаём приложение
 app = create_app()
 
-# Создаём таблицы и выполняем инициализацию
-with app.app_context():
-    # Создаём папку для хранения если её нет
-    os.makedirs('storage', exist_ok=True)
-    
-    # Создаём таблицы в базе данных
-    db.create_all()
-    
-    # Проверяем, есть ли пользователи
-    from server.models import User
-    user_count = User.query.count()
-    print(f"✅ База данных инициализирована")
-    print(f"✅ Создано таблиц: 1 (users)")
-    print(f"✅ Пользователей в базе: {user_count}")
-
 if __name__ == '__main__':
     print("=" * 50)
     print("🚀 Запуск SCVP сервера...")
@@ -28,4 +14,11 @@ if __name__ == '__main__':
     print("🚀 Регистрация: http://localhost:5000/auth/register")
     print("=" * 50)
     print("🛑 Для остановки нажмите Ctrl+C")
+    
+    # Сервер для разработки: схему базы создаём или обновляем сразу, как
+    # команда flask init-db (в production её запускают отдельно, см. wsgi.py)
+    with app.app_context():
+        os.makedirs('storage', exist_ok=True)
+        upgrade_database(app)
+    
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
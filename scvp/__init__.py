@@ -0,0 +1,4 @@
+"""Консольный клиент SCVP: рабочая копия и синхронизация с сервером
+
+Запуск: python -m scvp <команда>
+"""
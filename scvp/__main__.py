@@ -0,0 +1,3 @@
+from scvp.cli import main
+
+main()
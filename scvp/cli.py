@@ -0,0 +1,252 @@
+import os
+import sys
+import json
+import getpass
+import argparse
+import tempfile
+
+from scvp.remote import Remote, RemoteError
+from scvp.workdir import WorkingCopy
+
+CREDENTIALS_FILE = os.path.join(os.path.expanduser('~'), '.scvp', 'credentials.json')
+DEFAULT_SERVER = 'http://localhost:5000'
+# Объекты отправляются пакетами примерно такого размера: запросы остаются
+# короткими, а прерванный push продолжается с неотправленных пакетов
+PUSH_BATCH_SIZE = 4 * 1024 * 1024
+
+
+def load_credentials():
+    if not os.path.exists(CREDENTIALS_FILE):
+        return {}
+    with open(CREDENTIALS_FILE, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_token(server, token):
+    credentials = load_credentials()
+    credentials[server.rstrip('/')] = token
+    os.makedirs(os.path.dirname(CREDENTIALS_FILE), exist_ok=True)
+    with open(CREDENTIALS_FILE, 'w', encoding='utf-8') as f:
+        json.dump(credentials, f, indent=2)
+    try:
+        os.chmod(CREDENTIALS_FILE, 0o600)
+    except OSError:
+        pass
+
+def get_remote(server):
+    return Remote(server, load_credentials().get(server.rstrip('/')))
+
+def open_working_copy():
+    working_copy = WorkingCopy.find()
+    if working_copy is None:
+        sys.exit('✗ Здесь нет рабочей копии SCVP. Выполните scvp init или scvp clone')
+    return working_copy
+
+
+def cmd_login(args):
+    """Получить токен для работы с сервером"""
+    username = args.username or input('Имя пользователя: ')
+    password = getpass.getpass('Пароль: ')
+    token = Remote(args.server).login(username, password)
+    save_token(args.server, token)
+    print(f'✓ Вход выполнен: {username}')
+
+def cmd_init(args):
+    """Связать папку с репозиторием на сервере"""
+    os.makedirs(args.path, exist_ok=True)
+    if os.path.isdir(os.path.join(args.path, '.scvp')):
+        sys.exit('✗ Рабочая копия уже существует')
+
+    WorkingCopy.init(args.path, args.server, args.repo)
+    print(f'✓ Рабочая копия создана для репозитория #{args.repo}')
+
+    head = get_remote(args.server).head(args.repo)
+    if head['commit']:
+        print(f'ℹ На сервере уже есть версия #{head["version"]}, выполните scvp pull')
+
+def cmd_clone(args):
+    """Скачать репозиторий в новую папку"""
+    path = args.path or f'repo-{args.repo}'
+    if os.path.exists(path) and os.listdir(path):
+        sys.exit(f'✗ Папка {path} не пуста')
+
+    os.makedirs(path, exist_ok=True)
+    working_copy = WorkingCopy.init(path, args.server, args.repo)
+    pull(working_copy, None)
+
+def cmd_status(args):
+    """Показать изменения относительно последнего коммита"""
+    working_copy = open_working_copy()
+    added, modified, deleted = working_copy.status()
+    head = working_copy.head
+    pending = working_copy.pending
+
+    print(f'Версия сервера: #{head["version"]}' + (f', неотправленных коммитов: {len(pending)}' if pending else ''))
+    if not (added or modified or deleted):
+        print('Изменений нет')
+    for path in added:
+        print(f'  добавлен:  {path}')
+    for path in modified:
+        print(f'  изменён:   {path}')
+    for path in deleted:
+        print(f'  удалён:    {path}')
+
+def cmd_commit(args):
+    """Зафиксировать изменения локально (на сервер их отправляет scvp push)"""
+    working_copy = open_working_copy()
+    files = working_copy.scan()
+
+    # Содержимое запоминается сразу: до push файлы могут измениться
+    added, modified, deleted = working_copy.status(files)
+    if not (added or modified or deleted):
+        print('Нечего коммитить')
+        return
+
+    for path in added + modified:
+        working_copy.objects.write_file(os.path.join(working_copy.root, *path.split('/')), files[path][0])
+
+    tree = working_copy.objects.build_tree(files)
+    working_copy.pending = working_copy.pending + [{'tree': tree, 'message': args.message}]
+    print(f'✓ Коммит создан: +{len(added)} ~{len(modified)} -{len(deleted)}')
+
+def send_objects(working_copy, remote, object_hashes):
+    """Отправить объекты на сервер пакетами по PUSH_BATCH_SIZE байт"""
+    remaining = iter(object_hashes)
+    while True:
+        with tempfile.TemporaryFile() as stream:
+            if not working_copy.objects.write_stream(remaining, stream, PUSH_BATCH_SIZE):
+                return
+            size = stream.tell()
+            stream.seek(0)
+            remote.send_objects(working_copy.config['repo_id'], stream, size)
+
+def cmd_push(args):
+    """Отправить локальные коммиты на сервер"""
+    working_copy = open_working_copy()
+    config = working_copy.config
+    remote = get_remote(config['server'])
+    pending = working_copy.pending
+
+    if not pending:
+        print('Нечего отправлять')
+        return
+
+    while pending:
+        commit = pending[0]
+        head = working_copy.head
+
+        # Отправляем только объекты, которых нет в предыдущей версии и на сервере
+        known = working_copy.objects.tree_objects(head['tree'])
+        candidates = working_copy.objects.tree_objects(commit['tree']) - known
+        missing = remote.negotiate(config['repo_id'], sorted(candidates))
+
+        send_objects(working_copy, remote, missing)
+
+        # Все объекты уже на сервере - коммит создаётся с пустым потоком
+        with tempfile.TemporaryFile() as stream:
+            working_copy.objects.write_stream([], stream)
+            size = stream.tell()
+            stream.seek(0)
+            try:
+                result = remote.push(config['repo_id'], stream, size, commit['tree'], head['commit'], commit['message'])
+            except RemoteError as e:
+                if e.status == 409:
+                    sys.exit('✗ На сервере есть новые изменения. Выполните scvp pull')
+                raise
+
+        working_copy.head = {'version': result['version'], 'commit': result['commit'], 'tree': result['tree']}
+        pending = pending[1:]
+        working_copy.pending = pending
+        print(f'✓ Версия #{result["version"]}: {commit["message"]} (объектов отправлено: {len(missing)})')
+
+def pull(working_copy, version, force=False):
+    config = working_copy.config
+    remote = get_remote(config['server'])
+    head = working_copy.head
+
+    if working_copy.pending:
+        sys.exit('✗ Есть неотправленные коммиты. Сначала выполните scvp push')
+
+    if not force and any(working_copy.status()):
+        sys.exit('✗ Есть незакоммиченные изменения. Закоммитьте их или используйте --force')
+
+    if version is None:
+        remote_head = remote.head(config['repo_id'])
+        if remote_head['commit'] == head['commit']:
+            print('Уже актуально')
+            return
+
+    # Сервер сравнивает нужную версию с нашей и присылает только отличия
+    with remote.fetch(config['repo_id'], version, head['tree']) as response:
+        received = working_copy.objects.read_stream(response)
+        target = {
+            'version': int(response.headers['X-SCVP-Version']),
+            'commit': response.headers['X-SCVP-Commit'],
+            'tree': response.headers['X-SCVP-Tree'],
+        }
+
+    changed = working_copy.checkout(head['tree'], target['tree'])
+    working_copy.head = target
+    print(f'✓ Версия #{target["version"]}: изменено файлов {changed}, получено объектов {received}')
+
+def cmd_pull(args):
+    """Получить изменения с сервера"""
+    pull(open_working_copy(), args.version, args.force)
+
+def cmd_log(args):
+    """История коммитов на сервере"""
+    working_copy = open_working_copy()
+    config = working_copy.config
+    result = get_remote(config['server']).commits(config['repo_id'], limit=args.limit)
+
+    for commit in result['commits']:
+        marker = '*' if commit['commit'] == working_copy.head['commit'] else ' '
+        print(f"{marker} #{commit['version']:<5} {commit['commit'][:8]}  {commit['created_at'][:16]}  {commit['message']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='scvp', description='Клиент системы контроля версий SCVP')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    login_parser = subparsers.add_parser('login', help='Войти на сервер')
+    login_parser.add_argument('server', nargs='?', default=DEFAULT_SERVER)
+    login_parser.add_argument('-u', '--username')
+    login_parser.set_defaults(func=cmd_login)
+
+    init_parser = subparsers.add_parser('init', help='Создать рабочую копию')
+    init_parser.add_argument('path', nargs='?', default='.')
+    init_parser.add_argument('-r', '--repo', type=int, required=True, help='Номер репозитория на сервере')
+    init_parser.add_argument('-s', '--server', default=DEFAULT_SERVER)
+    init_parser.set_defaults(func=cmd_init)
+
+    clone_parser = subparsers.add_parser('clone', help='Скачать репозиторий')
+    clone_parser.add_argument('repo', type=int)
+    clone_parser.add_argument('path', nargs='?')
+    clone_parser.add_argument('-s', '--server', default=DEFAULT_SERVER)
+    clone_parser.set_defaults(func=cmd_clone)
+
+    status_parser = subparsers.add_parser('status', help='Показать изменения')
+    status_parser.set_defaults(func=cmd_status)
+
+    commit_parser = subparsers.add_parser('commit', help='Зафиксировать изменения')
+    commit_parser.add_argument('-m', '--message', required=True)
+    commit_parser.set_defaults(func=cmd_commit)
+
+    push_parser = subparsers.add_parser('push', help='Отправить коммиты на сервер')
+    push_parser.set_defaults(func=cmd_push)
+
+    pull_parser = subparsers.add_parser('pull', help='Получить изменения с сервера')
+    pull_parser.add_argument('-v', '--version', type=int, help='Номер версии (по умолчанию последняя)')
+    pull_parser.add_argument('-f', '--force', action='store_true', help='Перезаписать незакоммиченные изменения')
+    pull_parser.set_defaults(func=cmd_pull)
+
+    log_parser = subparsers.add_parser('log', help='История коммитов')
+    log_parser.add_argument('-n', '--limit', type=int, default=20)
+    log_parser.set_defaults(func=cmd_log)
+
+    args = parser.parse_args(argv)
+    try:
+        args.func(args)
+    except RemoteError as e:
+        sys.exit(f'✗ {e}')
+    except OSError as e:
+        sys.exit(f'✗ Ошибка: {e}')
@@ -0,0 +1,242 @@
+import os
+import json
+import zlib
+import struct
+import hashlib
+import uuid
+
+# Локальное хранилище объектов клиента (.scvp/objects) и форматы,
+# совпадающие с серверными: дерево папки (server/trees.py) и поток
+# объектов для синхронизации (server/sync.py).
+
+TREE_BLOB = 'blob'
+TREE_DIR = 'tree'
+
+STREAM_MAGIC = b'SCVP-OBJECTS-1\n'
+END_MARKER = b'\0' * 32
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_bytes(content):
+    """Хэш содержимого (как calculate_file_hash на сервере)"""
+    return hashlib.sha256(content).hexdigest()
+
+
+class ObjectStore:
+    """Хранилище объектов в папке .scvp/objects"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def object_path(self, object_hash):
+        return os.path.join(self.path, object_hash[:2], object_hash[2:])
+
+    def exists(self, object_hash):
+        return os.path.exists(self.object_path(object_hash))
+
+    def _tmp_file(self):
+        tmp_path = os.path.join(self.path, 'tmp')
+        os.makedirs(tmp_path, exist_ok=True)
+        return os.path.join(tmp_path, uuid.uuid4().hex)
+
+    def _store(self, tmp_file, object_hash):
+        object_path = self.object_path(object_hash)
+        if os.path.exists(object_path):
+            os.remove(tmp_file)
+        else:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            os.replace(tmp_file, object_path)
+        return object_hash
+
+    def write(self, content):
+        """Записать объект, вернуть его хэш"""
+        object_hash = hash_bytes(content)
+        if not self.exists(object_hash):
+            tmp_file = self._tmp_file()
+            with open(tmp_file, 'wb') as f:
+                f.write(content)
+            self._store(tmp_file, object_hash)
+        return object_hash
+
+    def write_file(self, path, object_hash):
+        """Записать в хранилище файл рабочей копии с уже известным хэшем"""
+        if not self.exists(object_hash):
+            tmp_file = self._tmp_file()
+            with open(path, 'rb') as src, open(tmp_file, 'wb') as dest:
+                for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                    dest.write(chunk)
+            self._store(tmp_file, object_hash)
+        return object_hash
+
+    def read(self, object_hash):
+        with open(self.object_path(object_hash), 'rb') as f:
+            return f.read()
+
+    def all_hashes(self):
+        """Перечислить хэши всех локальных объектов"""
+        if not os.path.exists(self.path):
+            return
+        for prefix in os.listdir(self.path):
+            if len(prefix) != 2:
+                continue
+            for rest in os.listdir(os.path.join(self.path, prefix)):
+                yield prefix + rest
+
+    # Деревья
+
+    def write_tree(self, entries):
+        """Записать дерево {имя: {'type', 'hash', 'size'}} в формате сервера"""
+        data = [
+            [name, entry['type'], entry['hash'], entry['size']]
+            for name, entry in sorted(entries.items())
+        ]
+        content = json.dumps({'entries': data}, separators=(',', ':'), ensure_ascii=False)
+        return self.write(content.encode('utf-8'))
+
+    def read_tree(self, tree_hash):
+        if not tree_hash:
+            return {}
+        entries = {}
+        for name, entry_type, entry_hash, size in json.loads(self.read(tree_hash))['entries']:
+            entries[name] = {'type': entry_type, 'hash': entry_hash, 'size': size}
+        return entries
+
+    def build_tree(self, files):
+        """Построить дерево из {путь: (хэш, размер)}, вернуть хэш корня"""
+        root = {}
+        for path, value in files.items():
+            node = root
+            *dirs, name = path.split('/')
+            for dirname in dirs:
+                node = node.setdefault(dirname, {})
+            node[name] = value
+
+        def write_node(node):
+            entries = {}
+            for name, value in node.items():
+                if isinstance(value, dict):
+                    tree_hash, size = write_node(value)
+                    entries[name] = {'type': TREE_DIR, 'hash': tree_hash, 'size': size}
+                else:
+                    entries[name] = {'type': TREE_BLOB, 'hash': value[0], 'size': value[1]}
+            return self.write_tree(entries), sum(entry['size'] for entry in entries.values())
+
+        return write_node(root)[0]
+
+    def walk_tree(self, tree_hash, prefix=''):
+        """Обойти файлы дерева: (путь, хэш, размер)"""
+        for name, entry in sorted(self.read_tree(tree_hash).items()):
+            if entry['type'] == TREE_DIR:
+                yield from self.walk_tree(entry['hash'], f"{prefix}{name}/")
+            else:
+                yield f"{prefix}{name}", entry['hash'], entry['size']
+
+    def tree_objects(self, tree_hash):
+        """Все объекты (деревья и файлы), на которые ссылается дерево"""
+        if not tree_hash:
+            return set()
+        objects = {tree_hash}
+        for entry in self.read_tree(tree_hash).values():
+            if entry['type'] == TREE_DIR:
+                objects |= self.tree_objects(entry['hash'])
+            else:
+                objects.add(entry['hash'])
+        return objects
+
+    def diff_trees(self, old_hash, new_hash, prefix=''):
+        """Изменённые файлы между деревьями: (путь, старая запись, новая запись)
+
+        Одинаковые поддеревья пропускаются.
+        """
+        if old_hash == new_hash:
+            return
+        old_entries = self.read_tree(old_hash)
+        new_entries = self.read_tree(new_hash)
+
+        for name in sorted(set(old_entries) | set(new_entries)):
+            old_entry = old_entries.get(name)
+            new_entry = new_entries.get(name)
+            if old_entry == new_entry:
+                continue
+
+            old_is_dir = old_entry is not None and old_entry['type'] == TREE_DIR
+            new_is_dir = new_entry is not None and new_entry['type'] == TREE_DIR
+            old_file = None if old_is_dir else old_entry
+            new_file = None if new_is_dir else new_entry
+            path = f"{prefix}{name}"
+
+            if old_file is not None and new_file is None:
+                yield path, old_file, None
+            if old_is_dir or new_is_dir:
+                yield from self.diff_trees(
+                    old_entry['hash'] if old_is_dir else None,
+                    new_entry['hash'] if new_is_dir else None,
+                    path + '/'
+                )
+            if new_file is not None and old_file != new_file:
+                yield path, old_file, new_file
+
+    # Поток объектов
+
+    def write_stream(self, object_hashes, dest, max_size=None):
+        """Записать объекты в поток для отправки на сервер, вернуть их число
+
+        С max_size запись останавливается, как только поток стал не меньше
+        max_size байт: object_hashes может быть итератором, и следующий
+        вызов продолжит с того же места.
+        """
+        dest.write(STREAM_MAGIC)
+        count = 0
+        for object_hash in object_hashes:
+            packed = zlib.compress(self.read(object_hash))
+            dest.write(bytes.fromhex(object_hash) + struct.pack('>Q', len(packed)) + packed)
+            count += 1
+            if max_size is not None and dest.tell() >= max_size:
+                break
+        dest.write(END_MARKER)
+        return count
+
+    def read_stream(self, stream):
+        """Принять поток объектов от сервера, вернуть число объектов"""
+        if _read_exact(stream, len(STREAM_MAGIC)) != STREAM_MAGIC:
+            raise ValueError('Неизвестный формат ответа сервера')
+
+        received = 0
+        while True:
+            digest = _read_exact(stream, 32)
+            if digest == END_MARKER:
+                return received
+
+            object_hash = digest.hex()
+            remaining, = struct.unpack('>Q', _read_exact(stream, 8))
+            tmp_file = self._tmp_file()
+            hasher = hashlib.sha256()
+            decompressor = zlib.decompressobj()
+
+            with open(tmp_file, 'wb') as f:
+                while remaining:
+                    chunk = _read_exact(stream, min(CHUNK_SIZE, remaining))
+                    remaining -= len(chunk)
+                    data = decompressor.decompress(chunk)
+                    hasher.update(data)
+                    f.write(data)
+                data = decompressor.flush()
+                hasher.update(data)
+                f.write(data)
+
+            if hasher.hexdigest() != object_hash:
+                os.remove(tmp_file)
+                raise ValueError(f'Объект {object_hash} повреждён при передаче')
+
+            self._store(tmp_file, object_hash)
+            received += 1
+
+
+def _read_exact(stream, size):
+    data = b''
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            raise ValueError('Ответ сервера оборван')
+        data += chunk
+    return data
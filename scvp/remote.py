@@ -0,0 +1,83 @@
+import json
+import urllib.error
+import urllib.parse
+import urllib.request
+
+
+class RemoteError(Exception):
+    """Ошибка ответа сервера SCVP"""
+
+    def __init__(self, status, data):
+        self.status = status
+        self.data = data
+        super().__init__(data.get('error') or f'Ошибка сервера: HTTP {status}')
+
+
+class Remote:
+    """Клиент API сервера SCVP"""
+
+    def __init__(self, server, token=None):
+        self.server = server.rstrip('/')
+        self.token = token
+
+    def _request(self, method, path, params=None, json_body=None, data=None, headers=None):
+        url = f"{self.server}/api{path}"
+        if params:
+            url += '?' + urllib.parse.urlencode({k: v for k, v in params.items() if v is not None})
+
+        headers = dict(headers or {})
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        if json_body is not None:
+            data = json.dumps(json_body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+
+        request = urllib.request.Request(url, data=data, headers=headers, method=method)
+        try:
+            return urllib.request.urlopen(request)
+        except urllib.error.HTTPError as e:
+            try:
+                body = json.loads(e.read() or b'{}')
+            except ValueError:
+                body = {}
+            raise RemoteError(e.code, body) from None
+
+    def _json(self, method, path, **kwargs):
+        with self._request(method, path, **kwargs) as response:
+            return json.loads(response.read())
+
+    def login(self, username, password):
+        return self._json('POST', '/token', json_body={'username': username, 'password': password})['token']
+
+    def head(self, repo_id):
+        return self._json('GET', f'/repo/{repo_id}/head')
+
+    def commits(self, repo_id, before=None, limit=None):
+        return self._json('GET', f'/repo/{repo_id}/commits', params={'before': before, 'limit': limit})
+
+    def fetch(self, repo_id, want, base):
+        """Запросить объекты версии; возвращает открытый потоковый ответ
+
+        base - корневое дерево версии, которая уже есть у клиента.
+        """
+        return self._request('POST', f'/repo/{repo_id}/fetch', json_body={'want': want, 'base': base})
+
+    def negotiate(self, repo_id, objects):
+        return self._json('POST', f'/repo/{repo_id}/negotiate', json_body={'objects': list(objects)})['missing']
+
+    def send_objects(self, repo_id, stream_file, size):
+        """Отправить пакет объектов (открытый файл с потоком объектов)"""
+        return self._json(
+            'POST', f'/repo/{repo_id}/objects',
+            data=stream_file,
+            headers={'Content-Type': 'application/octet-stream', 'Content-Length': str(size)}
+        )
+
+    def push(self, repo_id, stream_file, size, tree, parent, message):
+        """Отправить поток объектов (открытый файл) и создать коммит"""
+        return self._json(
+            'POST', f'/repo/{repo_id}/push',
+            params={'tree': tree, 'parent': parent, 'message': message},
+            data=stream_file,
+            headers={'Content-Type': 'application/octet-stream', 'Content-Length': str(size)}
+        )
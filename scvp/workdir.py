@@ -0,0 +1,233 @@
+import os
+import json
+import fnmatch
+import shutil
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from scvp.objects import ObjectStore, CHUNK_SIZE
+
+META_DIR = '.scvp'
+IGNORE_FILE = '.scvpignore'
+HASH_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+
+def hash_file(path):
+    """Хэш файла по частям (как calculate_file_hash на сервере)"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class WorkingCopy:
+    """Рабочая копия репозитория SCVP: файлы проекта и служебная папка .scvp
+
+    .scvp/config.json  - адрес сервера и номер репозитория
+    .scvp/HEAD.json    - версия сервера, с которой синхронизирована копия
+    .scvp/pending.json - локальные коммиты, ещё не отправленные на сервер
+    .scvp/index.json   - кэш хэшей файлов: путь -> (mtime, размер, inode, хэш)
+    .scvp/objects/     - объекты (деревья и содержимое файлов)
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.meta = os.path.join(self.root, META_DIR)
+        self.objects = ObjectStore(os.path.join(self.meta, 'objects'))
+
+    @classmethod
+    def find(cls, start='.'):
+        """Найти рабочую копию в папке start или выше"""
+        path = os.path.abspath(start)
+        while True:
+            if os.path.isdir(os.path.join(path, META_DIR)):
+                return cls(path)
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+
+    @classmethod
+    def init(cls, root, server, repo_id):
+        working_copy = cls(root)
+        os.makedirs(working_copy.objects.path, exist_ok=True)
+        working_copy._save('config.json', {'server': server, 'repo_id': repo_id})
+        working_copy._save('HEAD.json', {'version': 0, 'commit': None, 'tree': None})
+        working_copy._save('pending.json', [])
+        return working_copy
+
+    def _load(self, name):
+        with open(os.path.join(self.meta, name), encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save(self, name, data):
+        path = os.path.join(self.meta, name)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(path + '.tmp', path)
+
+    @property
+    def config(self):
+        return self._load('config.json')
+
+    @property
+    def head(self):
+        return self._load('HEAD.json')
+
+    @head.setter
+    def head(self, value):
+        self._save('HEAD.json', value)
+
+    @property
+    def pending(self):
+        return self._load('pending.json')
+
+    @pending.setter
+    def pending(self, value):
+        self._save('pending.json', value)
+
+    def base_tree(self):
+        """Дерево, с которым сравнивается рабочая копия: последний локальный коммит или HEAD"""
+        pending = self.pending
+        return pending[-1]['tree'] if pending else self.head['tree']
+
+    # Файлы рабочей копии
+
+    def _ignore_patterns(self):
+        path = os.path.join(self.root, IGNORE_FILE)
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+    def list_files(self):
+        """Перечислить файлы рабочей копии: (путь, полный путь) в порядке путей"""
+        return sorted((path, entry.path) for path, entry in self._walk())
+
+    def _walk(self, dir_path=None, rel_dir='', patterns=None):
+        """Обойти файлы рабочей копии: (путь, os.DirEntry)"""
+        if dir_path is None:
+            dir_path, patterns = self.root, self._ignore_patterns()
+
+        with os.scandir(dir_path) as it:
+            entries = list(it)
+
+        for entry in entries:
+            path = rel_dir + entry.name
+            if (not rel_dir and entry.name == META_DIR) or (patterns and _ignored(path, patterns)):
+                continue
+            if entry.is_dir():
+                yield from self._walk(entry.path, path + '/', patterns)
+            elif entry.is_file():
+                yield path, entry
+
+    # Кэш хэшей
+
+    def _load_index(self):
+        """Загрузить кэш хэшей: ({путь: [mtime_ns, размер, inode, хэш]}, mtime кэша)"""
+        path = os.path.join(self.meta, 'index.json')
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f), os.fstat(f.fileno()).st_mtime_ns
+        except (OSError, ValueError):
+            return {}, 0
+
+    def _save_index(self, entries):
+        path = os.path.join(self.meta, 'index.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(path + '.tmp', path)
+
+    def scan(self):
+        """Состояние рабочей копии: {путь: (хэш, размер)}
+
+        Хэш пересчитывается только для файлов, у которых изменились mtime,
+        размер или inode; остальные берутся из .scvp/index.json. Файл,
+        изменённый не раньше записи кэша, тоже пересчитывается: его
+        повторное изменение в ту же единицу времени по mtime не отличить.
+        """
+        index, index_mtime = self._load_index()
+        entries = {}
+        to_hash = []
+
+        for path, entry in self._walk():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            key = [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+            cached = index.get(path)
+
+            if cached is not None and cached[:3] == key and stat.st_mtime_ns < index_mtime:
+                entries[path] = cached
+            else:
+                entries[path] = key + [None]
+                to_hash.append((path, entry.path))
+
+        if to_hash:
+            with ThreadPoolExecutor(max_workers=HASH_WORKERS) as executor:
+                hashes = executor.map(lambda item: hash_file(item[1]), to_hash)
+                for (path, full_path), content_hash in zip(to_hash, hashes):
+                    entries[path][3] = content_hash
+
+        if to_hash or len(entries) != len(index):
+            self._save_index(entries)
+
+        return {path: (entry[3], entry[1]) for path, entry in entries.items()}
+
+    def _update_index(self, written, removed):
+        """Записать в кэш файлы с известным хэшем и убрать удалённые"""
+        index, _ = self._load_index()
+        for path in removed:
+            index.pop(path, None)
+        for path, content_hash in written.items():
+            stat = os.stat(os.path.join(self.root, *path.split('/')))
+            index[path] = [stat.st_mtime_ns, stat.st_size, stat.st_ino, content_hash]
+        self._save_index(index)
+
+    def status(self, files=None):
+        """Отличия рабочей копии от base_tree: (добавленные, изменённые, удалённые)"""
+        files = self.scan() if files is None else files
+        committed = {path: (content_hash, size) for path, content_hash, size in self.objects.walk_tree(self.base_tree())}
+
+        added = sorted(set(files) - set(committed))
+        deleted = sorted(set(committed) - set(files))
+        modified = sorted(
+            path for path in set(files) & set(committed)
+            if files[path][0] != committed[path][0]
+        )
+        return added, modified, deleted
+
+    def checkout(self, old_tree, new_tree):
+        """Перевести файлы из одного дерева в другое (меняются только отличия)"""
+        written, removed = {}, []
+        for path, old_entry, new_entry in self.objects.diff_trees(old_tree, new_tree):
+            full_path = os.path.join(self.root, *path.split('/'))
+
+            if new_entry is None:
+                if os.path.isfile(full_path):
+                    os.remove(full_path)
+                self._remove_empty_dirs(os.path.dirname(full_path))
+                removed.append(path)
+            else:
+                if os.path.isdir(full_path):
+                    shutil.rmtree(full_path)
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                shutil.copyfile(self.objects.object_path(new_entry['hash']), full_path + '.scvp-tmp')
+                os.replace(full_path + '.scvp-tmp', full_path)
+                written[path] = new_entry['hash']
+
+        self._update_index(written, removed)
+        return len(written) + len(removed)
+
+    def _remove_empty_dirs(self, path):
+        """Удалить опустевшие папки от path вверх до корня рабочей копии"""
+        while path != self.root and os.path.isdir(path) and not os.listdir(path):
+            os.rmdir(path)
+            path = os.path.dirname(path)
+
+
+def _ignored(path, patterns):
+    name = path.rsplit('/', 1)[-1]
+    return any(fnmatch.fnmatch(path, pattern) or fnmatch.fnmatch(name, pattern) for pattern in patterns)
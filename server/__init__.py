@@ -1,3 +1,5 @@
+import os
+
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
@@ -14,25 +16,73 @@ def create_app(config_name='default'):
     app.config.from_object(config[config_name])
     
     # Инициализируем расширения
+    from .database import configure_database, init_database
+    configure_database(app)
     db.init_app(app)
+    init_database(app)
+    
+    # Миграции схемы (flask db ...), если установлен Flask-Migrate
+    try:
+        from flask_migrate import Migrate
+    except ImportError:
+        Migrate = None
+    if Migrate is not None:
+        Migrate(app, db, directory=os.path.join(os.path.dirname(app.root_path), 'migrations'),
+                render_as_batch=True)
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Пожалуйста, войдите в систему'
+    # API отвечает 401 вместо перенаправления на страницу входа
+    login_manager.blueprint_login_views = {'api': None}
     
     # Импортируем User здесь, после инициализации db
     with app.app_context():
         from .models import User
         
-        # Определяем user_loader внутри контекста приложения
+        # Определяем user_loader внутри контекста приложения.
+        # Пользователь берётся из кэша, чтобы не ходить в базу на каждом запросе
         @login_manager.user_loader
         def load_user(user_id):
-            return User.query.get(int(user_id))
+            from .cache import load_cached_user
+            return load_cached_user(int(user_id))
+        
+        # Клиент scvp авторизуется токеном: Authorization: Bearer <токен>
+        @login_manager.request_loader
+        def load_user_from_request(request):
+            from .models import hash_api_token
+            
+            auth_header = request.headers.get('Authorization', '')
+            if not auth_header.startswith('Bearer '):
+                return None
+            return User.query.filter_by(api_token_hash=hash_api_token(auth_header[7:].strip())).first()
     
     # Регистрируем blueprints
     from .routes.main import main as main_blueprint
     from .routes.auth import auth as auth_blueprint
+    from .routes.api import api as api_blueprint
     
     app.register_blueprint(main_blueprint)
     app.register_blueprint(auth_blueprint, url_prefix='/auth')
+    app.register_blueprint(api_blueprint, url_prefix='/api')
+    
+    # Кэш пользователей сбрасывается при их изменении
+    from .cache import init_user_cache
+    init_user_cache(app)
+    
+    # Кэш прав доступа к репозиториям сбрасывается при изменении участников
+    from .permissions import init_permissions
+    init_permissions(app)
+    
+    # Поисковый индекс обновляется фоновыми задачами после фиксации транзакций
+    from .search import init_search
+    init_search(app)
+    
+    # Очередь фоновых задач
+    from .jobs import init_jobs
+    init_jobs(app)
+    
+    # Консольные команды
+    from .commands import register_commands
+    register_commands(app)
     
     return app
\ No newline at end of file
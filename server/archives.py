@@ -0,0 +1,227 @@
+import os
+import time
+import uuid
+import tarfile
+import zipfile
+
+from flask import current_app
+
+from server.storage import open_object, get_archives_path
+from server.trees import walk_tree
+from server.jobs import job_handler
+
+# Распаковка архивов при массовой загрузке файлов и выгрузка версий
+# репозитория в архив
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.gz')
+
+# Тип содержимого архива в теле запроса -> расширение
+ARCHIVE_MIMETYPES = {
+    'application/zip': '.zip',
+    'application/x-zip-compressed': '.zip',
+    'application/x-tar': '.tar',
+    'application/gzip': '.tar.gz',
+    'application/x-gzip': '.tar.gz',
+    'application/x-gtar': '.tar.gz',
+}
+
+
+def is_archive(filename):
+    """Проверить, похоже ли имя файла на поддерживаемый архив"""
+    return filename.lower().endswith(ARCHIVE_EXTENSIONS)
+
+def iter_archive_files(fileobj, filename):
+    """Перебрать файлы архива, возвращая (путь, поток с содержимым)
+
+    fileobj должен поддерживать seek. Папки и ссылки пропускаются,
+    содержимое каждого файла читается из архива по мере надобности.
+    """
+    if filename.lower().endswith('.zip'):
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                with archive.open(info) as member:
+                    yield info.filename, member
+    else:
+        with tarfile.open(fileobj=fileobj, mode='r:*') as archive:
+            for info in archive:
+                if not info.isfile():
+                    continue
+                yield info.name, archive.extractfile(info)
+
+
+# Выгрузка версии в архив
+
+EXPORT_FORMATS = {
+    'zip': 'application/zip',
+    'tar.gz': 'application/gzip',
+}
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+class _ChunkBuffer:
+    """Файлоподобный приёмник: накапливает записанные байты до выдачи клиенту"""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return data
+
+
+def _generate_zip(tree_hash, mtime, base_path):
+    buffer = _ChunkBuffer()
+    date_time = max(time.localtime(mtime)[:6], (1980, 1, 1, 0, 0, 0))  # раньше 1980 ZIP не умеет
+
+    # Приёмник не поддерживает seek, поэтому zipfile пишет размеры
+    # после данных (data descriptor) и архив не нужно держать целиком
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for path, content_hash, size in walk_tree(tree_hash, base_path):
+            info = zipfile.ZipInfo(path, date_time=date_time)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+
+            with open_object(content_hash, base_path) as src, \
+                    archive.open(info, 'w', force_zip64=size > zipfile.ZIP64_LIMIT) as dest:
+                for chunk in iter(lambda: src.read(EXPORT_CHUNK_SIZE), b''):
+                    dest.write(chunk)
+                    if buffer.size >= EXPORT_CHUNK_SIZE:
+                        yield buffer.take()
+            yield buffer.take()
+
+    yield buffer.take()
+
+def _generate_tar_gz(tree_hash, mtime, base_path):
+    buffer = _ChunkBuffer()
+
+    with tarfile.open(fileobj=buffer, mode='w|gz', format=tarfile.PAX_FORMAT) as archive:
+        for path, content_hash, size in walk_tree(tree_hash, base_path):
+            info = tarfile.TarInfo(path)
+            info.size = size
+            info.mtime = mtime
+            info.mode = 0o644
+
+            # То же, что TarFile.addfile, но содержимое пишется частями,
+            # чтобы большой файл не собирался в памяти целиком
+            header = info.tobuf(archive.format, archive.encoding, archive.errors)
+            archive.fileobj.write(header)
+            archive.offset += len(header)
+
+            with open_object(content_hash, base_path) as src:
+                for chunk in iter(lambda: src.read(EXPORT_CHUNK_SIZE), b''):
+                    archive.fileobj.write(chunk)
+                    if buffer.size >= EXPORT_CHUNK_SIZE:
+                        yield buffer.take()
+
+            blocks, remainder = divmod(size, tarfile.BLOCKSIZE)
+            if remainder:
+                archive.fileobj.write(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+                blocks += 1
+            archive.offset += blocks * tarfile.BLOCKSIZE
+            yield buffer.take()
+
+    yield buffer.take()
+
+def get_cached_archive(tree_hash, archive_format, base_path='storage/repos'):
+    """Путь к готовому архиву дерева из кэша или None"""
+    cache_file = os.path.join(get_archives_path(base_path), f"{tree_hash}.{archive_format}")
+    if not os.path.exists(cache_file):
+        return None
+
+    # Время доступа для вытеснения давно не запрошенных архивов
+    os.utime(cache_file)
+    return cache_file
+
+def generate_archive(tree_hash, archive_format, mtime, base_path='storage/repos', cache_limit=None):
+    """Сформировать архив дерева потоком и одновременно сохранить его в кэш
+
+    Архив отдаётся клиенту по мере формирования. Копия пишется рядом
+    и становится записью кэша, только если архив сформирован до конца;
+    если клиент оборвал загрузку, недописанная копия удаляется.
+    """
+    generate = _generate_zip if archive_format == 'zip' else _generate_tar_gz
+    archives_path = get_archives_path(base_path)
+    cache_file = os.path.join(archives_path, f"{tree_hash}.{archive_format}")
+    partial_file = f"{cache_file}.{uuid.uuid4().hex}.part"
+
+    completed = False
+    try:
+        with open(partial_file, 'wb') as cache:
+            for chunk in generate(tree_hash, mtime, base_path):
+                if chunk:
+                    cache.write(chunk)
+                    yield chunk
+        os.replace(partial_file, cache_file)
+        completed = True
+    finally:
+        if not completed and os.path.exists(partial_file):
+            os.remove(partial_file)
+
+    if cache_limit is not None:
+        prune_archive_cache(cache_limit, base_path)
+
+def prune_archive_cache(limit, base_path='storage/repos'):
+    """Удалить давно не запрошенные архивы, пока кэш больше limit байт"""
+    archives_path = get_archives_path(base_path)
+    entries = []
+    for name in os.listdir(archives_path):
+        if name.endswith('.part'):
+            continue
+        try:
+            stat = os.stat(os.path.join(archives_path, name))
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, name))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            os.remove(os.path.join(archives_path, name))
+        except FileNotFoundError:
+            pass
+        total -= size
+
+@job_handler('prune-archives')
+def _prune_job(payload):
+    prune_archive_cache(current_app.config['ARCHIVE_CACHE_SIZE'])
+
+def remove_unreachable_archives(reachable, grace_period, base_path='storage/repos'):
+    """Удалить архивы деревьев, которых больше нет ни в одной версии
+
+    Брошенные недописанные копии (.part) удаляются, если они старше
+    grace_period секунд. Возвращает число удалённых файлов.
+    """
+    archives_path = get_archives_path(base_path)
+    cutoff = time.time() - grace_period
+    removed = 0
+    for name in os.listdir(archives_path):
+        path = os.path.join(archives_path, name)
+        if name.endswith('.part'):
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+        elif name.split('.', 1)[0] in reachable:
+            continue
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
@@ -0,0 +1,145 @@
+import time
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached, object_session
+
+# Кэши в памяти процесса.
+#
+# Пользователь для Flask-Login берётся из кэша, а не из базы на каждом
+# запросе. В кэше лежат значения столбцов, а не сам объект: на каждый
+# запрос собирается свой экземпляр User, привязанный к сессии этого
+# запроса, поэтому изменения (например, темы) сохраняются как обычно.
+# Запись сбрасывается при любом изменении пользователя через ORM;
+# в других процессах она устаревает не дольше чем через USER_CACHE_TTL.
+
+
+class TTLCache:
+    """Потокобезопасный LRU-кэш с ограничением числа записей и временем жизни"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class WeightedCache:
+    """Потокобезопасный LRU-кэш с ограничением по суммарному весу (объёму) записей"""
+
+    def __init__(self, max_weight):
+        self.max_weight = max_weight
+        self.weight = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, weight):
+        if weight > self.max_weight:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = (value, weight)
+            self.weight += weight
+            while self.weight > self.max_weight:
+                _, (_, old_weight) = self.entries.popitem(last=False)
+                self.weight -= old_weight
+
+
+def get_user_cache():
+    return current_app.extensions['user_cache']
+
+def _user_snapshot(user):
+    return {column.key: getattr(user, column.key) for column in user.__table__.columns}
+
+def load_cached_user(user_id):
+    """Получить пользователя по id: из кэша или из базы"""
+    from server.models import db, User
+
+    # Уже загружен в этом запросе
+    existing = db.session.identity_map.get(db.session.identity_key(User, user_id))
+    if existing is not None:
+        return existing
+
+    cache = get_user_cache()
+    data = cache.get(user_id)
+    if data is None:
+        user = db.session.get(User, user_id)
+        if user is not None:
+            cache.set(user_id, _user_snapshot(user))
+        return user
+
+    # Экземпляр из кэшированных значений, как будто загруженный из базы
+    user = User(**data)
+    make_transient_to_detached(user)
+    db.session.add(user)
+    return user
+
+def invalidate_user(user_id):
+    """Сбросить пользователя в кэше (после изменения профиля)"""
+    get_user_cache().delete(user_id)
+
+
+def _forget_changed_user(mapper, connection, target):
+    # Сбрасываем сразу и ещё раз после фиксации: иначе параллельный
+    # запрос мог бы успеть положить в кэш старые значения
+    invalidate_user(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_users', set()).add(target.id)
+
+def _forget_after_commit(session):
+    for user_id in session.info.pop('changed_users', ()):
+        invalidate_user(user_id)
+
+def _discard_after_rollback(session):
+    session.info.pop('changed_users', None)
+
+def init_user_cache(app):
+    """Создать кэш пользователей приложения и подписаться на изменения User"""
+    from server.models import db, User
+
+    app.extensions['user_cache'] = TTLCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+
+    if not event.contains(User, 'after_update', _forget_changed_user):
+        event.listen(User, 'after_update', _forget_changed_user)
+        event.listen(User, 'after_delete', _forget_changed_user)
+        event.listen(db.session, 'after_commit', _forget_after_commit)
+        event.listen(db.session, 'after_rollback', _discard_after_rollback)
@@ -0,0 +1,193 @@
+import os
+import time
+import shutil
+import logging
+
+from flask import current_app
+
+from server.models import db, Repository, Commit, RepoFile, UploadSession, Collaborator
+from server.storage import get_object_path, get_objects_tmp_path, get_uploads_path
+from server.packs import load_pack_index, list_loose_objects
+from server.trees import read_tree, TREE_DIR
+from server.search import apply_search_updates, prune_search_index
+from server.archives import remove_unreachable_archives
+from server.utils import get_repo_storage_path
+from server.jobs import job_handler, enqueue_job
+
+# Фоновая очистка хранилища.
+#
+# Удаление репозитория в запросе только помечает его (deleted_at) и
+# ставит в очередь задачу очистки, а рабочую копию, записи в базе и
+# незавершённые загрузки убирает reclaim_deleted_repos. Объекты хранилища общие для всех репозиториев,
+# поэтому их удаляет отдельный сборщик мусора (mark and sweep):
+#   mark  - обойти деревья всех версий всех репозиториев, текущие файлы
+#           и базы дельт упакованных объектов;
+#   sweep - удалить объекты, до которых обход не дошёл и которые не
+#           изменялись дольше grace_period секунд. Объект, который только
+#           что записан или на который вот-вот сошлётся коммит, свежий
+#           (см. freshen_object), поэтому он не пропадёт.
+# Пак-файл удаляется, только если в нём не осталось нужных объектов.
+
+logger = logging.getLogger(__name__)
+
+
+def reclaim_repo(repo_id, base_path='storage/repos'):
+    """Окончательно удалить помеченный репозиторий: файлы и записи в базе
+
+    Сначала удаляются файлы, затем записи одной транзакцией: если
+    очистка прервётся, репозиторий останется помеченным и будет
+    дочищен при следующем запуске.
+    """
+    repo_path = get_repo_storage_path(repo_id, base_path)
+    if os.path.exists(repo_path):
+        shutil.rmtree(repo_path, ignore_errors=True)
+
+    uploads_path = get_uploads_path(base_path)
+    for upload_id, in UploadSession.query.filter_by(repo_id=repo_id).with_entities(UploadSession.id):
+        try:
+            os.remove(os.path.join(uploads_path, upload_id))
+        except FileNotFoundError:
+            pass
+
+    for model in (RepoFile, UploadSession, Commit, Collaborator):
+        db.session.execute(db.delete(model).where(model.repo_id == repo_id))
+    db.session.execute(db.delete(Repository).where(Repository.id == repo_id))
+    db.session.commit()
+
+    # Из поиска репозиторий убран ещё при удалении; повторяем на случай,
+    # если индекс пересобирался после этого
+    apply_search_updates([('forget', repo_id, '')], base_path)
+
+def reclaim_deleted_repos(base_path='storage/repos'):
+    """Дочистить все помеченные как удалённые репозитории, вернуть их число"""
+    repo_ids = [
+        repo_id for repo_id, in
+        db.session.query(Repository.id).filter(Repository.deleted_at.isnot(None))
+    ]
+    for repo_id in repo_ids:
+        reclaim_repo(repo_id, base_path)
+    return len(repo_ids)
+
+
+def find_reachable_objects(base_path='storage/repos'):
+    """Mark: хэши всех объектов, которые ещё нужны
+
+    Деревья всех версий (с вложенными деревьями и файлами), текущие
+    файлы рабочих копий и, для упакованных объектов, вся цепочка баз их
+    дельт: без базы дельту не восстановить.
+    """
+    reachable = set()
+    trees = set()
+
+    for tree_hash, in db.session.query(Commit.tree_hash).filter(Commit.tree_hash.isnot(None)).distinct():
+        trees.add(tree_hash)
+    for tree_hash, in db.session.query(Repository.head_tree).filter(Repository.head_tree.isnot(None)):
+        trees.add(tree_hash)
+    for content_hash, in db.session.query(RepoFile.content_hash).filter(
+        RepoFile.is_directory.is_(False)
+    ).distinct().yield_per(10000):
+        reachable.add(content_hash)
+
+    # Общие поддеревья соседних версий обходятся один раз
+    stack = list(trees)
+    while stack:
+        tree_hash = stack.pop()
+        if tree_hash in reachable:
+            continue
+        reachable.add(tree_hash)
+        try:
+            entries = read_tree(tree_hash, base_path)
+        except LookupError:
+            logger.warning('Дерево %s не найдено', tree_hash)
+            continue
+        for entry in entries.values():
+            if entry['type'] == TREE_DIR:
+                stack.append(entry['hash'])
+            else:
+                reachable.add(entry['hash'])
+
+    pack_index = load_pack_index(base_path)
+    for object_hash in list(reachable):
+        entry = pack_index.get(object_hash)
+        while entry is not None and entry[3] is not None and entry[3] not in reachable:
+            reachable.add(entry[3])
+            entry = pack_index.get(entry[3])
+
+    return reachable
+
+def collect_garbage(grace_period, base_path='storage/repos'):
+    """Mark and sweep: удалить объекты, на которые никто не ссылается
+
+    Также чистит поисковый индекс, кэш архивов и брошенные временные
+    файлы. Возвращает статистику {'objects', 'bytes', 'packs', 'search',
+    'archives', 'tmp'}.
+    """
+    stats = {'objects': 0, 'bytes': 0, 'packs': 0, 'search': 0, 'archives': 0, 'tmp': 0}
+
+    # Поиск удаляет записи по тексту объектов - до того, как они пропадут
+    stats['search'] = prune_search_index(base_path)
+
+    reachable = find_reachable_objects(base_path)
+    cutoff = time.time() - grace_period
+
+    for object_hash in list_loose_objects(base_path):
+        if object_hash in reachable:
+            continue
+        object_path = get_object_path(object_hash, base_path)
+        try:
+            stat = os.stat(object_path)
+            if stat.st_mtime >= cutoff:
+                continue
+            os.remove(object_path)
+        except FileNotFoundError:
+            continue
+        stats['objects'] += 1
+        stats['bytes'] += stat.st_size
+
+    packs = {}
+    for object_hash, entry in load_pack_index(base_path).items():
+        packs.setdefault(entry[0], []).append(object_hash)
+    for pack_file, object_hashes in packs.items():
+        if any(object_hash in reachable for object_hash in object_hashes):
+            continue
+        try:
+            stat = os.stat(pack_file)
+            if stat.st_mtime >= cutoff:
+                continue
+            # Индекс удаляется первым: без него пак никто не читает
+            os.remove(pack_file[:-len('.pack')] + '.idx')
+            os.remove(pack_file)
+        except FileNotFoundError:
+            continue
+        stats['packs'] += 1
+        stats['bytes'] += stat.st_size
+
+    tmp_path = get_objects_tmp_path(base_path)
+    for name in os.listdir(tmp_path):
+        path = os.path.join(tmp_path, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                stats['tmp'] += 1
+        except FileNotFoundError:
+            pass
+
+    stats['archives'] = remove_unreachable_archives(reachable, grace_period, base_path)
+    return stats
+
+
+@job_handler('cleanup', serial=True)
+def run_cleanup(payload=None):
+    """Задача очереди: дочистить удалённые репозитории и собрать мусор"""
+    reclaimed = reclaim_deleted_repos()
+    stats = collect_garbage(current_app.config['GC_GRACE_PERIOD'])
+    logger.info('Очистка: репозиториев %s, объектов %s, паков %s, освобождено байт %s',
+                reclaimed, stats['objects'], stats['packs'], stats['bytes'])
+    return reclaimed, stats
+
+def request_cleanup():
+    """Поставить очистку в очередь (в текущей транзакции)
+
+    Пока очистка ждёт очереди, повторные запросы не добавляют новую.
+    """
+    enqueue_job('cleanup', key='cleanup')
@@ -0,0 +1,192 @@
+import os
+import threading
+
+import click
+import sqlalchemy as sa
+
+from server.models import db, User, Repository, Commit, RepoFile, Job
+from server.packs import repack_objects
+from server.utils import index_repo_directory
+from server.search import rebuild_search_index
+from server.cleanup import reclaim_deleted_repos, collect_garbage
+from server.jobs import work, enqueue_job
+
+# Миграции (migrations/versions) по порядку и признак того, что изменение
+# уже есть в базе. Базы, созданные db.create_all() до появления миграций,
+# бывают любой из этих версий схемы: такая база помечается последней
+# ревизией, изменения которой в ней есть, и обновляется с неё.
+def _schema_revisions(inspector):
+    tables = set(inspector.get_table_names())
+
+    def columns(table):
+        return {column['name']: column for column in inspector.get_columns(table)} if table in tables else {}
+
+    def unique(table):
+        return {tuple(c['column_names']) for c in inspector.get_unique_constraints(table)} if table in tables else set()
+
+    return [
+        ('3f1c2a9b7d10', lambda: 'users' in tables),  # Исходная схема
+        ('9c58da8921b8', lambda: 'tree_hash' in columns('commits')),
+        ('cdffa5d097c3', lambda: 'upload_sessions' in tables),
+        ('94b7ddffc5ee', lambda: 'parent_path' in columns('repo_files')),
+        ('beae0bd8df01', lambda: ('repo_id', 'version_number') in unique('commits')),
+        ('4afa4af1f11c', lambda: 'head_version' in columns('repositories')),
+        ('dd64b3ef6f12', lambda: ('repo_id', 'commit_hash') in unique('commits')),
+        ('f4f8388d9864', lambda: 'api_token_hash' in columns('users')),
+        ('9b32dac0d797', lambda: 'commit_count' in columns('repositories')),
+        ('d56b47e1add8', lambda: isinstance(columns('repo_files')['size']['type'], sa.BigInteger)),
+        ('8c4e61d2a5f3', lambda: 'deleted_at' in columns('repositories')),
+        ('b27d9e4f0c61', lambda: 'jobs' in tables),
+        ('d45a8f3c9e27', lambda: 'collaborators' in tables),
+    ]
+
+def detect_schema_revision(inspector):
+    """Ревизия миграций, которой соответствует база без alembic_version (None - пустая база)"""
+    revision = None
+    for candidate, present in _schema_revisions(inspector):
+        if not present():
+            break
+        revision = candidate
+    return revision
+
+
+def upgrade_database(app):
+    """Создать базу данных или обновить её схему до последней версии"""
+    if 'migrate' not in app.extensions:
+        # Без Flask-Migrate можно только создать недостающие таблицы;
+        # после его установки init-db определит версию такой схемы
+        db.create_all()
+        return
+
+    from flask_migrate import upgrade, stamp
+
+    inspector = db.inspect(db.engine)
+    if 'alembic_version' not in inspector.get_table_names():
+        revision = detect_schema_revision(inspector)
+        if revision is not None:
+            stamp(revision=revision)
+    upgrade()
+
+
+def register_commands(app):
+    """Зарегистрировать консольные команды flask"""
+
+    @app.cli.command('init-db')
+    def init_db():
+        """Создать хранилище и базу данных или обновить схему до последней версии"""
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        upgrade_database(app)
+        click.echo(f'База данных инициализирована, пользователей: {User.query.count()}')
+
+    @app.cli.command('repack')
+    @click.option('--window', default=None, type=int, help='Сколько соседних объектов сравнивать')
+    @click.option('--depth', default=None, type=int, help='Максимальная длина цепочки дельт')
+    def repack(window, depth):
+        """Упаковать старые версии файлов в пак-файл с дельтами"""
+        packed = repack_objects(
+            window=window or app.config['PACK_WINDOW'],
+            max_depth=depth or app.config['PACK_MAX_DELTA_DEPTH']
+        )
+        click.echo(f'Упаковано объектов: {packed}')
+
+    @app.cli.command('gc')
+    @click.option('--grace', default=None, type=int, help='Не удалять объекты моложе стольких секунд')
+    def gc(grace):
+        """Дочистить удалённые репозитории и удалить объекты, на которые никто не ссылается"""
+        reclaimed = reclaim_deleted_repos()
+        stats = collect_garbage(app.config['GC_GRACE_PERIOD'] if grace is None else grace)
+        click.echo(f'Удалено репозиториев: {reclaimed}')
+        click.echo(f"Удалено объектов: {stats['objects']}, пак-файлов: {stats['packs']}, "
+                   f"освобождено байт: {stats['bytes']}")
+        click.echo(f"Убрано из поискового индекса: {stats['search']}, архивов: {stats['archives']}, "
+                   f"временных файлов: {stats['tmp']}")
+
+    @app.cli.group('jobs')
+    def jobs():
+        """Очередь фоновых задач"""
+
+    @jobs.command('run')
+    @click.option('--workers', default=1, type=int, help='Сколько задач выполнять одновременно')
+    def jobs_run(workers):
+        """Выполнять задачи очереди (отдельный процесс-исполнитель)"""
+        click.echo(f'Исполнителей: {workers}, для остановки нажмите Ctrl+C')
+        threads = [
+            threading.Thread(target=work, args=(app,), daemon=True)
+            for _ in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            pass
+
+    @jobs.command('list')
+    def jobs_list():
+        """Показать задачи, которые ждут очереди, выполняются или завершились ошибкой"""
+        for job in Job.query.order_by(Job.id):
+            error = (job.last_error or '').strip().splitlines()[-1:]
+            click.echo(f'{job.id}\t{job.kind}\t{job.status}\tпопыток: {job.attempts}\t{error[0] if error else ""}')
+
+    @jobs.command('enqueue')
+    @click.argument('kind', type=click.Choice(['cleanup', 'repack', 'prune-archives']))
+    def jobs_enqueue(kind):
+        """Поставить задачу в очередь (например, из cron)"""
+        enqueue_job(kind, key=kind)
+        db.session.commit()
+        click.echo(f'Задача {kind} в очереди')
+
+    @jobs.command('retry')
+    def jobs_retry():
+        """Вернуть в очередь задачи, завершившиеся ошибкой"""
+        retried = Job.query.filter_by(status='failed').update({'status': 'pending', 'attempts': 0})
+        db.session.commit()
+        click.echo(f'Возвращено в очередь: {retried}')
+
+    @app.cli.command('index-files')
+    def index_files():
+        """Заполнить список файлов (RepoFile) для репозиториев, созданных до его появления"""
+        indexed = 0
+        for repo in Repository.query.filter_by(deleted_at=None):
+            if RepoFile.query.filter_by(repo_id=repo.id).first() is None:
+                index_repo_directory(repo.id)
+                db.session.commit()
+                indexed += 1
+        click.echo(f'Проиндексировано репозиториев: {indexed}')
+
+    @app.cli.command('index-search')
+    def index_search():
+        """Пересобрать поисковый индекс по текущим файлам всех репозиториев"""
+        count = rebuild_search_index()
+        click.echo(f'Проиндексировано файлов: {count}')
+
+    @app.cli.command('recount-stats')
+    def recount_stats():
+        """Пересчитать счётчики репозиториев (коммиты, файлы, размер) по базе"""
+        commit_counts = dict(
+            db.session.query(Commit.repo_id, db.func.count(Commit.id)).group_by(Commit.repo_id)
+        )
+        file_stats = {
+            repo_id: (count, size or 0)
+            for repo_id, count, size in db.session.query(
+                RepoFile.repo_id, db.func.count(RepoFile.id), db.func.sum(RepoFile.size)
+            ).filter(RepoFile.is_directory.is_(False)).group_by(RepoFile.repo_id)
+        }
+        
+        repo_ids = [repo_id for repo_id, in db.session.query(Repository.id)]
+        for repo_id in repo_ids:
+            file_count, total_size = file_stats.get(repo_id, (0, 0))
+            # updated_at указан явно, чтобы пересчёт не менял время изменения
+            db.session.execute(
+                db.update(Repository)
+                .where(Repository.id == repo_id)
+                .values(
+                    commit_count=commit_counts.get(repo_id, 0),
+                    file_count=file_count,
+                    total_size=total_size,
+                    updated_at=Repository.updated_at
+                )
+            )
+        db.session.commit()
+        click.echo(f'Пересчитано репозиториев: {len(repo_ids)}')
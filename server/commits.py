@@ -0,0 +1,204 @@
+import hashlib
+from datetime import datetime
+
+from flask_login import current_user
+
+from server.models import db, Repository, Commit
+from server.trees import update_tree, build_tree, diff_trees, checkout_tree
+from server.utils import get_repo_index, get_repo_changes, place_object_in_repo, delete_file_from_repo
+
+
+def advance_head(repo_id):
+    """Занять номер следующей версии репозитория
+    
+    UPDATE счётчика блокирует строку репозитория до конца транзакции,
+    поэтому параллельные коммиты в один репозиторий выстраиваются в
+    очередь и не получают одинаковых номеров. Возвращает
+    (номер версии, хэш и дерево текущей головы).
+    """
+    db.session.execute(
+        db.update(Repository)
+        .where(Repository.id == repo_id)
+        .values(head_version=Repository.head_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    
+    version_number, head_hash, head_tree = db.session.execute(
+        db.select(Repository.head_version, Repository.head_hash, Repository.head_tree)
+        .where(Repository.id == repo_id)
+    ).one()
+    
+    if head_hash is None:
+        # Репозиторий создан до появления счётчика - берём голову из истории
+        last_commit = Commit.query.filter_by(repo_id=repo_id).order_by(Commit.version_number.desc()).first()
+        if last_commit is not None:
+            version_number = last_commit.version_number + 1
+            head_hash, head_tree = last_commit.commit_hash, last_commit.tree_hash
+    
+    return version_number, head_hash, head_tree
+
+
+def compute_commit_hash(tree_hash, parent_hash, author_id, message):
+    """Хэш коммита по его содержимому (как в git)
+    
+    Одинаковое состояние с одинаковой историей всегда даёт одинаковый
+    хэш, поэтому клиенту достаточно сравнить хэши, чтобы понять, что
+    синхронизировать нечего.
+    """
+    content = (
+        f"tree {tree_hash}\n"
+        f"parent {parent_hash or ''}\n"
+        f"author {author_id}\n"
+        f"\n"
+        f"{message}"
+    )
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def count_tree_changes(old_tree, new_tree):
+    """Изменение числа файлов и суммарного размера между деревьями
+    
+    Одинаковые поддеревья пропускаются, поэтому считаются только
+    изменённые файлы. Возвращает (разница файлов, разница байт).
+    """
+    files_delta = size_delta = 0
+    for _, old_entry, new_entry in diff_trees(old_tree, new_tree):
+        if old_entry is not None:
+            files_delta -= 1
+            size_delta -= old_entry['size']
+        if new_entry is not None:
+            files_delta += 1
+            size_delta += new_entry['size']
+    return files_delta, size_delta
+
+
+class HeadMoved(Exception):
+    """Голова репозитория ушла вперёд от версии, на которой построены изменения"""
+    
+    def __init__(self, version_number, commit_hash):
+        super().__init__('Репозиторий изменился')
+        self.version_number = version_number
+        self.commit_hash = commit_hash
+
+
+def create_commit(repo_id, message, paths=()):
+    """Создать коммит
+    
+    paths - изменённые пути; их новое состояние берётся из RepoFile,
+    а дерево коммита строится из дерева предыдущей версии. Изменения
+    файлов, коммит и голова репозитория фиксируются одной транзакцией.
+    Если дерево не изменилось, новый коммит не создаётся и
+    возвращается текущая голова. Счётчики репозитория (коммиты, файлы,
+    размер) меняются в той же транзакции.
+    """
+    version_number, head_hash, head_tree = advance_head(repo_id)
+    
+    if head_hash is not None and head_tree is None:
+        # У старых коммитов дерева нет - строим его по всем файлам
+        tree_hash = build_tree(get_repo_index(repo_id))
+    else:
+        tree_hash = update_tree(head_tree, get_repo_changes(repo_id, paths))
+    
+    return _record_commit(repo_id, message, version_number, head_hash, head_tree, tree_hash)
+
+
+def commit_tree(repo_id, message, tree_hash, parent_hash=None, check_parent=False):
+    """Сделать готовое дерево новой версией репозитория
+    
+    Рабочая копия и RepoFile переводятся на новое дерево под блокировкой
+    строки репозитория (advance_head), поэтому параллельный коммит не
+    вклинится между ними. С check_parent голова сначала сверяется с
+    parent_hash: если она ушла вперёд, рабочая копия не трогается и
+    бросается HeadMoved. Если коммит зафиксировать не удалось, файлы
+    рабочей копии возвращаются к дереву головы.
+    """
+    version_number, head_hash, head_tree = advance_head(repo_id)
+    
+    if check_parent and head_hash != parent_hash:
+        db.session.rollback()
+        raise HeadMoved(version_number - 1, head_hash)
+    
+    old_tree = head_tree
+    if head_hash is not None and head_tree is None:
+        # У старых коммитов дерева нет - рабочая копия описывается RepoFile
+        old_tree = build_tree(get_repo_index(repo_id))
+    
+    try:
+        checkout_tree(repo_id, old_tree, tree_hash)
+        return _record_commit(repo_id, message, version_number, head_hash, head_tree, tree_hash)
+    except BaseException:
+        db.session.rollback()
+        checkout_tree(repo_id, tree_hash, old_tree, record=False)
+        raise
+
+
+def _record_commit(repo_id, message, version_number, head_hash, head_tree, tree_hash):
+    """Записать коммит с деревом tree_hash поверх головы и зафиксировать транзакцию"""
+    if head_hash is not None and tree_hash == head_tree:
+        # Пустой коммит: возвращаем счётчик версий на место
+        db.session.execute(
+            db.update(Repository)
+            .where(Repository.id == repo_id)
+            .values(head_version=version_number - 1)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return Commit.query.filter_by(repo_id=repo_id, commit_hash=head_hash).first()
+    
+    commit_hash = compute_commit_hash(tree_hash, head_hash, current_user.id, message)
+    files_delta, size_delta = count_tree_changes(head_tree, tree_hash)
+    
+    if head_tree is None:
+        # Предыдущего дерева нет (первый коммит или старый репозиторий),
+        # поэтому разница с пустым деревом - это и есть итоговые значения
+        file_count, total_size = files_delta, size_delta
+    else:
+        file_count = Repository.file_count + files_delta
+        total_size = Repository.total_size + size_delta
+    
+    commit = Commit(
+        repo_id=repo_id,
+        user_id=current_user.id,
+        message=message,
+        commit_hash=commit_hash,
+        parent_hash=head_hash,
+        tree_hash=tree_hash,
+        version_number=version_number
+    )
+    db.session.add(commit)
+    
+    db.session.execute(
+        db.update(Repository)
+        .where(Repository.id == repo_id)
+        .values(
+            head_version=version_number,
+            head_hash=commit_hash,
+            head_tree=tree_hash,
+            commit_count=Repository.commit_count + 1,
+            file_count=file_count,
+            total_size=total_size,
+            updated_at=datetime.utcnow()
+        )
+        .execution_options(synchronize_session=False)
+    )
+    
+    db.session.commit()
+    
+    return commit
+
+
+def commit_files(repo_id, message, files):
+    """Записать набор файлов одним коммитом
+    
+    files - {путь: (хэш, размер)} для объектов, уже записанных в
+    хранилище, или {путь: None} для удаляемых файлов. Объекты пишутся
+    заранее, а рабочая копия, дерево и голова репозитория обновляются
+    одной транзакцией.
+    """
+    for path, value in files.items():
+        if value is None:
+            delete_file_from_repo(repo_id, path)
+        else:
+            place_object_in_repo(repo_id, path, *value)
+    
+    return create_commit(repo_id, message, files.keys())
@@ -9,13 +9,96 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///scvp.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Пул соединений в каждом рабочем процессе (см. gunicorn.conf.py:
+    # потоков в процессе должно быть не больше pool_size + max_overflow).
+    # pre_ping проверяет соединение перед выдачей, recycle заменяет
+    # соединения старше получаса (их закрывают PostgreSQL и балансировщики)
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DATABASE_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DATABASE_MAX_OVERFLOW', 20)),
+        'pool_timeout': 30,
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+    }
+    
+    # SQLite: сколько секунд ждать, пока другой процесс пишет в базу
+    SQLITE_BUSY_TIMEOUT = 30
+    
     # Сессии
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
     
     # Загрузка файлов
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max request size (большие файлы - докачиваемой загрузкой)
+    UPLOAD_CHUNK_SIZE = 1024 * 1024  # Размер блока при потоковой записи
+    BATCH_ARCHIVE_MAX_SIZE = 1024 * 1024 * 1024  # Архив для /batch пишется на диск потоком - свой предел
+    PUSH_MAX_SIZE = 1024 * 1024 * 1024  # Поток объектов scvp push тоже пишется на диск по частям
     UPLOAD_FOLDER = 'storage'
     
+    # Отдавать файлы через веб-сервер (nginx/apache), если он это умеет
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+    
+    # Репозиториев на странице панели управления
+    REPOS_PER_PAGE = 20
+    
+    # Если файлов больше, страница репозитория показывает их по папкам
+    REPO_VIEW_FULL_LIST_LIMIT = 500
+    
+    # Коммитов на странице истории
+    COMMITS_PER_PAGE = 50
+    
+    # Сравнение версий: если изменённых файлов больше, построчные
+    # отличия показываются только по запросу для отдельного файла
+    DIFF_MAX_FILES = 100
+    
+    # Редактор файлов: файлы больше EDIT_INLINE_MAX_SIZE открываются окнами
+    # по EDIT_WINDOW_LINES строк, а сохраняются только изменённые строки
+    EDIT_INLINE_MAX_SIZE = 512 * 1024
+    EDIT_WINDOW_LINES = 1000
+    
+    # Просмотр файлов: текстовые файлы больше этого размера не
+    # отрисовываются, а предлагаются для скачивания
+    PREVIEW_MAX_SIZE = 1024 * 1024
+    
+    # Поиск по содержимому файлов
+    SEARCH_RESULTS_LIMIT = 50
+    
+    # Упаковка старых версий (flask repack)
+    PACK_WINDOW = 10  # Сколько соседних версий сравнивать при поиске базы
+    PACK_MAX_DELTA_DEPTH = 10  # Максимальная длина цепочки дельт
+    
+    # Кэш архивов версий (/repo/<id>/archive/<версия>.zip)
+    ARCHIVE_CACHE_SIZE = 1024 * 1024 * 1024  # 1GB, давно не запрошенные архивы удаляются
+    
+    # Очередь фоновых задач (server/jobs.py)
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))  # Потоков в каждом процессе; 0 - только flask jobs run
+    JOB_POLL_INTERVAL = 1  # Секунд между проверками очереди
+    JOB_MAX_ATTEMPTS = 5
+    JOB_RETRY_DELAY = 10  # Пауза перед повтором, удваивается с каждой попыткой
+    JOB_HEARTBEAT_INTERVAL = 60  # Как часто исполнитель отмечает, что задача ещё выполняется
+    JOB_TIMEOUT = 600  # Задача без такой отметки дольше этого времени считается брошенной и повторяется
+    
+    # Сборка мусора (flask gc и фоновая очистка после удаления репозитория):
+    # объекты без ссылок удаляются, только если не менялись столько секунд
+    GC_GRACE_PERIOD = 24 * 60 * 60
+    
+    # Хэширование паролей (формат werkzeug). При смене параметров
+    # пароли перехешируются при следующем входе пользователя
+    PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
+    PASSWORD_SALT_LENGTH = 16
+    PASSWORD_HASH_WORKERS = 2  # Сколько паролей проверяется одновременно
+    PASSWORD_HASH_QUEUE = 0  # Сколько проверок может ждать; остальные попытки входа отклоняются
+    # Потоков обработки запросов в процессе (threads в gunicorn.conf.py).
+    # Проверки пароля занимают не больше половины из них
+    REQUEST_THREADS = int(os.environ.get('SCVP_THREADS', 4))
+    
+    # Кэш пользователей для Flask-Login (в памяти каждого процесса)
+    USER_CACHE_SIZE = 1024  # Сколько пользователей держать в кэше
+    USER_CACHE_TTL = 60  # Секунд; столько же другие процессы могут видеть старые данные
+    
+    # Кэш ролей участников репозиториев (в памяти каждого процесса)
+    PERMISSION_CACHE_SIZE = 10000
+    PERMISSION_CACHE_TTL = 30  # Секунд; столько же другие процессы могут видеть старые права
+    
     # Тема по умолчанию
     DEFAULT_THEME = 'light'
 
@@ -24,9 +107,23 @@ class DevelopmentConfig(Config):
 
 class ProductionConfig(Config):
     DEBUG = False
+
+class TestingConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    
+    # Отдельная база (tests/conftest.py подставляет временный файл SQLite)
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or 'sqlite://'
+    
+    # Задачи выполняют сами тесты (run_next_job), а не потоки-исполнители
+    JOB_WORKERS = 0
+    
+    # Быстрое хэширование, чтобы тесты не ждали scrypt
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
     
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
+    'testing': TestingConfig,
     'default': DevelopmentConfig
 }
\ No newline at end of file
@@ -0,0 +1,58 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# Настройка соединений с базой данных.
+#
+# PostgreSQL - основной вариант для нескольких рабочих процессов: пул
+# соединений настраивается через SQLALCHEMY_ENGINE_OPTIONS. SQLite
+# подходит для одного сервера: база переводится в режим WAL (читатели не
+# ждут писателя), а писатели ждут освобождения блокировки до
+# SQLITE_BUSY_TIMEOUT секунд вместо ошибки "database is locked".
+
+# Параметры пула, которые не принимает пул SQLite в памяти
+QUEUE_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout')
+
+
+def configure_database(app):
+    """Подготовить URI и параметры движка до db.init_app(app)"""
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+
+    # Heroku и многие хостинги выдают адрес в старом виде postgres://
+    if uri.startswith('postgres://'):
+        uri = app.config['SQLALCHEMY_DATABASE_URI'] = 'postgresql://' + uri[len('postgres://'):]
+
+    url = make_url(uri)
+    if url.drivername == 'postgresql':
+        # Драйвер по умолчанию зависит от версии SQLAlchemy (в 2.1 - psycopg 3),
+        # а в requirements.txt - psycopg2
+        url = url.set(drivername='postgresql+psycopg2')
+        app.config['SQLALCHEMY_DATABASE_URI'] = url.render_as_string(hide_password=False)
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+
+    if url.get_backend_name() == 'sqlite':
+        connect_args = dict(options.get('connect_args') or {})
+        connect_args.setdefault('timeout', app.config['SQLITE_BUSY_TIMEOUT'])
+        options['connect_args'] = connect_args
+        if url.database in (None, '', ':memory:'):
+            for name in QUEUE_POOL_OPTIONS:
+                options.pop(name, None)
+
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    # В режиме WAL NORMAL не теряет целостность при сбое, а fsync
+    # выполняется только при контрольных точках
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+def init_database(app):
+    """Включить WAL для SQLite (вызывается после db.init_app(app))"""
+    from server import db
+
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name == 'sqlite' and not event.contains(engine, 'connect', _set_sqlite_pragmas):
+        event.listen(engine, 'connect', _set_sqlite_pragmas)
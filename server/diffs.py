@@ -0,0 +1,118 @@
+import difflib
+
+from server.cache import WeightedCache
+from server.storage import read_object, get_object_size
+from server.trees import diff_trees
+
+# Сравнение версий: какие файлы изменились (по деревьям) и что изменилось
+# внутри текстовых файлов (построчно). Содержимое объектов неизменно,
+# поэтому построчное сравнение пары объектов можно кэшировать навсегда.
+
+DIFF_CONTEXT_LINES = 3
+DIFF_MAX_FILE_SIZE = 1024 * 1024  # Файлы больше сравниваются только по хэшу
+DIFF_CACHE_MAX_WEIGHT = 32 * 1024 * 1024  # Примерный объём кэша в байтах
+BINARY_SNIFF_SIZE = 8000
+
+
+_diff_cache = WeightedCache(DIFF_CACHE_MAX_WEIGHT)
+
+
+def _decode_lines(content):
+    """Разбить содержимое на строки; None, если файл не текстовый"""
+    if b'\0' in content[:BINARY_SNIFF_SIZE]:
+        return None
+    try:
+        return content.decode('utf-8').splitlines()
+    except UnicodeDecodeError:
+        return None
+
+def _build_hunks(old_lines, new_lines, context):
+    """Построчное сравнение, сгруппированное в блоки с контекстом (как unified diff)"""
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    hunks = []
+    added = removed = 0
+
+    for group in matcher.get_grouped_opcodes(context):
+        first, last = group[0], group[-1]
+        hunk = {
+            'old_start': first[1] + 1,
+            'old_count': last[2] - first[1],
+            'new_start': first[3] + 1,
+            'new_count': last[4] - first[3],
+            'lines': []
+        }
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                hunk['lines'].extend([' ', line] for line in old_lines[i1:i2])
+                continue
+            if tag in ('replace', 'delete'):
+                hunk['lines'].extend(['-', line] for line in old_lines[i1:i2])
+                removed += i2 - i1
+            if tag in ('replace', 'insert'):
+                hunk['lines'].extend(['+', line] for line in new_lines[j1:j2])
+                added += j2 - j1
+        hunks.append(hunk)
+
+    return hunks, added, removed
+
+def diff_blobs(old_hash, new_hash, base_path='storage/repos', context=DIFF_CONTEXT_LINES):
+    """Построчно сравнить два объекта (любой из хэшей может быть None)
+
+    Возвращает {'kind': 'text'|'binary'|'too_large', 'added', 'removed', 'hunks'}.
+    Результат кэшируется по паре хэшей.
+    """
+    key = (old_hash, new_hash, context)
+    cached = _diff_cache.get(key)
+    if cached is not None:
+        return cached
+
+    result = {'kind': 'text', 'added': 0, 'removed': 0, 'hunks': []}
+    sizes = [(get_object_size(h, base_path) or 0) if h else 0 for h in (old_hash, new_hash)]
+
+    if max(sizes) > DIFF_MAX_FILE_SIZE:
+        result['kind'] = 'too_large'
+        weight = 64
+    else:
+        old_lines = _decode_lines(read_object(old_hash, base_path) or b'') if old_hash else []
+        new_lines = _decode_lines(read_object(new_hash, base_path) or b'') if new_hash else []
+
+        if old_lines is None or new_lines is None:
+            result['kind'] = 'binary'
+            weight = 64
+        else:
+            result['hunks'], result['added'], result['removed'] = _build_hunks(old_lines, new_lines, context)
+            weight = 64 + sum(
+                64 + len(line) for hunk in result['hunks'] for _, line in hunk['lines']
+            )
+
+    _diff_cache.put(key, result, weight)
+    return result
+
+def diff_versions(old_tree, new_tree, base_path='storage/repos', path_prefix=None):
+    """Список изменённых файлов между двумя деревьями
+
+    Одинаковые поддеревья пропускаются по хэшу, без чтения их содержимого.
+    Возвращает [{'path', 'status', 'old_hash', 'new_hash', 'old_size', 'new_size'}],
+    status - 'added', 'removed' или 'modified'.
+    """
+    changes = []
+    for path, old_entry, new_entry in diff_trees(old_tree, new_tree, base_path):
+        if path_prefix and path != path_prefix and not path.startswith(path_prefix + '/'):
+            continue
+
+        if old_entry is None:
+            status = 'added'
+        elif new_entry is None:
+            status = 'removed'
+        else:
+            status = 'modified'
+
+        changes.append({
+            'path': path,
+            'status': status,
+            'old_hash': old_entry['hash'] if old_entry else None,
+            'new_hash': new_entry['hash'] if new_entry else None,
+            'old_size': old_entry['size'] if old_entry else None,
+            'new_size': new_entry['size'] if new_entry else None,
+        })
+    return changes
@@ -1,7 +1,8 @@
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileAllowed, FileRequired
-from wtforms import StringField, PasswordField, BooleanField, SubmitField, TextAreaField, HiddenField
-from wtforms.validators import DataRequired, Email, EqualTo, Length, Optional, ValidationError
+from wtforms import StringField, PasswordField, BooleanField, SubmitField, TextAreaField, HiddenField, IntegerField, SelectField
+from wtforms.widgets import HiddenInput
+from wtforms.validators import DataRequired, Email, EqualTo, Length, Optional, NumberRange, ValidationError
 from server.models import User
 
 
@@ -88,6 +89,26 @@ class EditRepoForm(FlaskForm):
     submit = SubmitField('Сохранить изменения')
 
 
+class CollaboratorForm(FlaskForm):
+    """Форма добавления участника репозитория"""
+    username = StringField('Имя пользователя', 
+                          validators=[DataRequired(), 
+                                     Length(min=3, max=64)],
+                          render_kw={"placeholder": "Имя пользователя"})
+    
+    role = SelectField('Права', 
+                      choices=[('read', 'Чтение'), ('write', 'Чтение и запись')],
+                      default='read')
+    
+    submit = SubmitField('Добавить участника')
+    
+    def validate_username(self, username):
+        """Проверка, что пользователь существует"""
+        user = User.query.filter_by(username=username.data).first()
+        if user is None:
+            raise ValidationError('Пользователь с таким именем не найден.')
+
+
 class UploadFileForm(FlaskForm):
     """Форма загрузки файла"""
     file = FileField('Файл', 
@@ -100,6 +121,7 @@ class UploadFileForm(FlaskForm):
                           validators=[Optional()],
                           render_kw={"placeholder": "folder/subfolder/"})
     
+    extract_archive = BooleanField('Распаковать архив (zip, tar, tar.gz) одним коммитом')
     submit = SubmitField('Загрузить файл')
 
 
@@ -124,4 +146,19 @@ class EditFileForm(FlaskForm):
                           render_kw={"rows": 20})
     
     filename = HiddenField()
-    submit = SubmitField('Сохранить файл')
\ No newline at end of file
+    submit = SubmitField('Сохранить файл')
+
+
+class EditFileWindowForm(FlaskForm):
+    """Форма редактирования окна строк большого файла"""
+    content = TextAreaField('Строки файла', 
+                          validators=[Optional()],
+                          render_kw={"rows": 20})
+    
+    # Хэш версии файла, с которой открыто окно, и диапазон строк окна
+    base_hash = HiddenField(validators=[DataRequired()])
+    start = IntegerField(widget=HiddenInput(), validators=[NumberRange(min=0)])
+    end = IntegerField(widget=HiddenInput(), validators=[NumberRange(min=0)])
+    
+    filename = HiddenField()
+    submit = SubmitField('Сохранить строки')
@@ -0,0 +1,264 @@
+import json
+import logging
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+# Очередь фоновых задач.
+#
+# Задачи хранятся в таблице jobs основной базы и добавляются в ту же
+# транзакцию, что и изменение, которое их породило: если коммит
+# зафиксирован, задача тоже сохранена и будет выполнена даже после
+# перезапуска сервера. Запрос пользователя не ждёт выполнения.
+#
+# Выполняют задачи потоки-исполнители (JOB_WORKERS в каждом процессе
+# веб-сервера, либо отдельный процесс flask jobs run). Упавшая задача
+# повторяется с растущей паузой до JOB_MAX_ATTEMPTS раз. Задача с
+# ключом (key) - идемпотентная: пока такая задача ждёт очереди, новая с
+# тем же ключом не добавляется. Задачи последовательного вида (serial)
+# выполняются строго по одной и в порядке добавления.
+#
+# Пока обработчик работает, отдельный поток раз в JOB_HEARTBEAT_INTERVAL
+# секунд обновляет locked_at. Задача, у которой отметка не обновлялась
+# дольше JOB_TIMEOUT, принадлежала завершившемуся процессу и
+# возвращается в очередь; долгая, но живая задача повторно не запускается.
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+_serial_kinds = set()
+_wakeup = threading.Event()
+_workers_lock = threading.Lock()
+_workers_started = set()
+
+
+def job_handler(kind, serial=False):
+    """Зарегистрировать обработчик задач вида kind: функция(payload)"""
+    def decorator(func):
+        _handlers[kind] = func
+        if serial:
+            _serial_kinds.add(kind)
+        return func
+    return decorator
+
+
+def enqueue_job(kind, payload=None, key=None, delay=0):
+    """Добавить задачу в текущую транзакцию
+
+    Задача сохранится вместе с остальными изменениями при db.session.commit().
+    Если задача с таким же ключом уже ждёт выполнения, новая не добавляется.
+    """
+    from server.models import db, Job
+
+    if key is not None:
+        for pending in db.session.new:
+            if isinstance(pending, Job) and pending.key == key:
+                return pending
+        existing = Job.query.filter_by(key=key, status='pending').first()
+        if existing is not None:
+            return existing
+
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload or {}),
+        key=key,
+        run_after=datetime.utcnow() + timedelta(seconds=delay)
+    )
+    db.session.add(job)
+    db.session.info['jobs_enqueued'] = True
+    return job
+
+def _wake_workers(session):
+    if session.info.pop('jobs_enqueued', False):
+        _wakeup.set()
+
+def _discard_after_rollback(session):
+    session.info.pop('jobs_enqueued', None)
+
+
+def _requeue_abandoned(app, now):
+    """Вернуть в очередь задачи процессов, которые завершились посреди работы
+
+    Брошенной задача становится не раньше чем через JOB_TIMEOUT, поэтому
+    искать такие задачи чаще раза в JOB_HEARTBEAT_INTERVAL незачем;
+    запись в базу - только если они нашлись.
+    """
+    from server.models import db, Job
+
+    # Время следующей проверки (time.monotonic()) - своё у каждого приложения
+    if time.monotonic() < app.extensions.get('jobs_requeue_check', 0):
+        return
+    app.extensions['jobs_requeue_check'] = time.monotonic() + app.config['JOB_HEARTBEAT_INTERVAL']
+
+    stale = (Job.status == 'running', Job.locked_at < now - timedelta(seconds=app.config['JOB_TIMEOUT']))
+    if db.session.query(Job.id).filter(*stale).first() is None:
+        db.session.rollback()
+        return
+    db.session.execute(db.update(Job).where(*stale).values(status='pending'))
+    db.session.commit()
+
+def _claim_job(app):
+    """Взять следующую готовую задачу
+
+    Задача помечается выполняемой; возвращается (id, вид, данные, попытка).
+    """
+    from server.models import db, Job
+
+    now = datetime.utcnow()
+    _requeue_abandoned(app, now)
+
+    candidates = db.session.query(Job.id, Job.kind).filter(
+        Job.status == 'pending', Job.run_after <= now
+    ).order_by(Job.id).limit(100).all()
+    db.session.rollback()
+
+    tried_serial = set()
+    for job_id, kind in candidates:
+        condition = [Job.id == job_id, Job.status == 'pending']
+        if kind in _serial_kinds:
+            # Последовательная задача берётся, только если раньше неё не
+            # осталось ждущих или выполняемых задач того же вида. Условие
+            # проверяется в том же UPDATE, что и захват: два исполнителя не
+            # возьмут задачи одного вида одновременно
+            if kind in tried_serial:
+                continue
+            tried_serial.add(kind)
+            earlier = db.aliased(Job)
+            condition.append(~db.exists().where(
+                earlier.kind == kind, earlier.id < job_id, earlier.status.in_(('pending', 'running'))
+            ))
+
+        claimed = db.session.execute(
+            db.update(Job).where(*condition)
+            .values(status='running', locked_at=now, attempts=Job.attempts + 1)
+        ).rowcount
+        if not claimed:
+            db.session.rollback()
+            continue
+
+        job = db.session.get(Job, job_id)
+        if job.key is not None:
+            # Ждущие задачи с тем же ключом выполнит эта
+            db.session.execute(
+                db.delete(Job).where(Job.key == job.key, Job.status == 'pending', Job.id != job_id)
+            )
+        db.session.commit()
+        return job.id, job.kind, json.loads(job.payload), job.attempts
+    return None
+
+def _finish_job(app, job_id, attempts, error=None):
+    from server.models import db, Job
+
+    if error is None:
+        # Выполненные задачи не храним
+        db.session.execute(db.delete(Job).where(Job.id == job_id))
+    elif attempts >= app.config['JOB_MAX_ATTEMPTS']:
+        db.session.execute(
+            db.update(Job).where(Job.id == job_id)
+            .values(status='failed', last_error=error, locked_at=None)
+        )
+    else:
+        delay = app.config['JOB_RETRY_DELAY'] * 2 ** (attempts - 1)
+        db.session.execute(
+            db.update(Job).where(Job.id == job_id)
+            .values(status='pending', last_error=error, locked_at=None,
+                    run_after=datetime.utcnow() + timedelta(seconds=delay))
+        )
+    db.session.commit()
+
+def _keep_claim(app, job_id, stop):
+    """Продлевать захват задачи, пока не установлен stop"""
+    from server.models import db, Job
+
+    while not stop.wait(app.config['JOB_HEARTBEAT_INTERVAL']):
+        with app.app_context():
+            try:
+                db.session.execute(
+                    db.update(Job).where(Job.id == job_id, Job.status == 'running')
+                    .values(locked_at=datetime.utcnow())
+                )
+                db.session.commit()
+            except Exception:
+                # Следующая попытка - через интервал; до JOB_TIMEOUT время есть
+                logger.exception('Не удалось продлить задачу %s', job_id)
+            finally:
+                db.session.remove()
+
+def run_next_job(app):
+    """Выполнить одну готовую задачу; False, если выполнять нечего"""
+    from server.models import db
+
+    with app.app_context():
+        try:
+            claimed = _claim_job(app)
+            if claimed is None:
+                return False
+
+            job_id, kind, payload, attempts = claimed
+            stop = threading.Event()
+            heartbeat = threading.Thread(
+                target=_keep_claim, args=(app, job_id, stop), name=f'scvp-job-{job_id}', daemon=True
+            )
+            heartbeat.start()
+            try:
+                handler = _handlers.get(kind)
+                if handler is None:
+                    raise LookupError(f'Неизвестный вид задачи: {kind}')
+                handler(payload)
+                error = None
+            except Exception:
+                db.session.rollback()
+                logger.exception('Задача %s (%s) завершилась ошибкой', job_id, kind)
+                error = traceback.format_exc()
+            finally:
+                stop.set()
+                heartbeat.join()
+            _finish_job(app, job_id, attempts, error)
+            return True
+        finally:
+            db.session.remove()
+
+def work(app, stop=None):
+    """Цикл исполнителя: выполнять задачи, пока не установлен stop"""
+    while stop is None or not stop.is_set():
+        try:
+            if run_next_job(app):
+                continue
+        except Exception:
+            # Например, база временно недоступна - попробуем позже
+            logger.exception('Ошибка очереди задач')
+        _wakeup.wait(app.config['JOB_POLL_INTERVAL'])
+        _wakeup.clear()
+
+
+def start_job_workers(app, count=None):
+    """Запустить потоки-исполнители (один раз на приложение в процессе)"""
+    count = app.config['JOB_WORKERS'] if count is None else count
+    with _workers_lock:
+        if id(app) in _workers_started or count <= 0:
+            return
+        _workers_started.add(id(app))
+    for number in range(count):
+        threading.Thread(target=work, args=(app,), name=f'scvp-jobs-{number}', daemon=True).start()
+
+def init_jobs(app):
+    """Подключить очередь задач к приложению
+
+    Исполнители запускаются при первом запросе: так они появляются в
+    каждом рабочем процессе веб-сервера, но не в консольных командах.
+    """
+    from server.models import db
+
+    # Модули регистрируют свои обработчики при импорте
+    from server import search, cleanup, archives, packs  # noqa: F401
+
+    if not event.contains(db.session, 'after_commit', _wake_workers):
+        event.listen(db.session, 'after_commit', _wake_workers)
+        event.listen(db.session, 'after_rollback', _discard_after_rollback)
+
+    @app.before_request
+    def _start_workers():
+        start_job_workers(app)
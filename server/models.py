@@ -1,7 +1,13 @@
+import hashlib
+import secrets
 from datetime import datetime
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from server import db
+from server.passwords import hash_password, verify_password, needs_rehash
+
+def hash_api_token(token):
+    """Хэш токена клиента scvp"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
 
 class User(UserMixin, db.Model):
     """Модель пользователя"""
@@ -13,6 +19,7 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(256), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     theme = db.Column(db.String(10), default='light')
+    api_token_hash = db.Column(db.String(64), unique=True, nullable=True)  # Токен клиента scvp
     
     # Связи
     repositories = db.relationship('Repository', backref='owner', lazy='dynamic', cascade='all, delete-orphan')
@@ -20,11 +27,25 @@ class User(UserMixin, db.Model):
     
     def set_password(self, password):
         """Хеширование пароля"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        """Проверка пароля"""
-        return check_password_hash(self.password_hash, password)
+        """Проверка пароля
+        
+        Если хэш получен со старыми параметрами, пароль перехешируется
+        (изменение сохранится при следующем commit).
+        """
+        if not verify_password(self.password_hash, password):
+            return False
+        if needs_rehash(self.password_hash):
+            self.set_password(password)
+        return True
+    
+    def generate_api_token(self):
+        """Выпустить новый токен для клиента scvp (в БД хранится только его хэш)"""
+        token = secrets.token_urlsafe(32)
+        self.api_token_hash = hash_api_token(token)
+        return token
     
     def __repr__(self):
         return f'<User {self.username}>'
@@ -32,6 +53,9 @@ class User(UserMixin, db.Model):
 class Repository(db.Model):
     """Модель репозитория"""
     __tablename__ = 'repositories'
+    __table_args__ = (
+        db.Index('ix_repositories_user_updated', 'user_id', 'updated_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -41,9 +65,26 @@ class Repository(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_public = db.Column(db.Boolean, default=False)
     
+    # Время удаления: удалённый репозиторий сразу скрывается, а его файлы
+    # и записи убирает фоновая очистка (server/cleanup.py)
+    deleted_at = db.Column(db.DateTime, nullable=True)
+    
+    # Голова истории: номер последней версии, её коммит и дерево
+    head_version = db.Column(db.Integer, nullable=False, default=0)
+    head_hash = db.Column(db.String(64), nullable=True)
+    head_tree = db.Column(db.String(64), nullable=True)
+    
+    # Сводка по последней версии, обновляется вместе с головой в create_commit,
+    # чтобы списки репозиториев не считали коммиты и файлы запросами
+    commit_count = db.Column(db.Integer, nullable=False, default=0)
+    file_count = db.Column(db.Integer, nullable=False, default=0)
+    total_size = db.Column(db.BigInteger, nullable=False, default=0)
+    
     # Связи
     commits = db.relationship('Commit', backref='repository', lazy='dynamic', cascade='all, delete-orphan')
     files = db.relationship('RepoFile', backref='repository', lazy='dynamic', cascade='all, delete-orphan')
+    uploads = db.relationship('UploadSession', backref='repository', lazy='dynamic', cascade='all, delete-orphan')
+    collaborators = db.relationship('Collaborator', backref='repository', lazy='dynamic', cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Repository {self.name}>'
@@ -51,13 +92,19 @@ class Repository(db.Model):
 class Commit(db.Model):
     """Модель коммита (изменения)"""
     __tablename__ = 'commits'
+    __table_args__ = (
+        db.UniqueConstraint('repo_id', 'version_number', name='uq_commits_repo_version'),
+        db.UniqueConstraint('repo_id', 'commit_hash', name='uq_commits_repo_hash'),
+        db.Index('ix_commits_repo_created', 'repo_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     repo_id = db.Column(db.Integer, db.ForeignKey('repositories.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     message = db.Column(db.String(500), nullable=False)
-    commit_hash = db.Column(db.String(64), unique=True, nullable=False)
+    commit_hash = db.Column(db.String(64), nullable=False, index=True)  # Хэш содержимого (см. compute_commit_hash)
     parent_hash = db.Column(db.String(64), nullable=True)
+    tree_hash = db.Column(db.String(64), nullable=True)  # Корневое дерево версии
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     version_number = db.Column(db.Integer, nullable=False, default=1)
     
@@ -67,16 +114,75 @@ class Commit(db.Model):
 class RepoFile(db.Model):
     """Модель файла в репозитории"""
     __tablename__ = 'repo_files'
+    __table_args__ = (
+        db.UniqueConstraint('repo_id', 'filepath', name='uq_repo_files_repo_path'),
+        db.Index('ix_repo_files_repo_parent', 'repo_id', 'parent_path'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     repo_id = db.Column(db.Integer, db.ForeignKey('repositories.id'), nullable=False)
     filename = db.Column(db.String(255), nullable=False)
     filepath = db.Column(db.String(500), nullable=False)  # Относительный путь
-    content_hash = db.Column(db.String(64), nullable=False)
-    size = db.Column(db.Integer, nullable=False)  # Размер в байтах
+    parent_path = db.Column(db.String(500), nullable=False, default='')  # Папка ('' - корень)
+    content_hash = db.Column(db.String(64), nullable=False)  # У папок пустая строка
+    size = db.Column(db.BigInteger, nullable=False)  # Размер в байтах
     is_directory = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def __repr__(self):
-        return f'<RepoFile {self.filename}>'
\ No newline at end of file
+        return f'<RepoFile {self.filename}>'
+
+class Collaborator(db.Model):
+    """Участник репозитория: права чтения или записи (см. server/permissions.py)"""
+    __tablename__ = 'collaborators'
+    __table_args__ = (
+        # Проверка прав ищет по (repo_id, user_id), список общих репозиториев - по user_id
+        db.UniqueConstraint('repo_id', 'user_id', name='uq_collaborators_repo_user'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    repo_id = db.Column(db.Integer, db.ForeignKey('repositories.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    role = db.Column(db.String(10), nullable=False, default='read')  # read, write
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    user = db.relationship('User')
+    
+    def __repr__(self):
+        return f'<Collaborator {self.user_id} in {self.repo_id}: {self.role}>'
+
+class UploadSession(db.Model):
+    """Модель докачиваемой загрузки большого файла"""
+    __tablename__ = 'upload_sessions'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    repo_id = db.Column(db.Integer, db.ForeignKey('repositories.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    filepath = db.Column(db.String(500), nullable=False)
+    total_size = db.Column(db.BigInteger, nullable=True)  # Если клиент сообщил размер заранее
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<UploadSession {self.id}: {self.filepath}>'
+
+class Job(db.Model):
+    """Фоновая задача (см. server/jobs.py)"""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status_id', 'status', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    key = db.Column(db.String(200), nullable=True, index=True)  # Ключ идемпотентности
+    status = db.Column(db.String(10), nullable=False, default='pending')  # pending, running, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Job {self.id}: {self.kind} {self.status}>'
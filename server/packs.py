@@ -0,0 +1,372 @@
+import os
+import json
+import zlib
+import uuid
+import threading
+
+from flask import current_app
+
+from server.storage import get_objects_path, get_object_path, get_objects_tmp_path, is_object_hash
+from server.jobs import job_handler
+
+# Пак-файлы хранят старые версии объектов компактно: объект записывается
+# либо целиком, либо как дельта от похожего объекта (обычно следующей
+# версии того же файла). Каждая запись сжата zlib.
+#
+# pack-<id>.pack - записи подряд
+# pack-<id>.idx  - JSON {хэш: [смещение, длина, база или null, глубина]}
+#
+# Дельта - последовательность команд: вставить байты или скопировать
+# участок базового объекта. Глубина цепочки дельт ограничена, поэтому
+# чтение любого объекта требует не более max_depth применений дельты.
+
+DELTA_INSERT = 0
+DELTA_COPY = 1
+
+# Участки короче этого выгоднее вставить, чем копировать
+MIN_COPY = 8
+# Длинные строки и бинарные данные режутся на блоки такого размера
+MAX_CHUNK = 64
+
+DEFAULT_WINDOW = 10
+DEFAULT_MAX_DEPTH = 10
+
+_index_lock = threading.Lock()
+_index_cache = {}
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def _split_chunks(data):
+    """Разбить данные на строки, а длинные строки - на блоки"""
+    chunks = []
+    start = 0
+    length = len(data)
+    while start < length:
+        end = data.find(b'\n', start, start + MAX_CHUNK)
+        end = start + MAX_CHUNK if end == -1 else end + 1
+        chunks.append(data[start:end])
+        start = end
+    return chunks
+
+def create_delta(base, target):
+    """Построить дельту, превращающую base в target"""
+    index = {}
+    offset = 0
+    for chunk in _split_chunks(base):
+        if len(chunk) >= MIN_COPY:
+            index.setdefault(chunk, offset)
+        offset += len(chunk)
+
+    out = bytearray()
+    _write_varint(out, len(base))
+    _write_varint(out, len(target))
+
+    insert = bytearray()
+    copy_start = copy_end = None
+
+    def flush_insert():
+        if insert:
+            out.append(DELTA_INSERT)
+            _write_varint(out, len(insert))
+            out.extend(insert)
+            insert.clear()
+
+    def flush_copy():
+        if copy_start is not None:
+            out.append(DELTA_COPY)
+            _write_varint(out, copy_start)
+            _write_varint(out, copy_end - copy_start)
+
+    for chunk in _split_chunks(target):
+        size = len(chunk)
+
+        # Сначала пробуем продолжить текущее копирование
+        if copy_start is not None and base[copy_end:copy_end + size] == chunk:
+            copy_end += size
+            continue
+
+        offset = index.get(chunk) if size >= MIN_COPY else None
+        if offset is None:
+            flush_copy()
+            copy_start = copy_end = None
+            insert.extend(chunk)
+        else:
+            flush_copy()
+            flush_insert()
+            copy_start, copy_end = offset, offset + size
+
+    flush_copy()
+    flush_insert()
+    return bytes(out)
+
+def apply_delta(base, delta):
+    """Применить дельту к базовому объекту"""
+    base_size, pos = _read_varint(delta, 0)
+    target_size, pos = _read_varint(delta, pos)
+
+    if base_size != len(base):
+        raise ValueError('Дельта построена для другого базового объекта')
+
+    result = bytearray()
+    while pos < len(delta):
+        op = delta[pos]
+        pos += 1
+        if op == DELTA_COPY:
+            offset, pos = _read_varint(delta, pos)
+            size, pos = _read_varint(delta, pos)
+            result.extend(base[offset:offset + size])
+        else:
+            size, pos = _read_varint(delta, pos)
+            result.extend(delta[pos:pos + size])
+            pos += size
+
+    if len(result) != target_size:
+        raise ValueError('Повреждённая дельта')
+    return bytes(result)
+
+
+def get_packs_path(base_path='storage/repos'):
+    """Получить путь к папке пак-файлов"""
+    return os.path.join(os.path.dirname(get_objects_path(base_path)), 'packs')
+
+def load_pack_index(base_path='storage/repos'):
+    """Загрузить индексы всех пак-файлов: {хэш: (пак, смещение, длина, база, глубина)}
+
+    Индексы кэшируются и перечитываются, когда в папке появляются новые паки.
+    """
+    packs_path = get_packs_path(base_path)
+    try:
+        mtime = os.stat(packs_path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+
+    with _index_lock:
+        cached = _index_cache.get(packs_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        index = {}
+        for name in sorted(os.listdir(packs_path)):
+            if not name.endswith('.idx'):
+                continue
+            pack_file = os.path.join(packs_path, name[:-4] + '.pack')
+            with open(os.path.join(packs_path, name), encoding='utf-8') as f:
+                for object_hash, (offset, length, base_hash, depth) in json.load(f).items():
+                    index[object_hash] = (pack_file, offset, length, base_hash, depth)
+
+        _index_cache[packs_path] = (mtime, index)
+        return index
+
+def packed_object_exists(object_hash, base_path='storage/repos'):
+    """Проверить, есть ли объект в пак-файлах"""
+    return object_hash in load_pack_index(base_path)
+
+def read_packed_object(object_hash, base_path='storage/repos'):
+    """Прочитать объект из пак-файлов, восстановив цепочку дельт"""
+    from server.storage import read_object
+
+    entry = load_pack_index(base_path).get(object_hash)
+    if entry is None:
+        return None
+
+    pack_file, offset, length, base_hash, depth = entry
+    with open(pack_file, 'rb') as f:
+        f.seek(offset)
+        data = zlib.decompress(f.read(length))
+
+    if base_hash is None:
+        return data
+
+    base = read_object(base_hash, base_path)
+    if base is None:
+        raise LookupError(f'Базовый объект {base_hash} не найден')
+    return apply_delta(base, data)
+
+def get_object_depth(object_hash, base_path='storage/repos'):
+    """Глубина цепочки дельт объекта (0 - хранится целиком)"""
+    entry = load_pack_index(base_path).get(object_hash)
+    return entry[4] if entry else 0
+
+def write_pack(entries, base_path='storage/repos'):
+    """Записать пак-файл
+
+    entries - итератор (хэш, данные, база или None, глубина), где данные -
+    либо полное содержимое, либо дельта от базы. Записи пишутся по мере
+    поступления, в памяти остаётся только индекс.
+    """
+    packs_path = get_packs_path(base_path)
+    os.makedirs(packs_path, exist_ok=True)
+    tmp_path = get_objects_tmp_path(base_path)
+
+    pack_id = uuid.uuid4().hex
+    tmp_pack = os.path.join(tmp_path, f'pack-{pack_id}.pack')
+    tmp_index = os.path.join(tmp_path, f'pack-{pack_id}.idx')
+
+    index = {}
+    offset = 0
+    with open(tmp_pack, 'wb') as f:
+        for object_hash, data, base_hash, depth in entries:
+            packed = zlib.compress(data)
+            f.write(packed)
+            index[object_hash] = [offset, len(packed), base_hash, depth]
+            offset += len(packed)
+
+    with open(tmp_index, 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+
+    # Индекс появляется последним: пока его нет, пак никто не читает
+    os.replace(tmp_pack, os.path.join(packs_path, f'pack-{pack_id}.pack'))
+    os.replace(tmp_index, os.path.join(packs_path, f'pack-{pack_id}.idx'))
+    return pack_id
+
+def list_loose_objects(base_path='storage/repos'):
+    """Перечислить хэши всех объектов, хранящихся отдельными файлами"""
+    objects_path = get_objects_path(base_path)
+    if not os.path.exists(objects_path):
+        return
+
+    for prefix in os.listdir(objects_path):
+        if len(prefix) != 2:
+            continue
+        for rest in os.listdir(os.path.join(objects_path, prefix)):
+            # Посторонние файлы (не хэши) в хранилище не считаются объектами
+            if is_object_hash(prefix + rest):
+                yield prefix + rest
+
+def _collect_version_chains(base_path):
+    """Собрать историю версий каждого файла по деревьям коммитов
+
+    Возвращает списки хэшей от новых версий к старым: соседние версии
+    одного файла - лучшие кандидаты друг для друга при построении дельт.
+    """
+    from server.models import Commit
+    from server.trees import diff_trees
+
+    chains = {}
+    commits = Commit.query.filter(Commit.tree_hash.isnot(None)).order_by(
+        Commit.repo_id, Commit.version_number
+    ).with_entities(Commit.repo_id, Commit.tree_hash)
+
+    previous_repo = previous_tree = None
+    for repo_id, tree_hash in commits:
+        if repo_id != previous_repo:
+            previous_repo, previous_tree = repo_id, None
+        for path, old_entry, new_entry in diff_trees(previous_tree, tree_hash, base_path):
+            if new_entry is not None:
+                chain = chains.setdefault((repo_id, path), [])
+                if new_entry['hash'] not in chain:
+                    chain.append(new_entry['hash'])
+        previous_tree = tree_hash
+
+    return [list(reversed(chain)) for chain in chains.values()]
+
+def _choose_delta(content, neighbours, depths, max_depth, base_path):
+    """Выбрать, как хранить объект: (данные, база или None, глубина)
+
+    Из соседей берётся база с самой короткой дельтой, не превышающей
+    max_depth по глубине цепочки.
+    """
+    from server.storage import read_object
+
+    best = (content, None, 0)
+    for base_hash in neighbours:
+        depth = depths.get(base_hash, get_object_depth(base_hash, base_path)) + 1
+        if depth > max_depth:
+            continue
+        base = read_object(base_hash, base_path)
+        if base is None:
+            continue
+        delta = create_delta(base, content)
+        if len(delta) < len(best[0]):
+            best = (delta, base_hash, depth)
+
+    # Дельта должна заметно экономить место, иначе храним целиком
+    if best[1] is not None and len(best[0]) > len(content) // 2:
+        return content, None, 0
+    return best
+
+def repack_objects(base_path='storage/repos', window=DEFAULT_WINDOW, max_depth=DEFAULT_MAX_DEPTH):
+    """Упаковать отдельные объекты в новый пак-файл
+
+    Объекты текущих версий файлов (RepoFile) остаются отдельными файлами,
+    на них ссылаются рабочие копии. Остальные объекты записываются как
+    дельты от наиболее похожего соседа: сначала среди других версий того
+    же файла, затем среди объектов близкого размера. Возвращает число
+    упакованных объектов.
+
+    Объект, от которого уже построены дельты в других паках, хранится
+    целиком: его глубина входит в глубину зависимых объектов, и дельта
+    от него удлинила бы их цепочки сверх max_depth.
+    """
+    from server.models import RepoFile
+    from server.storage import read_object
+
+    head_hashes = {content_hash for content_hash, in RepoFile.query.with_entities(RepoFile.content_hash)}
+    pack_index = load_pack_index(base_path)
+    candidates = {
+        object_hash for object_hash in list_loose_objects(base_path)
+        if object_hash not in head_hashes and object_hash not in pack_index
+    }
+    if not candidates:
+        return 0
+
+    # Порядок упаковки: цепочки версий от новых к старым, затем остальное
+    ordered = []
+    for chain in _collect_version_chains(base_path):
+        for position, object_hash in enumerate(chain):
+            if object_hash in candidates:
+                ordered.append((object_hash, chain[max(0, position - window):position]))
+                candidates.discard(object_hash)
+
+    by_size = sorted(candidates, key=lambda h: os.path.getsize(get_object_path(h, base_path)), reverse=True)
+    for position, object_hash in enumerate(by_size):
+        ordered.append((object_hash, by_size[max(0, position - window):position]))
+
+    # Бывшие текущие версии, ставшие базами дельт, пока были отдельными файлами
+    delta_bases = {entry[3] for entry in pack_index.values() if entry[3] is not None}
+
+    depths = {}
+    packed = []
+
+    def generate_entries():
+        for object_hash, neighbours in ordered:
+            content = read_object(object_hash, base_path)
+            data, base_hash, depth = _choose_delta(
+                content, () if object_hash in delta_bases else neighbours, depths, max_depth, base_path
+            )
+            depths[object_hash] = depth
+            packed.append(object_hash)
+            yield object_hash, data, base_hash, depth
+
+    write_pack(generate_entries(), base_path)
+
+    for object_hash in packed:
+        try:
+            os.remove(get_object_path(object_hash, base_path))
+        except FileNotFoundError:
+            pass
+
+    return len(packed)
+
+@job_handler('repack', serial=True)
+def _repack_job(payload):
+    repack_objects(
+        window=payload.get('window') or current_app.config['PACK_WINDOW'],
+        max_depth=payload.get('depth') or current_app.config['PACK_MAX_DELTA_DEPTH']
+    )
@@ -0,0 +1,72 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Хэширование паролей.
+#
+# scrypt и pbkdf2 специально медленные, поэтому вычисляются в отдельном
+# пуле из PASSWORD_HASH_WORKERS потоков (hashlib отпускает GIL на время
+# вычисления). Одновременно выполняется не больше PASSWORD_HASH_WORKERS
+# проверок, и ещё PASSWORD_HASH_QUEUE ждут очереди; остальные попытки
+# входа сразу отклоняются. Так поток входов не забирает весь процессор
+# у остальных запросов.
+#
+# Ожидающий проверки запрос занимает поток обработки запросов, поэтому
+# проверок (вместе с очередью) не больше половины REQUEST_THREADS:
+# остальные потоки всегда свободны для других запросов.
+
+_pool = None
+_slots = None
+_pool_lock = threading.Lock()
+
+
+class PasswordCheckBusy(Exception):
+    """Слишком много одновременных проверок пароля"""
+
+
+def password_check_limit(config):
+    """Сколько проверок пароля может одновременно занимать потоки запросов"""
+    wanted = config['PASSWORD_HASH_WORKERS'] + config['PASSWORD_HASH_QUEUE']
+    return max(1, min(wanted, config['REQUEST_THREADS'] // 2))
+
+def _get_pool():
+    """Пул потоков хэширования (создаётся при первом обращении в каждом процессе)"""
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is None:
+            workers = current_app.config['PASSWORD_HASH_WORKERS']
+            _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scvp-password')
+            _slots = threading.BoundedSemaphore(password_check_limit(current_app.config))
+    return _pool, _slots
+
+def _run_in_pool(func, *args):
+    pool, slots = _get_pool()
+    if not slots.acquire(blocking=False):
+        raise PasswordCheckBusy()
+    try:
+        return pool.submit(func, *args).result()
+    finally:
+        slots.release()
+
+
+def hash_password(password):
+    """Хэш пароля с параметрами из конфигурации"""
+    return _run_in_pool(
+        generate_password_hash,
+        password,
+        current_app.config['PASSWORD_HASH_METHOD'],
+        current_app.config['PASSWORD_SALT_LENGTH']
+    )
+
+def verify_password(password_hash, password):
+    """Проверить пароль по хэшу"""
+    return _run_in_pool(check_password_hash, password_hash, password)
+
+def needs_rehash(password_hash):
+    """Хэш получен с другими параметрами, чем заданы сейчас в конфигурации"""
+    method, _, rest = password_hash.partition('$')
+    salt = rest.partition('$')[0]
+    return (method != current_app.config['PASSWORD_HASH_METHOD']
+            or len(salt) != current_app.config['PASSWORD_SALT_LENGTH'])
@@ -0,0 +1,160 @@
+from functools import wraps
+
+from flask import current_app, g
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from werkzeug.exceptions import Forbidden
+
+from server.cache import TTLCache
+from server.utils import get_repo_or_404
+
+# Права доступа к репозиториям.
+#
+# Уровни доступа: чтение, запись и владение. Владелец - Repository.user_id,
+# читать публичный репозиторий может любой пользователь, остальным права
+# дают записи Collaborator (роль read или write). Маршрут с параметром
+# repo_id оборачивается в repo_access(уровень): репозиторий загружается
+# один раз (в g.repo), а роль участника запоминается на время запроса в
+# flask.g и в кэше процесса на PERMISSION_CACHE_TTL секунд. Поэтому
+# проверка прав обычно не добавляет запросов к базе. Изменение участника
+# через ORM сбрасывает кэш этого процесса сразу, в других процессах
+# запись устаревает не дольше чем через PERMISSION_CACHE_TTL.
+
+READ = 1
+WRITE = 2
+OWNER = 3
+
+# Роль участника -> уровень доступа
+ROLES = {'read': READ, 'write': WRITE}
+
+
+class RepoAccessDenied(Forbidden):
+    """Недостаточно прав для действия с репозиторием (403)
+
+    message - текст для пользователя; страницы сайта показывают его и
+    возвращают на страницу репозитория, а без него отвечают 403.
+    """
+
+    def __init__(self, repo, level, message=None):
+        super().__init__()
+        self.repo = repo
+        self.level = level
+        self.message = message
+
+
+def get_permission_cache():
+    return current_app.extensions['permission_cache']
+
+def get_collaborator_role(user_id, repo_id):
+    """Роль пользователя в репозитории ('' - не участник)"""
+    from server.models import db, Collaborator
+
+    key = (user_id, repo_id)
+    request_roles = g.setdefault('repo_roles', {})
+    if key in request_roles:
+        return request_roles[key]
+
+    cache = get_permission_cache()
+    role = cache.get(key)
+    if role is None:
+        role = db.session.query(Collaborator.role).filter_by(
+            repo_id=repo_id, user_id=user_id
+        ).scalar() or ''
+        cache.set(key, role)
+
+    request_roles[key] = role
+    return role
+
+def get_repo_permission(repo, user=None):
+    """Уровень доступа пользователя к репозиторию: 0, READ, WRITE или OWNER"""
+    user = current_user if user is None else user
+    level = 0
+    if user.is_authenticated:
+        if repo.user_id == user.id:
+            return OWNER
+        level = ROLES.get(get_collaborator_role(user.id, repo.id), 0)
+    if repo.is_public:
+        level = max(level, READ)
+    return level
+
+def has_repo_permission(repo, level, user=None):
+    """Есть ли у пользователя (по умолчанию текущего) нужный уровень доступа"""
+    user = current_user if user is None else user
+
+    # Владельцу и читателям публичного репозитория участники не нужны
+    if user.is_authenticated and repo.user_id == user.id:
+        return True
+    if level <= READ and repo.is_public:
+        return True
+    return get_repo_permission(repo, user) >= level
+
+def require_repo(repo_id, level=READ, message=None):
+    """Получить репозиторий (один раз за запрос) и проверить права
+
+    Без прав - RepoAccessDenied, удалённого или несуществующего - 404.
+    """
+    repo = g.get('repo')
+    if repo is None or repo.id != repo_id:
+        repo = get_repo_or_404(repo_id)
+        g.repo = repo
+    if not has_repo_permission(repo, level):
+        raise RepoAccessDenied(repo, level, message)
+    return repo
+
+def repo_access(level=READ, message=None):
+    """Декоратор маршрута с параметром repo_id: проверить права на репозиторий
+
+    Репозиторий доступен представлению как g.repo.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            require_repo(kwargs['repo_id'], level, message)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def invalidate_permission(user_id, repo_id):
+    """Сбросить закэшированную роль пользователя в репозитории"""
+    get_permission_cache().delete((user_id, repo_id))
+    if 'repo_roles' in g:
+        g.repo_roles.pop((user_id, repo_id), None)
+
+
+def _forget_changed_collaborator(mapper, connection, target):
+    # Как и для пользователей (server/cache.py): сбрасываем сразу и
+    # ещё раз после фиксации
+    invalidate_permission(target.user_id, target.repo_id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_collaborators', set()).add((target.user_id, target.repo_id))
+
+def _forget_after_commit(session):
+    for user_id, repo_id in session.info.pop('changed_collaborators', ()):
+        invalidate_permission(user_id, repo_id)
+
+def _discard_after_rollback(session):
+    session.info.pop('changed_collaborators', None)
+
+def init_permissions(app):
+    """Создать кэш прав приложения и подписаться на изменения Collaborator"""
+    from server.models import db, Collaborator
+
+    app.extensions['permission_cache'] = TTLCache(
+        app.config['PERMISSION_CACHE_SIZE'], app.config['PERMISSION_CACHE_TTL']
+    )
+
+    # Шаблонам нужны те же проверки, что и маршрутам (какие кнопки показывать)
+    app.jinja_env.globals.update(
+        can_write_repo=lambda repo: has_repo_permission(repo, WRITE),
+        is_repo_owner=lambda repo: has_repo_permission(repo, OWNER),
+    )
+
+    if not event.contains(Collaborator, 'after_insert', _forget_changed_collaborator):
+        event.listen(Collaborator, 'after_insert', _forget_changed_collaborator)
+        event.listen(Collaborator, 'after_update', _forget_changed_collaborator)
+        event.listen(Collaborator, 'after_delete', _forget_changed_collaborator)
+        event.listen(db.session, 'after_commit', _forget_after_commit)
+        event.listen(db.session, 'after_rollback', _discard_after_rollback)
@@ -0,0 +1,165 @@
+import codecs
+import html
+import os
+import re
+from functools import lru_cache
+
+from markupsafe import Markup, escape
+
+from server.cache import TTLCache, WeightedCache
+from server.storage import open_object, read_object, get_object_size
+
+# Подсветка синтаксиса и Markdown необязательны: без них файлы
+# показываются как простой текст
+try:
+    from pygments import highlight
+    from pygments.formatters import HtmlFormatter
+    from pygments.lexers import get_lexer_for_filename
+    from pygments.util import ClassNotFound
+except ImportError:
+    highlight = None
+
+try:
+    import markdown
+except ImportError:
+    markdown = None
+
+# Просмотр файлов.
+#
+# Тип файла (текст или двоичный) определяется по первым SNIFF_SIZE байтам,
+# без чтения файла целиком. Текстовые файлы показываются с подсветкой
+# синтаксиса, Markdown - отрисованным. Объекты неизменны, поэтому и тип,
+# и готовый HTML кэшируются по хэшу объекта: повторный просмотр той же
+# версии файла не читает и не разбирает его заново.
+
+SNIFF_SIZE = 8000
+PREVIEW_CACHE_MAX_WEIGHT = 32 * 1024 * 1024  # Примерный объём кэша в байтах
+MARKDOWN_EXTENSIONS = ('.md', '.markdown')
+README_NAMES = ('readme.md', 'readme.markdown', 'readme.txt', 'readme')  # Имена в нижнем регистре
+SAFE_URL_SCHEMES = ('http', 'https', 'mailto')
+# Браузер пропускает в адресе пробелы и управляющие символы: "java\tscript:" - тоже javascript:
+_URL_IGNORED_CHARS = re.compile(r'[\x00-\x20\x7f]+')
+
+_kind_cache = TTLCache(maxsize=100000, ttl=24 * 3600)
+_preview_cache = WeightedCache(PREVIEW_CACHE_MAX_WEIGHT)
+
+
+def sniff_object(content_hash, base_path='storage/repos'):
+    """Тип объекта по его началу: 'text' или 'binary'
+
+    Текст - без нулевых байтов и в UTF-8 (символ, оборванный на границе
+    образца, не в счёт).
+    """
+    kind = _kind_cache.get(content_hash)
+    if kind is not None:
+        return kind
+
+    with open_object(content_hash, base_path) as f:
+        sample = f.read(SNIFF_SIZE)
+
+    kind = 'text'
+    if b'\0' in sample:
+        kind = 'binary'
+    else:
+        try:
+            codecs.getincrementaldecoder('utf-8')().decode(sample, final=len(sample) < SNIFF_SIZE)
+        except UnicodeDecodeError:
+            kind = 'binary'
+
+    _kind_cache.set(content_hash, kind)
+    return kind
+
+def is_text_object(content_hash, base_path='storage/repos'):
+    return sniff_object(content_hash, base_path) == 'text'
+
+
+@lru_cache(maxsize=None)
+def preview_css():
+    """Стили подсветки синтаксиса (пустые, если pygments не установлен)"""
+    if highlight is None:
+        return ''
+    return Markup(HtmlFormatter().get_style_defs('.highlight'))
+
+
+def _is_safe_url(url):
+    """Адрес без схемы (относительный) или со схемой из SAFE_URL_SCHEMES
+
+    Схема ищется в адресе так, как его прочтёт браузер: после раскрытия
+    HTML-сущностей (&#58; - двоеточие) и без пробелов и управляющих символов.
+    """
+    previous = None
+    while url != previous:
+        previous, url = url, html.unescape(url)
+    url = _URL_IGNORED_CHARS.sub('', url)
+    scheme, colon, _ = url.partition(':')
+    if not colon or any(char in scheme for char in '/?#'):
+        return True
+    return scheme.lower() in SAFE_URL_SCHEMES
+
+
+class _SafeLinks:
+    """Обработчик дерева Markdown: убрать ссылки с опасными схемами (javascript: и т.п.)"""
+
+    def run(self, root):
+        for element in root.iter():
+            for attribute in ('href', 'src'):
+                url = element.get(attribute)
+                if url is not None and not _is_safe_url(url):
+                    element.set(attribute, '#')
+
+def _render_markdown(text):
+    extensions = ['fenced_code', 'tables']
+    extension_configs = {}
+    if highlight is not None:
+        extensions.append('codehilite')
+        extension_configs['codehilite'] = {'css_class': 'highlight', 'guess_lang': False}
+    md = markdown.Markdown(extensions=extensions, extension_configs=extension_configs)
+    # HTML внутри Markdown показывается как текст, а не вставляется в страницу
+    md.preprocessors.deregister('html_block')
+    md.inlinePatterns.deregister('html')
+    md.treeprocessors.register(_SafeLinks(), 'safe_links', 0)
+    return md.convert(text)
+
+def _render_code(text, filename):
+    if highlight is not None:
+        try:
+            lexer = get_lexer_for_filename(os.path.basename(filename), stripnl=False)
+        except ClassNotFound:
+            lexer = None
+        if lexer is not None:
+            return 'code', highlight(text, lexer, HtmlFormatter())
+    return 'text', f'<pre class="highlight">{escape(text)}</pre>'
+
+def render_preview(content_hash, filename, max_size, base_path='storage/repos'):
+    """Отрисовать объект для просмотра
+
+    Возвращает {'kind': 'markdown'|'code'|'text'|'binary'|'too_large',
+    'html': Markup или None}. Результат кэшируется по хэшу объекта и
+    способу отрисовки (он зависит от расширения имени файла).
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in MARKDOWN_EXTENSIONS and markdown is not None:
+        renderer = 'markdown'
+    else:
+        # Подсветка выбирается по имени файла; имени без пути достаточно
+        renderer = 'code:' + os.path.basename(filename)
+
+    key = (content_hash, renderer, max_size)
+    cached = _preview_cache.get(key)
+    if cached is not None:
+        return cached
+
+    if sniff_object(content_hash, base_path) == 'binary':
+        result = {'kind': 'binary', 'html': None}
+    elif (get_object_size(content_hash, base_path) or 0) > max_size:
+        result = {'kind': 'too_large', 'html': None}
+    else:
+        text = (read_object(content_hash, base_path) or b'').decode('utf-8', errors='replace')
+        if renderer == 'markdown':
+            result = {'kind': 'markdown', 'html': Markup(_render_markdown(text))}
+        else:
+            kind, html = _render_code(text, filename)
+            result = {'kind': kind, 'html': Markup(html)}
+
+    _preview_cache.put(key, result, 64 + len(result['html'] or ''))
+    return result
@@ -0,0 +1,632 @@
+from flask import Blueprint, jsonify, abort, request, current_app, g, Response, stream_with_context
+from flask_login import login_required, current_user
+import os
+import re
+import uuid
+import base64
+import tempfile
+
+from server.models import db, User, Commit, RepoFile, UploadSession
+from server.trees import read_tree, walk_tree
+from server.storage import (
+    get_uploads_path, hash_file, store_object_file, write_object, write_object_stream,
+    freshen_object, get_object_size, is_object_hash
+)
+from server.utils import (
+    safe_repo_path, normalize_repo_path, save_stream_to_repo, place_object_in_repo, get_commit_history,
+    get_version_trees, get_visible_repo_ids
+)
+from server.search import search_files, MIN_QUERY_LENGTH
+from server.textedit import get_line_index, read_lines, apply_line_patch, PatchError
+from server.diffs import diff_versions, diff_blobs
+from server.archives import ARCHIVE_MIMETYPES, iter_archive_files
+from server.commits import create_commit, commit_files, commit_tree, HeadMoved
+from server.passwords import PasswordCheckBusy
+from server.permissions import repo_access, READ, WRITE
+from server.sync import (
+    collect_tree_objects, find_missing_tree_objects, generate_object_stream, receive_object_stream
+)
+
+api = Blueprint('api', __name__)
+
+CONTENT_RANGE_RE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+
+def check_repo_path(repo_id, filepath):
+    """Проверить путь файла внутри репозитория и привести его к общему виду"""
+    filepath = safe_repo_path(repo_id, filepath)
+    if filepath is None:
+        abort(400)
+    return filepath
+
+
+def check_object_hashes(values):
+    """Проверить список хэшей объектов из запроса (иначе 400)"""
+    if not isinstance(values, list) or not all(is_object_hash(value) for value in values):
+        abort(400)
+    return values
+
+
+def copy_request_stream(dest, limit=None):
+    """Переписать тело запроса в файл по частям, вернуть число байт
+    
+    Если тело длиннее limit байт, чтение прерывается и возвращается None
+    (записанное к этому моменту убирает вызывающий код).
+    """
+    chunk_size = current_app.config['UPLOAD_CHUNK_SIZE']
+    written = 0
+    for chunk in iter(lambda: request.stream.read(chunk_size), b''):
+        written += len(chunk)
+        if limit is not None and written > limit:
+            return None
+        dest.write(chunk)
+    return written
+
+
+@api.route('/repo/<int:repo_id>/head')
+@login_required
+@repo_access(READ)
+def repo_head(repo_id):
+    """Текущая голова репозитория: клиент сравнивает хэш со своим,
+    чтобы понять, нужна ли синхронизация"""
+    repo = g.repo
+    
+    return jsonify({
+        'version': repo.head_version,
+        'commit': repo.head_hash,
+        'tree': repo.head_tree
+    })
+
+
+@api.route('/repo/<int:repo_id>/versions/<int:version>/tree')
+@login_required
+@repo_access(READ)
+def version_tree(repo_id, version):
+    """Состояние файлов репозитория в указанной версии"""
+    commit = Commit.query.filter_by(repo_id=repo_id, version_number=version).first_or_404()
+    
+    if commit.tree_hash is None:
+        abort(404)
+    
+    files = [
+        {'path': path, 'hash': content_hash, 'size': size}
+        for path, content_hash, size in walk_tree(commit.tree_hash)
+    ]
+    
+    return jsonify({
+        'version': commit.version_number,
+        'commit': commit.commit_hash,
+        'tree': commit.tree_hash,
+        'files': files
+    })
+
+
+@api.route('/repo/<int:repo_id>/commits')
+@login_required
+@repo_access(READ)
+def commit_history(repo_id):
+    """История коммитов постранично: ?before=<версия>&limit=<количество>"""
+    limit = min(request.args.get('limit', current_app.config['COMMITS_PER_PAGE'], type=int), 500)
+    commits, next_before = get_commit_history(repo_id, request.args.get('before', type=int), max(limit, 1))
+    
+    return jsonify({
+        'commits': [
+            {
+                'version': commit.version_number,
+                'commit': commit.commit_hash,
+                'parent': commit.parent_hash,
+                'tree': commit.tree_hash,
+                'message': commit.message,
+                'author_id': commit.user_id,
+                'created_at': commit.created_at.isoformat()
+            }
+            for commit in commits
+        ],
+        'next_before': next_before
+    })
+
+
+@api.route('/repo/<int:repo_id>/diff')
+@login_required
+@repo_access(READ)
+def version_diff(repo_id):
+    """Изменения между версиями: ?from=<версия>&to=<версия>&path=<путь>
+    
+    Для каждого файла - статус и хэши; построчные отличия (hunks) -
+    если указан path или изменённых файлов не больше DIFF_MAX_FILES.
+    """
+    repo = g.repo
+    
+    to_version = request.args.get('to', repo.head_version, type=int)
+    from_version = request.args.get('from', max(to_version - 1, 0), type=int)
+    path = normalize_repo_path(request.args.get('path', '')) or None
+    
+    trees = get_version_trees(repo_id, {from_version, to_version})
+    if from_version not in trees or to_version not in trees:
+        abort(404)
+    
+    if any(trees[version] is None for version in (from_version, to_version) if version != 0):
+        return jsonify({'error': 'Для этой версии не сохранено состояние файлов'}), 404
+    
+    changes = diff_versions(trees[from_version], trees[to_version], path_prefix=path)
+    
+    if path is not None or len(changes) <= current_app.config['DIFF_MAX_FILES']:
+        for change in changes:
+            change['diff'] = diff_blobs(change['old_hash'], change['new_hash'])
+    
+    return jsonify({
+        'from': from_version,
+        'to': to_version,
+        'files': changes
+    })
+
+
+@api.route('/search')
+@login_required
+def search_code():
+    """Поиск по содержимому файлов: ?q=<строка>&repo_id=<id>&owner=<имя>&limit=<n>"""
+    query = request.args.get('q', '').strip()
+    if len(query) < MIN_QUERY_LENGTH:
+        return jsonify({'error': f'Запрос должен быть не короче {MIN_QUERY_LENGTH} символов'}), 400
+    
+    owner_id = None
+    if request.args.get('owner'):
+        owner = User.query.filter_by(username=request.args['owner']).first()
+        owner_id = owner.id if owner else -1
+    
+    repo_ids = get_visible_repo_ids(current_user.id, request.args.get('repo_id', type=int), owner_id)
+    limit = min(request.args.get('limit', current_app.config['SEARCH_RESULTS_LIMIT'], type=int), 500)
+    
+    return jsonify({'results': search_files(query, repo_ids, max(limit, 1))})
+
+
+@api.route('/repo/<int:repo_id>/files/<path:filepath>', methods=['PUT'])
+@login_required
+@repo_access(WRITE)
+def put_file(repo_id, filepath):
+    """Потоковая загрузка файла телом запроса"""
+    filepath = check_repo_path(repo_id, filepath)
+    
+    # Тело запроса пишется на диск по частям, хэш считается по ходу
+    save_stream_to_repo(repo_id, filepath, request.stream)
+    
+    commit = create_commit(repo_id, f"Добавлен файл: {os.path.basename(filepath)}", [filepath])
+    
+    return jsonify({'path': filepath, 'version': commit.version_number}), 201
+
+
+def get_repo_file_or_404(repo_id, filepath):
+    """Получить запись файла (не папки) репозитория"""
+    return RepoFile.query.filter_by(
+        repo_id=repo_id, filepath=filepath, is_directory=False
+    ).first_or_404()
+
+
+@api.route('/repo/<int:repo_id>/lines/<path:filepath>')
+@login_required
+@repo_access(READ)
+def get_file_lines(repo_id, filepath):
+    """Окно строк файла: ?start=<с нуля>&count=<число строк>
+    
+    Читается только нужный участок файла (по индексу строк), так что
+    клиент может показывать и править большой файл по частям.
+    """
+    filepath = check_repo_path(repo_id, filepath)
+    repo_file = get_repo_file_or_404(repo_id, filepath)
+    
+    start = max(request.args.get('start', 0, type=int), 0)
+    count = request.args.get('count', current_app.config['EDIT_WINDOW_LINES'], type=int)
+    count = min(max(count, 0), current_app.config['EDIT_WINDOW_LINES'])
+    
+    index = get_line_index(repo_file.content_hash)
+    return jsonify({
+        'path': filepath,
+        'hash': repo_file.content_hash,
+        'size': repo_file.size,
+        'total_lines': len(index),
+        'start': start,
+        'lines': read_lines(repo_file.content_hash, start, count)
+    })
+
+
+@api.route('/repo/<int:repo_id>/patch/<path:filepath>', methods=['POST'])
+@login_required
+@repo_access(WRITE)
+def patch_file(repo_id, filepath):
+    """Изменить строки файла
+    
+    Тело: {"base": хэш версии, "patches": [{"start", "end", "lines"}],
+    "message": описание}. Строки [start, end) версии base (с нуля)
+    заменяются на lines. Если файл уже изменился, возвращается 409.
+    """
+    filepath = check_repo_path(repo_id, filepath)
+    repo_file = get_repo_file_or_404(repo_id, filepath)
+    data = request.get_json(silent=True) or {}
+    
+    if data.get('base') != repo_file.content_hash:
+        return jsonify({'error': 'Файл изменился', 'hash': repo_file.content_hash}), 409
+    
+    try:
+        patches = [
+            (patch['start'], patch['end'], [str(line) for line in patch.get('lines', [])])
+            for patch in data.get('patches', [])
+        ]
+        content_hash, size = apply_line_patch(repo_file.content_hash, patches)
+    except (PatchError, KeyError, TypeError, AttributeError, ValueError) as e:
+        return jsonify({'error': f'Неверный патч: {e}'}), 400
+    
+    place_object_in_repo(repo_id, filepath, content_hash, size)
+    message = data.get('message') or f"Изменен файл: {os.path.basename(filepath)}"
+    commit = create_commit(repo_id, message, [filepath])
+    
+    return jsonify({'path': filepath, 'hash': content_hash, 'version': commit.version_number})
+
+
+def get_upload_session(repo_id, upload_id):
+    """Получить незавершённую загрузку текущего пользователя"""
+    upload = UploadSession.query.filter_by(
+        id=upload_id, repo_id=repo_id, user_id=current_user.id
+    ).first_or_404()
+    part_path = os.path.join(get_uploads_path(), upload.id)
+    return upload, part_path
+
+
+def upload_status(upload, part_path):
+    """Состояние загрузки для клиента"""
+    return {
+        'upload_id': upload.id,
+        'path': upload.filepath,
+        'offset': os.path.getsize(part_path) if os.path.exists(part_path) else 0,
+        'total_size': upload.total_size
+    }
+
+
+@api.route('/repo/<int:repo_id>/uploads', methods=['POST'])
+@login_required
+@repo_access(WRITE)
+def start_upload(repo_id):
+    """Начать докачиваемую загрузку большого файла"""
+    data = request.get_json(silent=True) or {}
+    
+    if not data.get('path'):
+        return jsonify({'error': 'Не указан путь файла'}), 400
+    
+    # Размер необязателен, но если указан - целое неотрицательное число
+    size = data.get('size')
+    if size is not None and (not isinstance(size, int) or isinstance(size, bool) or size < 0):
+        return jsonify({'error': 'Неверный размер файла'}), 400
+    
+    upload = UploadSession(
+        id=uuid.uuid4().hex,
+        repo_id=repo_id,
+        user_id=current_user.id,
+        filepath=check_repo_path(repo_id, data['path']),
+        total_size=size
+    )
+    db.session.add(upload)
+    db.session.commit()
+    
+    part_path = os.path.join(get_uploads_path(), upload.id)
+    open(part_path, 'wb').close()
+    
+    return jsonify(upload_status(upload, part_path)), 201
+
+
+@api.route('/repo/<int:repo_id>/uploads/<upload_id>', methods=['GET'])
+@login_required
+@repo_access(WRITE)
+def get_upload(repo_id, upload_id):
+    """Сколько байт уже получено - с этого места клиент продолжает загрузку"""
+    upload, part_path = get_upload_session(repo_id, upload_id)
+    return jsonify(upload_status(upload, part_path))
+
+
+@api.route('/repo/<int:repo_id>/uploads/<upload_id>', methods=['PUT'])
+@login_required
+@repo_access(WRITE)
+def put_upload_chunk(repo_id, upload_id):
+    """Дописать очередную часть файла
+    
+    Заголовок Content-Range: bytes <начало>-<конец>/<всего> должен начинаться
+    с текущего размера полученных данных, иначе возвращается 409 и смещение,
+    с которого нужно продолжить. Часть, которая выходит за объявленный
+    размер файла, не принимается (416): такую загрузку уже нельзя было бы
+    завершить.
+    """
+    upload, part_path = get_upload_session(repo_id, upload_id)
+    offset = os.path.getsize(part_path)
+    remaining = None if upload.total_size is None else upload.total_size - offset
+    
+    content_range = request.headers.get('Content-Range')
+    if content_range:
+        match = CONTENT_RANGE_RE.fullmatch(content_range.strip())
+        if match is None:
+            return jsonify({'error': 'Неверный заголовок Content-Range'}), 400
+        start, end, total = int(match.group(1)), int(match.group(2)), match.group(3)
+        if start != offset:
+            return jsonify(upload_status(upload, part_path)), 409
+        if end < start or (total != '*' and upload.total_size is not None and int(total) != upload.total_size):
+            return jsonify({'error': 'Неверный заголовок Content-Range'}), 400
+        if remaining is not None and end - start + 1 > remaining:
+            return jsonify({'error': 'Часть выходит за размер файла', **upload_status(upload, part_path)}), 416
+    
+    with open(part_path, 'ab') as f:
+        if copy_request_stream(f, remaining) is None:
+            # Тело длиннее объявленного размера: убираем дописанное
+            f.truncate(offset)
+            return jsonify({'error': 'Часть выходит за размер файла', **upload_status(upload, part_path)}), 416
+    
+    return jsonify(upload_status(upload, part_path))
+
+
+@api.route('/repo/<int:repo_id>/uploads/<upload_id>/complete', methods=['POST'])
+@login_required
+@repo_access(WRITE)
+def complete_upload(repo_id, upload_id):
+    """Завершить загрузку: проверить хэш, положить объект в хранилище и создать коммит"""
+    upload, part_path = get_upload_session(repo_id, upload_id)
+    data = request.get_json(silent=True) or {}
+    
+    # Хэш считается проходом по файлу блоками - память не зависит от размера
+    content_hash, size = hash_file(part_path, current_app.config['UPLOAD_CHUNK_SIZE'])
+    
+    if upload.total_size is not None and size != upload.total_size:
+        return jsonify(upload_status(upload, part_path)), 409
+    
+    if data.get('sha256') and data['sha256'] != content_hash:
+        return jsonify({'error': 'Хэш не совпадает', 'sha256': content_hash}), 422
+    
+    store_object_file(part_path, content_hash)
+    place_object_in_repo(repo_id, upload.filepath, content_hash, size)
+    
+    filepath = upload.filepath
+    db.session.delete(upload)
+    
+    commit = create_commit(repo_id, f"Добавлен файл: {os.path.basename(filepath)}", [filepath])
+    
+    return jsonify({'path': filepath, 'sha256': content_hash, 'size': size, 'version': commit.version_number})
+
+
+@api.route('/repo/<int:repo_id>/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+@repo_access(WRITE)
+def cancel_upload(repo_id, upload_id):
+    """Отменить загрузку"""
+    upload, part_path = get_upload_session(repo_id, upload_id)
+    
+    if os.path.exists(part_path):
+        os.remove(part_path)
+    
+    db.session.delete(upload)
+    db.session.commit()
+    
+    return '', 204
+
+
+@api.route('/repo/<int:repo_id>/batch', methods=['POST'])
+@login_required
+@repo_access(WRITE)
+def batch_commit(repo_id):
+    """Записать много файлов одним коммитом
+    
+    Принимает одно из:
+    - multipart/form-data с полями files (имя файла - путь в репозитории);
+    - zip или tar(.gz) архив в теле запроса;
+    - JSON {"files": {путь: {"content": base64} | {"hash": хэш} | null}},
+      где null удаляет файл, а hash ссылается на уже загруженный объект.
+    Сообщение коммита - параметр message.
+    
+    Тело JSON и multipart ограничено MAX_CONTENT_LENGTH; архив - пределом
+    BATCH_ARCHIVE_MAX_SIZE. Большие файлы в JSON передаются ссылкой hash
+    на объект, загруженный докачиваемой загрузкой.
+    """
+    if request.mimetype in ARCHIVE_MIMETYPES:
+        # Предел нужно поменять до первого обращения к телу запроса
+        request.max_content_length = current_app.config['BATCH_ARCHIVE_MAX_SIZE']
+    
+    files = {}
+    message = request.values.get('message')
+    
+    if request.mimetype == 'application/json':
+        data = request.get_json(silent=True)
+        if (not isinstance(data, dict) or not isinstance(data.get('files', {}), dict)
+                or not isinstance(data.get('message', ''), (str, type(None)))):
+            return jsonify({'error': 'Неверный формат запроса'}), 400
+        message = data.get('message') or message
+        
+        for path, entry in data.get('files', {}).items():
+            path = check_repo_path(repo_id, path)
+            if entry is None:
+                files[path] = None
+            elif not isinstance(entry, dict):
+                return jsonify({'error': 'Неверное описание файла', 'path': path}), 400
+            elif 'hash' in entry:
+                if not is_object_hash(entry['hash']):
+                    return jsonify({'error': 'Неверный хэш объекта', 'path': path}), 400
+                if not freshen_object(entry['hash']):
+                    return jsonify({'error': 'Объект не найден', 'hash': entry['hash']}), 422
+                files[path] = (entry['hash'], get_object_size(entry['hash']))
+            else:
+                try:
+                    content = base64.b64decode(entry.get('content'), validate=True)
+                except (TypeError, ValueError):
+                    return jsonify({'error': 'Неверное содержимое файла (ожидается base64)', 'path': path}), 400
+                files[path] = (write_object(content), len(content))
+    
+    elif request.mimetype in ARCHIVE_MIMETYPES:
+        # Архив читается с произвольным доступом - сначала сохраняем его на диск
+        with tempfile.TemporaryFile(dir=get_uploads_path()) as archive:
+            copy_request_stream(archive)
+            archive.seek(0)
+            for path, stream in iter_archive_files(archive, ARCHIVE_MIMETYPES[request.mimetype]):
+                path = safe_repo_path(repo_id, path)
+                if path is not None:
+                    files[path] = write_object_stream(stream)
+    
+    else:
+        for storage in request.files.getlist('files'):
+            path = check_repo_path(repo_id, storage.filename)
+            files[path] = write_object_stream(storage.stream)
+    
+    if not files:
+        return jsonify({'error': 'Нет файлов для записи'}), 400
+    
+    commit = commit_files(repo_id, message or f"Загружено файлов: {len(files)}", files)
+    
+    return jsonify({'files': len(files), 'version': commit.version_number, 'commit': commit.commit_hash})
+
+
+@api.route('/token', methods=['POST'])
+def issue_token():
+    """Выдать токен для клиента scvp по имени пользователя и паролю
+    
+    Новый токен заменяет выданный ранее.
+    """
+    data = request.get_json(silent=True) or {}
+    user = User.query.filter_by(username=data.get('username')).first()
+    
+    try:
+        password_ok = user is not None and user.check_password(data.get('password') or '')
+    except PasswordCheckBusy:
+        return jsonify({'error': 'Слишком много попыток входа, повторите позже'}), 429, {'Retry-After': '5'}
+    
+    if not password_ok:
+        return jsonify({'error': 'Неверное имя пользователя или пароль'}), 401
+    
+    token = user.generate_api_token()
+    db.session.commit()
+    
+    return jsonify({'token': token, 'username': user.username})
+
+
+@api.route('/repo/<int:repo_id>/fetch', methods=['POST'])
+@login_required
+@repo_access(READ)
+def fetch_objects(repo_id):
+    """Отдать объекты версии, которых нет у клиента
+    
+    Тело: {"want": номер версии или null (последняя), "base": корневое
+    дерево версии клиента, "have": [хэши]}. Объекты, совпадающие с base,
+    и объекты из have не отправляются.
+    Ответ - поток объектов (см. server/sync.py), описание версии - в
+    заголовках X-SCVP-Version, X-SCVP-Commit, X-SCVP-Tree.
+    """
+    repo = g.repo
+    data = request.get_json(silent=True) or {}
+    
+    if data.get('want') is None:
+        version, commit_hash, tree_hash = repo.head_version, repo.head_hash, repo.head_tree
+    else:
+        commit = Commit.query.filter_by(repo_id=repo_id, version_number=data['want']).first_or_404()
+        version, commit_hash, tree_hash = commit.version_number, commit.commit_hash, commit.tree_hash
+    
+    if tree_hash is None:
+        return jsonify({'error': 'Для этой версии не сохранено состояние файлов'}), 404
+    
+    have = set(check_object_hashes(data.get('have', [])))
+    base = data.get('base')
+    if base is not None:
+        if not is_object_hash(base):
+            return jsonify({'error': 'Неверный хэш объекта'}), 400
+        try:
+            read_tree(base)
+        except (LookupError, ValueError):
+            # Такого дерева на сервере нет - клиент получит версию целиком
+            base = None
+    objects = collect_tree_objects(tree_hash, have, base=base)
+    
+    response = Response(stream_with_context(generate_object_stream(objects)), mimetype='application/octet-stream')
+    response.headers['X-SCVP-Version'] = str(version)
+    response.headers['X-SCVP-Commit'] = commit_hash
+    response.headers['X-SCVP-Tree'] = tree_hash
+    return response
+
+
+@api.route('/repo/<int:repo_id>/negotiate', methods=['POST'])
+@login_required
+@repo_access(WRITE)
+def negotiate_objects(repo_id):
+    """Узнать, каких объектов из списка клиента нет на сервере
+    
+    Тело: {"objects": [хэши]}, ответ: {"missing": [хэши]}.
+    """
+    data = request.get_json(silent=True) or {}
+    
+    # Имеющиеся объекты помечаются свежими: клиент сейчас сошлётся на них в коммите
+    objects = check_object_hashes(data.get('objects', []))
+    missing = [object_hash for object_hash in objects if not freshen_object(object_hash)]
+    return jsonify({'missing': missing})
+
+
+@api.route('/repo/<int:repo_id>/objects', methods=['POST'])
+@login_required
+@repo_access(WRITE)
+def store_objects(repo_id):
+    """Принять часть объектов для будущего push
+    
+    Тело - поток объектов (см. server/sync.py). Клиент scvp отправляет
+    объекты пакетами, а затем создаёт коммит запросом push: прерванную
+    отправку можно продолжить, переданные пакеты уже не нужно повторять.
+    """
+    request.max_content_length = current_app.config['PUSH_MAX_SIZE']
+    
+    try:
+        received = receive_object_stream(request.stream)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'received': len(received)})
+
+
+@api.route('/repo/<int:repo_id>/push', methods=['POST'])
+@login_required
+@repo_access(WRITE)
+def push_objects(repo_id):
+    """Принять коммит от клиента scvp
+    
+    Тело - поток недостающих объектов (клиент scvp передаёт их заранее
+    через /objects и присылает пустой поток), параметры: tree (корневое
+    дерево новой версии), parent (коммит, от которого она построена)
+    и message. Если голова репозитория уже ушла вперёд, возвращается 409.
+    """
+    request.max_content_length = current_app.config['PUSH_MAX_SIZE']
+    
+    tree_hash = request.args.get('tree')
+    parent_hash = request.args.get('parent') or None
+    message = request.args.get('message') or 'Изменения из scvp'
+    
+    if not tree_hash:
+        return jsonify({'error': 'Не указано дерево версии'}), 400
+    if not is_object_hash(tree_hash) or not (parent_hash is None or is_object_hash(parent_hash)):
+        return jsonify({'error': 'Неверный хэш объекта'}), 400
+    
+    try:
+        receive_object_stream(request.stream)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        # Имена и хэши в присланных деревьях проверяются при чтении (read_tree)
+        missing = find_missing_tree_objects(tree_hash)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if missing:
+        return jsonify({'error': 'Не хватает объектов', 'missing': missing}), 422
+    
+    # Голова сверяется с parent под блокировкой репозитория, до изменения
+    # рабочей копии: из двух одновременных push второй получит 409.
+    # Меняются только отличающиеся файлы рабочей копии сервера.
+    try:
+        commit = commit_tree(repo_id, message, tree_hash, parent_hash, check_parent=True)
+    except HeadMoved as e:
+        return jsonify({
+            'error': 'Репозиторий изменился, сначала выполните scvp pull',
+            'version': e.version_number,
+            'commit': e.commit_hash
+        }), 409
+    
+    return jsonify({
+        'version': commit.version_number,
+        'commit': commit.commit_hash,
+        'tree': commit.tree_hash
+    })
@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
 from server.forms import LoginForm, RegistrationForm
 from server.models import User, db
+from server.passwords import PasswordCheckBusy
 
 auth = Blueprint('auth', __name__)
 
@@ -19,7 +20,16 @@ def login():
         user = User.query.filter_by(username=form.username.data).first()
         
         # Проверяем пароль
-        if user and user.check_password(form.password.data):
+        try:
+            password_ok = user is not None and user.check_password(form.password.data)
+        except PasswordCheckBusy:
+            flash('Сервер перегружен попытками входа. Попробуйте через несколько секунд.', 'error')
+            return render_template('login.html', form=form), 429
+        
+        if password_ok:
+            # Сохраняем пароль, если он был перехеширован
+            db.session.commit()
+            
             # Авторизуем пользователя
             login_user(user, remember=form.remember.data)
             flash('Вы успешно вошли в систему!', 'success')
@@ -48,7 +58,11 @@ def register():
         )
         
         # Устанавливаем пароль
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except PasswordCheckBusy:
+            flash('Сервер перегружен. Попробуйте через несколько секунд.', 'error')
+            return render_template('register.html', form=form), 429
         
         # Сохраняем в базу данных
         try:
@@ -1,21 +1,47 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, session, send_file, abort
+from flask import Blueprint, render_template, redirect, url_for, flash, request, session, send_file, abort, current_app, g, Response, stream_with_context
 from flask_login import login_required, current_user
+from flask_wtf import FlaskForm
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
 import os
-import hashlib
-import io
 from datetime import datetime
 
-from server.forms import NewRepoForm, EditRepoForm, UploadFileForm, EditFileForm, NewFolderForm
-from server.models import db, Repository, Commit
+from server.forms import (
+    NewRepoForm, EditRepoForm, UploadFileForm, EditFileForm, EditFileWindowForm, NewFolderForm, CollaboratorForm
+)
+from server.models import db, User, Repository, Commit, RepoFile, Collaborator
 from server.utils import (
-    create_repo_directory, save_file_to_repo, read_file_from_repo,
-    delete_file_from_repo, scan_repo_directory, create_initial_readme
+    create_repo_directory, save_file_to_repo, save_stream_to_repo, read_file_from_repo,
+    delete_file_from_repo, create_initial_readme, list_repo_files, record_repo_directory,
+    get_repo_storage_path, normalize_repo_path, safe_repo_path, get_commit_history, get_version_trees,
+    get_visible_repo_ids, place_object_in_repo
 )
+from server.search import search_files, schedule_search_update, MIN_QUERY_LENGTH
+from server.commits import create_commit, commit_files, commit_tree
+from server.storage import write_object_stream
+from server.textedit import get_line_index, read_lines, apply_line_patch, PatchError
+from server.preview import render_preview, preview_css, is_text_object, README_NAMES
+from server.permissions import repo_access, has_repo_permission, RepoAccessDenied, READ, WRITE, OWNER
+from server.diffs import diff_versions, diff_blobs
+from server.archives import is_archive, iter_archive_files, EXPORT_FORMATS, get_cached_archive, generate_archive
+from server.cleanup import request_cleanup
+from server.jobs import enqueue_job
 
 main = Blueprint('main', __name__)
 
 
+@main.errorhandler(RepoAccessDenied)
+def repo_access_denied(error):
+    """Нет прав на репозиторий: сообщить и вернуть туда, куда доступ есть"""
+    if error.message is None:
+        return error
+    
+    flash(error.message, 'error')
+    if error.level > READ and has_repo_permission(error.repo, READ):
+        return redirect(url_for('main.repo_view', repo_id=error.repo.id))
+    return redirect(url_for('main.dashboard'))
+
+
 @main.route('/')
 def index():
     return render_template('index.html')
@@ -25,8 +51,21 @@ def index():
 @login_required
 def dashboard():
     """Панель управления - список репозиториев"""
-    repos = Repository.query.filter_by(user_id=current_user.id).order_by(Repository.updated_at.desc()).all()
-    return render_template('dashboard.html', repos=repos, show_sidebar=True)
+    # Свои репозитории и те, где пользователь - участник. Счётчики хранятся
+    # в самой строке репозитория, поэтому страница строится двумя запросами
+    # (количество и страница) при любом числе репозиториев
+    shared = db.select(Collaborator.repo_id).where(Collaborator.user_id == current_user.id)
+    pagination = Repository.query.filter(
+        (Repository.user_id == current_user.id) | Repository.id.in_(shared),
+        Repository.deleted_at.is_(None)
+    ).order_by(
+        Repository.updated_at.desc()
+    ).paginate(
+        page=request.args.get('page', 1, type=int),
+        per_page=current_app.config['REPOS_PER_PAGE'],
+        error_out=False
+    )
+    return render_template('dashboard.html', repos=pagination.items, pagination=pagination, show_sidebar=True)
 
 
 @main.route('/new-repo', methods=['GET', 'POST'])
@@ -51,25 +90,14 @@ def new_repo():
             # Создаём папку для репозитория
             create_repo_directory(repo.id)
             
-            # Создаём начальный коммит
-            commit_hash = hashlib.sha256(
-                f"{repo.id}{datetime.utcnow().isoformat()}".encode()
-            ).hexdigest()[:16]
-            
-            initial_commit = Commit(
-                repo_id=repo.id,
-                user_id=current_user.id,
-                message="Initial commit",
-                commit_hash=commit_hash,
-                version_number=1
-            )
-            
-            db.session.add(initial_commit)
-            db.session.commit()
-            
             # Создаём README.md если нужно
+            paths = []
             if form.generate_readme.data:
                 create_initial_readme(repo.id, repo.name, repo.description)
+                paths.append('README.md')
+            
+            # Создаём начальный коммит
+            create_commit(repo.id, "Initial commit", paths)
             
             flash(f'Репозиторий "{repo.name}" успешно создан!', 'success')
             return redirect(url_for('main.dashboard'))
@@ -108,41 +136,94 @@ def help():
     return render_template('help.html')
 
 
+@main.route('/search')
+@login_required
+def search():
+    """Поиск по содержимому файлов: во всех доступных репозиториях,
+    в одном репозитории (?repo=<id>) или у одного владельца (?owner=<имя>)"""
+    query = request.args.get('q', '').strip()
+    repo_id = request.args.get('repo', type=int)
+    owner_name = request.args.get('owner', '').strip()
+    
+    results = []
+    repos = {}
+    if len(query) >= MIN_QUERY_LENGTH:
+        owner_id = None
+        if owner_name:
+            owner = User.query.filter_by(username=owner_name).first()
+            owner_id = owner.id if owner else -1
+        
+        repo_ids = get_visible_repo_ids(current_user.id, repo_id, owner_id)
+        results = search_files(query, repo_ids, current_app.config['SEARCH_RESULTS_LIMIT'])
+        
+        found_ids = {result['repo_id'] for result in results}
+        if found_ids:
+            repos = {repo.id: repo for repo in Repository.query.filter(Repository.id.in_(found_ids))}
+    elif query:
+        flash(f'Введите не меньше {MIN_QUERY_LENGTH} символов', 'error')
+    
+    return render_template('search.html',
+                          query=query,
+                          repo_id=repo_id,
+                          owner=owner_name,
+                          results=results,
+                          repos=repos)
+
+
 @main.route('/repo/<int:repo_id>')
 @login_required
+@repo_access(READ, 'У вас нет доступа к этому репозиторию')
 def repo_view(repo_id):
     """Просмотр репозитория"""
-    repo = Repository.query.get_or_404(repo_id)
+    repo = g.repo
+    
+    # Список файлов берём из индекса RepoFile. Большие репозитории
+    # показываем по папкам, чтобы не выводить всё дерево сразу
+    current_path = request.args.get('path')
+    files = list_repo_files(repo_id, current_path)
     
-    # Проверяем права доступа
-    if repo.user_id != current_user.id and not repo.is_public:
-        flash('У вас нет доступа к этому репозиторию', 'error')
-        return redirect(url_for('main.dashboard'))
+    if current_path is None and len(files) > current_app.config['REPO_VIEW_FULL_LIST_LIMIT']:
+        current_path = ''
+        files = list_repo_files(repo_id, current_path)
     
-    # Сканируем файлы репозитория
-    files = scan_repo_directory(repo_id)
+    # История коммитов - постранично, по индексу (repo_id, version_number)
+    history_before = request.args.get('before', type=int)
+    commits, next_before = get_commit_history(
+        repo_id, history_before, current_app.config['COMMITS_PER_PAGE']
+    )
     
-    commits = Commit.query.filter_by(repo_id=repo_id).order_by(Commit.created_at.desc()).all()
+    # README текущей папки показывается под списком файлов (HTML берётся из кэша)
+    readme_file = RepoFile.query.filter(
+        RepoFile.repo_id == repo_id,
+        RepoFile.parent_path == normalize_repo_path(current_path or ''),
+        RepoFile.is_directory.is_(False),
+        db.func.lower(RepoFile.filename).in_(README_NAMES)
+    ).order_by(RepoFile.filename).first()
+    readme = None
+    if readme_file is not None:
+        readme = render_preview(readme_file.content_hash, readme_file.filename,
+                                current_app.config['PREVIEW_MAX_SIZE'])
     
     return render_template('repo_view.html', 
                           repo=repo, 
                           files=files,
+                          current_path=current_path,
                           commits=commits,
+                          history_before=history_before,
+                          next_before=next_before,
+                          readme_file=readme_file,
+                          readme=readme,
+                          preview_css=preview_css(),
                           upload_form=UploadFileForm(),
-                          folder_form=NewFolderForm())
+                          folder_form=NewFolderForm(),
+                          restore_form=FlaskForm())
 
 
 @main.route('/repo/<int:repo_id>/upload', methods=['POST'])
 @login_required
+@repo_access(WRITE, 'У вас нет прав для загрузки файлов в этот репозиторий')
 def upload_file(repo_id):
     """Загрузка файла в репозиторий"""
-    repo = Repository.query.get_or_404(repo_id)
-    
-    # Проверяем права доступа
-    if repo.user_id != current_user.id:
-        flash('У вас нет прав для загрузки файлов в этот репозиторий', 'error')
-        return redirect(url_for('main.repo_view', repo_id=repo_id))
-    
     form = UploadFileForm()
     
     if form.validate_on_submit():
@@ -152,28 +233,34 @@ def upload_file(repo_id):
         # Безопасное имя файла
         filename = secure_filename(file.filename)
         
-        if filepath:
-            full_path = os.path.join(filepath, filename)
-        else:
-            full_path = filename
+        # Папка и имя приходят из формы - путь не должен выйти за пределы репозитория
+        full_path = safe_repo_path(repo_id, os.path.join(filepath, filename))
+        if full_path is None:
+            abort(400)
         
         try:
-            # Читаем содержимое файла
-            content = file.read()
-            
-            # Сохраняем файл
-            save_file_to_repo(repo_id, full_path, content)
-            
-            # Обновляем время репозитория
-            repo.updated_at = datetime.utcnow()
-            db.session.commit()
-            
-            # Создаем коммит
-            create_commit(repo_id, f"Добавлен файл: {filename}")
-            
-            flash(f'Файл "{filename}" успешно загружен!', 'success')
+            if form.extract_archive.data and is_archive(filename):
+                # Все файлы архива - одним коммитом
+                files = {}
+                for member_path, stream in iter_archive_files(file.stream, filename):
+                    member_path = safe_repo_path(repo_id, os.path.join(filepath, member_path))
+                    if member_path is not None:
+                        files[member_path] = write_object_stream(stream)
+                
+                commit_files(repo_id, f"Распакован архив: {filename}", files)
+                
+                flash(f'Архив "{filename}" распакован, файлов: {len(files)}', 'success')
+            else:
+                # Сохраняем файл, читая его по частям
+                save_stream_to_repo(repo_id, full_path, file.stream)
+                
+                # Создаем коммит (он же обновляет время репозитория)
+                create_commit(repo_id, f"Добавлен файл: {filename}", [full_path])
+                
+                flash(f'Файл "{filename}" успешно загружен!', 'success')
             
         except Exception as e:
+            db.session.rollback()
             flash(f'Ошибка при загрузке файла: {str(e)}', 'error')
     
     else:
@@ -186,14 +273,10 @@ def upload_file(repo_id):
 
 @main.route('/repo/<int:repo_id>/create-folder', methods=['POST'])
 @login_required
+@repo_access(WRITE, 'У вас нет прав для создания папок в этом репозитории')
 def create_folder(repo_id):
     """Создание папки в репозитории"""
-    repo = Repository.query.get_or_404(repo_id)
-    
-    # Проверяем права доступа
-    if repo.user_id != current_user.id:
-        flash('У вас нет прав для создания папок в этом репозитории', 'error')
-        return redirect(url_for('main.repo_view', repo_id=repo_id))
+    repo = g.repo
     
     form = NewFolderForm()
     
@@ -201,16 +284,16 @@ def create_folder(repo_id):
         folder_path = form.folder_path.data or ''
         folder_name = form.folder_name.data
         
-        if folder_path:
-            full_path = os.path.join(folder_path, folder_name)
-        else:
-            full_path = folder_name
+        full_path = safe_repo_path(repo_id, os.path.join(folder_path, folder_name))
+        if full_path is None:
+            abort(400)
         
         try:
             # Создаем папку
             repo_path = create_repo_directory(repo_id)
             folder_full_path = os.path.join(repo_path, full_path)
             os.makedirs(folder_full_path, exist_ok=True)
+            record_repo_directory(repo_id, full_path)
             
             # Обновляем время репозитория
             repo.updated_at = datetime.utcnow()
@@ -224,61 +307,160 @@ def create_folder(repo_id):
     return redirect(url_for('main.repo_view', repo_id=repo_id))
 
 
+@main.route('/repo/<int:repo_id>/blob/<path:filepath>')
+@login_required
+@repo_access(READ, 'У вас нет доступа к этому репозиторию')
+def view_file(repo_id, filepath):
+    """Просмотр файла"""
+    repo = g.repo
+    
+    repo_file = RepoFile.query.filter_by(
+        repo_id=repo_id, filepath=normalize_repo_path(filepath), is_directory=False
+    ).first()
+    
+    if repo_file is None:
+        flash('Файл не найден', 'error')
+        return redirect(url_for('main.repo_view', repo_id=repo_id))
+    
+    # Тип файла определяется по началу, готовый HTML кэшируется по хэшу
+    preview = render_preview(repo_file.content_hash, repo_file.filename,
+                             current_app.config['PREVIEW_MAX_SIZE'])
+    
+    return render_template('file_view.html',
+                          repo=repo,
+                          repo_file=repo_file,
+                          preview=preview,
+                          preview_css=preview_css())
+
+
 @main.route('/repo/<int:repo_id>/download/<path:filepath>')
 @login_required
+@repo_access(READ)
 def download_file(repo_id, filepath):
     """Скачивание файла из репозитория"""
-    repo = Repository.query.get_or_404(repo_id)
-    
-    # Проверяем права доступа
-    if repo.user_id != current_user.id and not repo.is_public:
-        abort(403)
-    
-    # Читаем файл
-    content = read_file_from_repo(repo_id, filepath)
+    # Путь к файлу рабочей копии (safe_join не выпускает за пределы репозитория)
+    full_path = safe_join(get_repo_storage_path(repo_id), filepath)
     
-    if content is None:
+    if full_path is None or not os.path.isfile(full_path):
         flash('Файл не найден', 'error')
         return redirect(url_for('main.repo_view', repo_id=repo_id))
     
-    # Отправляем файл
+    # ETag - хэш содержимого, поэтому повторные загрузки получают 304
+    repo_file = RepoFile.query.filter_by(
+        repo_id=repo_id, filepath=normalize_repo_path(filepath)
+    ).with_entities(RepoFile.content_hash).first()
+    
+    # Файл отдаётся потоком с диска (или через X-Sendfile / wsgi.file_wrapper),
+    # с поддержкой Range и условных запросов
     filename = os.path.basename(filepath)
     return send_file(
-        io.BytesIO(content),
+        os.path.abspath(full_path),
         download_name=filename,
-        as_attachment=True
+        as_attachment=True,
+        conditional=True,
+        etag=repo_file.content_hash if repo_file else True
     )
 
 
+@main.route('/repo/<int:repo_id>/archive/<int:version>.<any("zip", "tar.gz"):archive_format>')
+@login_required
+@repo_access(READ)
+def download_archive(repo_id, version, archive_format):
+    """Скачивание версии репозитория одним архивом"""
+    repo = g.repo
+    
+    commit = Commit.query.filter_by(repo_id=repo_id, version_number=version).first_or_404()
+    if commit.tree_hash is None:
+        flash('Для этой версии не сохранено состояние файлов', 'error')
+        return redirect(url_for('main.repo_view', repo_id=repo_id))
+    
+    download_name = f"{secure_filename(repo.name) or 'repo'}-v{version}.{archive_format}"
+    mimetype = EXPORT_FORMATS[archive_format]
+    
+    # Архив одного и того же дерева не меняется, поэтому кэшируется по его хэшу
+    cached = get_cached_archive(commit.tree_hash, archive_format)
+    if cached is not None:
+        return send_file(
+            os.path.abspath(cached),
+            mimetype=mimetype,
+            download_name=download_name,
+            as_attachment=True,
+            conditional=True,
+            etag=f"{commit.tree_hash}.{archive_format}"
+        )
+    
+    # Первый запрос: архив формируется потоком, без промежуточного файла.
+    # Размер кэша проверит фоновая задача, когда архив будет готов
+    stream = generate_archive(commit.tree_hash, archive_format, commit.created_at.timestamp())
+    enqueue_job('prune-archives', key='prune-archives', delay=60)
+    db.session.commit()
+    response = Response(stream_with_context(stream), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+    response.set_etag(f"{commit.tree_hash}.{archive_format}")
+    return response
+
+
+@main.route('/repo/<int:repo_id>/diff')
+@login_required
+@repo_access(READ, 'У вас нет доступа к этому репозиторию')
+def diff_view(repo_id):
+    """Сравнение двух версий репозитория: ?from=<версия>&to=<версия>&path=<путь>"""
+    repo = g.repo
+    
+    # По умолчанию - изменения последней версии относительно предыдущей
+    to_version = request.args.get('to', repo.head_version, type=int)
+    from_version = request.args.get('from', max(to_version - 1, 0), type=int)
+    path = normalize_repo_path(request.args.get('path', '')) or None
+    
+    trees = get_version_trees(repo_id, {from_version, to_version})
+    if from_version not in trees or to_version not in trees:
+        abort(404)
+    
+    if any(trees[version] is None for version in (from_version, to_version) if version != 0):
+        flash('Для этой версии не сохранено состояние файлов', 'error')
+        return redirect(url_for('main.repo_view', repo_id=repo_id))
+    
+    changes = diff_versions(trees[from_version], trees[to_version], path_prefix=path)
+    
+    # Построчные отличия - для всех файлов, если их немного, иначе по ссылке на файл
+    show_lines = path is not None or len(changes) <= current_app.config['DIFF_MAX_FILES']
+    if show_lines:
+        for change in changes:
+            change['diff'] = diff_blobs(change['old_hash'], change['new_hash'])
+    
+    return render_template('diff.html',
+                          repo=repo,
+                          from_version=from_version,
+                          to_version=to_version,
+                          path=path,
+                          changes=changes,
+                          show_lines=show_lines)
+
+
 @main.route('/repo/<int:repo_id>/delete/<path:filepath>')
 @login_required
+@repo_access(WRITE, 'У вас нет прав для удаления файлов из этого репозитория')
 def delete_file(repo_id, filepath):
     """Удаление файла из репозитория"""
-    repo = Repository.query.get_or_404(repo_id)
-    
-    # Проверяем права доступа
-    if repo.user_id != current_user.id:
-        flash('У вас нет прав для удаления файлов из этого репозитория', 'error')
-        return redirect(url_for('main.repo_view', repo_id=repo_id))
+    filepath = safe_repo_path(repo_id, filepath)
+    if filepath is None:
+        abort(400)
     
     try:
         # Удаляем файл
         success = delete_file_from_repo(repo_id, filepath)
         
         if success:
-            # Обновляем время репозитория
-            repo.updated_at = datetime.utcnow()
-            db.session.commit()
-            
-            # Создаем коммит
+            # Создаем коммит (он же обновляет время репозитория)
             filename = os.path.basename(filepath)
-            create_commit(repo_id, f"Удален файл: {filename}")
+            create_commit(repo_id, f"Удален файл: {filename}", [filepath])
             
             flash(f'Файл "{filename}" успешно удален!', 'success')
         else:
             flash('Файл не найден', 'error')
             
     except Exception as e:
+        db.session.rollback()
         flash(f'Ошибка при удалении файла: {str(e)}', 'error')
     
     return redirect(url_for('main.repo_view', repo_id=repo_id))
@@ -286,14 +468,10 @@ def delete_file(repo_id, filepath):
 
 @main.route('/repo/<int:repo_id>/edit', methods=['GET', 'POST'])
 @login_required
+@repo_access(OWNER, 'У вас нет прав для редактирования этого репозитория')
 def edit_repo(repo_id):
     """Редактирование репозитория"""
-    repo = Repository.query.get_or_404(repo_id)
-    
-    # Проверяем права доступа
-    if repo.user_id != current_user.id:
-        flash('У вас нет прав для редактирования этого репозитория', 'error')
-        return redirect(url_for('main.repo_view', repo_id=repo_id))
+    repo = g.repo
     
     form = EditRepoForm(obj=repo)
     
@@ -306,31 +484,76 @@ def edit_repo(repo_id):
         flash('Репозиторий успешно обновлен!', 'success')
         return redirect(url_for('main.repo_view', repo_id=repo_id))
     
-    return render_template('edit_repo.html', repo=repo, form=form)
+    collaborators = repo.collaborators.join(Collaborator.user).order_by(User.username).all()
+    
+    return render_template('edit_repo.html', repo=repo, form=form,
+                          collaborators=collaborators,
+                          collaborator_form=CollaboratorForm())
+
+
+@main.route('/repo/<int:repo_id>/collaborators', methods=['POST'])
+@login_required
+@repo_access(OWNER, 'Участниками репозитория управляет только владелец')
+def add_collaborator(repo_id):
+    """Добавление участника репозитория (или смена его прав)"""
+    repo = g.repo
+    form = CollaboratorForm()
+    
+    if form.validate_on_submit():
+        user = User.query.filter_by(username=form.username.data).first()
+        
+        if user.id == repo.user_id:
+            flash('Владелец и так имеет все права', 'error')
+        else:
+            collaborator = repo.collaborators.filter_by(user_id=user.id).first()
+            if collaborator is None:
+                collaborator = Collaborator(repo_id=repo_id, user_id=user.id)
+                db.session.add(collaborator)
+            collaborator.role = form.role.data
+            db.session.commit()
+            flash(f'Пользователь {user.username} добавлен в участники', 'success')
+    else:
+        for errors in form.errors.values():
+            for error in errors:
+                flash(error, 'error')
+    
+    return redirect(url_for('main.edit_repo', repo_id=repo_id))
+
+
+@main.route('/repo/<int:repo_id>/collaborators/<int:user_id>/remove', methods=['POST'])
+@login_required
+@repo_access(OWNER, 'Участниками репозитория управляет только владелец')
+def remove_collaborator(repo_id, user_id):
+    """Удаление участника репозитория"""
+    # Пустая форма проверяет только CSRF-токен
+    if not FlaskForm().validate_on_submit():
+        abort(400)
+    
+    collaborator = Collaborator.query.filter_by(repo_id=repo_id, user_id=user_id).first_or_404()
+    
+    # Удаляем через ORM, чтобы сбросился кэш прав (server/permissions.py)
+    db.session.delete(collaborator)
+    db.session.commit()
+    
+    flash('Участник удален', 'success')
+    return redirect(url_for('main.edit_repo', repo_id=repo_id))
 
 
 @main.route('/repo/<int:repo_id>/delete-repo')
 @login_required
+@repo_access(OWNER, 'У вас нет прав для удаления этого репозитория')
 def delete_repo(repo_id):
     """Удаление репозитория"""
-    repo = Repository.query.get_or_404(repo_id)
-    
-    # Проверяем права доступа
-    if repo.user_id != current_user.id:
-        flash('У вас нет прав для удаления этого репозитория', 'error')
-        return redirect(url_for('main.dashboard'))
+    repo = g.repo
     
     try:
-        # Удаляем из базы данных
-        db.session.delete(repo)
+        # Помечаем удалённым (и убираем из поискового индекса после фиксации);
+        # файлы и записи репозитория удаляет фоновая очистка
+        repo.deleted_at = datetime.utcnow()
+        schedule_search_update('forget', repo_id, '')
+        request_cleanup()
         db.session.commit()
         
-        # Удаляем файлы репозитория
-        import shutil
-        repo_path = create_repo_directory(repo_id)
-        if os.path.exists(repo_path):
-            shutil.rmtree(repo_path)
-        
         flash(f'Репозиторий "{repo.name}" успешно удален!', 'success')
         
     except Exception as e:
@@ -341,14 +564,27 @@ def delete_repo(repo_id):
 
 @main.route('/repo/<int:repo_id>/edit-file/<path:filepath>', methods=['GET', 'POST'])
 @login_required
+@repo_access(WRITE, 'У вас нет прав для редактирования файлов в этом репозитории')
 def edit_file(repo_id, filepath):
     """Редактирование файла"""
-    repo = Repository.query.get_or_404(repo_id)
+    repo = g.repo
     
-    # Проверяем права доступа
-    if repo.user_id != current_user.id:
-        flash('У вас нет прав для редактирования файлов в этом репозитории', 'error')
-        return redirect(url_for('main.repo_view', repo_id=repo_id))
+    filepath = safe_repo_path(repo_id, filepath)
+    if filepath is None:
+        abort(400)
+    
+    repo_file = RepoFile.query.filter_by(
+        repo_id=repo_id, filepath=filepath, is_directory=False
+    ).first()
+    
+    # Двоичный файл текстовый редактор испортил бы
+    if repo_file is not None and not is_text_object(repo_file.content_hash):
+        flash('Двоичный файл нельзя редактировать в браузере', 'error')
+        return redirect(url_for('main.view_file', repo_id=repo_id, filepath=repo_file.filepath))
+    
+    # Большой файл редактируется окнами строк
+    if repo_file is not None and repo_file.size > current_app.config['EDIT_INLINE_MAX_SIZE']:
+        return edit_file_window(repo, filepath, repo_file)
     
     # Читаем текущее содержимое файла
     content = read_file_from_repo(repo_id, filepath)
@@ -364,12 +600,8 @@ def edit_file(repo_id, filepath):
         new_content = form.content.data.encode('utf-8')
         save_file_to_repo(repo_id, filepath, new_content)
         
-        # Обновляем время репозитория
-        repo.updated_at = datetime.utcnow()
-        db.session.commit()
-        
-        # Создаем коммит
-        create_commit(repo_id, f"Изменен файл: {os.path.basename(filepath)}")
+        # Создаем коммит (он же обновляет время репозитория)
+        create_commit(repo_id, f"Изменен файл: {os.path.basename(filepath)}", [filepath])
         
         flash('Файл успешно сохранен!', 'success')
         return redirect(url_for('main.repo_view', repo_id=repo_id))
@@ -380,26 +612,94 @@ def edit_file(repo_id, filepath):
     
     return render_template('edit_file.html', repo=repo, filepath=filepath, form=form)
 
+def edit_file_window(repo, filepath, repo_file):
+    """Редактирование большого файла окнами строк
+    
+    На страницу попадает только окно строк, обратно приходит оно же:
+    новая версия файла собирается из старой заменой этих строк (см.
+    server/textedit.py), поэтому объём передачи и работы сервера
+    зависит от размера окна, а не файла.
+    """
+    form = EditFileWindowForm()
+    
+    if form.validate_on_submit():
+        start, end = form.start.data, form.end.data
+        window_url = url_for('main.edit_file', repo_id=repo.id, filepath=filepath, start=start + 1)
+        
+        # Окно открыто с другой версии - правка затёрла бы чужие изменения
+        if form.base_hash.data != repo_file.content_hash:
+            flash('Файл изменился, пока вы его редактировали. Строки загружены заново, повторите правку.', 'error')
+            return redirect(window_url)
+        
+        # Браузер присылает переводы строк как \r\n; пустое окно - удаление строк
+        content = (form.content.data or '').replace('\r\n', '\n')
+        lines = content.split('\n') if content else []
+        
+        if lines == read_lines(repo_file.content_hash, start, end - start):
+            flash('Изменений нет', 'info')
+            return redirect(window_url)
+        
+        try:
+            content_hash, size = apply_line_patch(repo_file.content_hash, [(start, end, lines)])
+        except PatchError as e:
+            flash(str(e), 'error')
+            return redirect(window_url)
+        
+        place_object_in_repo(repo.id, filepath, content_hash, size)
+        create_commit(repo.id, f"Изменен файл: {os.path.basename(filepath)}", [filepath])
+        
+        flash('Файл успешно сохранен!', 'success')
+        return redirect(window_url)
+    
+    index = get_line_index(repo_file.content_hash)
+    window_lines = current_app.config['EDIT_WINDOW_LINES']
+    start = min(max(request.args.get('start', 1, type=int) - 1, 0), max(len(index) - 1, 0))
+    end = min(start + window_lines, len(index))
+    
+    form.content.data = '\n'.join(read_lines(repo_file.content_hash, start, end - start))
+    form.base_hash.data = repo_file.content_hash
+    form.start.data = start
+    form.end.data = end
+    form.filename.data = os.path.basename(filepath)
+    
+    window = {
+        'start': start,
+        'end': end,
+        'total': len(index),
+        'size': repo_file.size,
+        'prev': max(start - window_lines, 0) + 1 if start > 0 else None,
+        'next': end + 1 if end < len(index) else None,
+    }
+    return render_template('edit_file.html', repo=repo, filepath=filepath, form=form, window=window)
+
 
-def create_commit(repo_id, message):
-    """Создать коммит"""
-    commit_hash = hashlib.sha256(
-        f"{repo_id}{datetime.utcnow().isoformat()}{message}".encode()
-    ).hexdigest()[:16]
+@main.route('/repo/<int:repo_id>/restore/<int:version>', methods=['POST'])
+@login_required
+@repo_access(WRITE, 'У вас нет прав для изменения этого репозитория')
+def restore_version(repo_id, version):
+    """Восстановление версии репозитория"""
+    repo = g.repo
     
-    # Получаем последний коммит
-    last_commit = Commit.query.filter_by(repo_id=repo_id).order_by(Commit.version_number.desc()).first()
-    version_number = last_commit.version_number + 1 if last_commit else 1
+    # Восстановление меняет файлы, поэтому только формой с CSRF-токеном
+    if not FlaskForm().validate_on_submit():
+        abort(400)
     
-    commit = Commit(
-        repo_id=repo_id,
-        user_id=current_user.id,
-        message=message,
-        commit_hash=commit_hash,
-        version_number=version_number
-    )
+    target = Commit.query.filter_by(repo_id=repo_id, version_number=version).first_or_404()
     
-    db.session.add(commit)
-    db.session.commit()
+    if target.tree_hash is None or repo.head_tree is None:
+        flash('Для этой версии не сохранено состояние файлов', 'error')
+        return redirect(url_for('main.repo_view', repo_id=repo_id))
     
-    return commit
\ No newline at end of file
+    try:
+        # Меняем только файлы, которые отличаются от текущей версии; если
+        # коммит не удастся, рабочая копия вернётся к текущей версии
+        commit_tree(repo_id, f"Восстановлена версия #{version}", target.tree_hash)
+        
+        flash(f'Версия #{version} восстановлена', 'success')
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Ошибка при восстановлении версии: {str(e)}', 'error')
+    
+    return redirect(url_for('main.repo_view', repo_id=repo_id))
+
@@ -0,0 +1,249 @@
+import os
+import json
+import sqlite3
+import threading
+
+from sqlalchemy import event
+
+from server.storage import read_object, get_object_size, get_objects_path
+from server.jobs import job_handler, enqueue_job
+
+# Полнотекстовый поиск по содержимому файлов.
+#
+# Отдельная база SQLite (storage/search.db) с индексом FTS5 на триграммах:
+#   blobs      - хэш объекта <-> rowid в индексе (каждый объект индексируется
+#                один раз, сколько бы файлов на него ни ссылалось)
+#   blobs_fts  - триграммный индекс содержимого; сам текст не хранится
+#                (content=''), он и так лежит в хранилище объектов
+#   files      - текущие файлы репозиториев: (repo_id, путь, хэш)
+#
+# Индекс обновляется в фоне: record_repo_file и forget_repo_file
+# складывают изменения в session.info, а при фиксации транзакции они
+# становятся задачей очереди (server/jobs.py) в той же транзакции.
+# Задачи индекса выполняются строго по порядку.
+
+SEARCH_MAX_FILE_SIZE = 1024 * 1024  # Файлы больше не индексируются
+BINARY_SNIFF_SIZE = 8000
+MIN_QUERY_LENGTH = 3  # Короче триграммы индекс искать не умеет
+
+_local = threading.local()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    id INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL UNIQUE
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS blobs_fts USING fts5(
+    content, content='', tokenize='trigram'
+);
+CREATE TABLE IF NOT EXISTS files (
+    repo_id INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (repo_id, path)
+);
+CREATE INDEX IF NOT EXISTS ix_files_hash ON files (hash);
+"""
+
+
+def get_search_db_path(base_path='storage/repos'):
+    """Получить путь к базе поискового индекса"""
+    return os.path.join(os.path.dirname(get_objects_path(base_path)), 'search.db')
+
+def get_connection(base_path='storage/repos'):
+    """Соединение с базой индекса (своё для каждого потока)"""
+    path = get_search_db_path(base_path)
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    connection = connections.get(path)
+    if connection is None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        connection = sqlite3.connect(path, timeout=30)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.executescript(SCHEMA)
+        connections[path] = connection
+    return connection
+
+
+def _read_text(content_hash, base_path):
+    """Содержимое объекта как текст; None для двоичных и слишком больших файлов"""
+    size = get_object_size(content_hash, base_path)
+    if size is None or size > SEARCH_MAX_FILE_SIZE:
+        return None
+
+    content = read_object(content_hash, base_path)
+    if b'\0' in content[:BINARY_SNIFF_SIZE]:
+        return None
+    return content.decode('utf-8', errors='replace')
+
+def _index_blob(connection, content_hash, base_path):
+    """Добавить объект в индекс, если его там ещё нет"""
+    if connection.execute('SELECT 1 FROM blobs WHERE hash = ?', (content_hash,)).fetchone():
+        return
+
+    cursor = connection.execute('INSERT INTO blobs (hash) VALUES (?)', (content_hash,))
+    text = _read_text(content_hash, base_path)
+    if text is not None:
+        connection.execute('INSERT INTO blobs_fts (rowid, content) VALUES (?, ?)', (cursor.lastrowid, text))
+
+def apply_search_updates(updates, base_path='storage/repos'):
+    """Применить изменения файлов к индексу
+
+    updates - список ('put', repo_id, путь, хэш) и ('forget', repo_id, путь);
+    'forget' с пустым путём убирает все файлы репозитория.
+    """
+    connection = get_connection(base_path)
+    with connection:
+        for update in updates:
+            if update[0] == 'put':
+                _, repo_id, path, content_hash = update
+                _index_blob(connection, content_hash, base_path)
+                connection.execute(
+                    'INSERT OR REPLACE INTO files (repo_id, path, hash) VALUES (?, ?, ?)',
+                    (repo_id, path, content_hash)
+                )
+            elif update[0] == 'forget':
+                _, repo_id, path = update
+                if path:
+                    connection.execute(
+                        'DELETE FROM files WHERE repo_id = ? AND (path = ? OR substr(path, 1, ?) = ?)',
+                        (repo_id, path, len(path) + 1, path + '/')
+                    )
+                else:
+                    connection.execute('DELETE FROM files WHERE repo_id = ?', (repo_id,))
+
+def schedule_search_update(*update):
+    """Отложить изменение индекса до фиксации текущей транзакции"""
+    from server.models import db
+
+    db.session.info.setdefault('search_updates', []).append(update)
+
+def _enqueue_before_commit(session):
+    updates = session.info.pop('search_updates', None)
+    if updates:
+        enqueue_job('search-index', {'updates': updates})
+
+def _discard_after_rollback(session):
+    session.info.pop('search_updates', None)
+
+@job_handler('search-index', serial=True)
+def _apply_job(payload):
+    apply_search_updates(payload['updates'])
+
+def init_search(app):
+    """Подключить обновление индекса к фиксации транзакций основной базы"""
+    from server.models import db
+
+    if not event.contains(db.session, 'before_commit', _enqueue_before_commit):
+        event.listen(db.session, 'before_commit', _enqueue_before_commit)
+        event.listen(db.session, 'after_rollback', _discard_after_rollback)
+
+
+def prune_search_index(base_path='storage/repos'):
+    """Убрать из индекса объекты, на которые не ссылается ни один текущий файл
+
+    В индексе без содержимого (content='') запись удаляется командой
+    'delete' с тем же текстом, поэтому объект читается из хранилища;
+    очистка должна выполняться до удаления объектов сборщиком мусора.
+    Возвращает число удалённых объектов.
+    """
+    connection = get_connection(base_path)
+    removed = 0
+    # Блокировка на запись берётся сразу: иначе между выборкой и удалением
+    # на объект мог бы сослаться новый файл
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        rows = connection.execute(
+            'SELECT id, hash FROM blobs WHERE NOT EXISTS (SELECT 1 FROM files WHERE files.hash = blobs.hash)'
+        ).fetchall()
+        for blob_id, content_hash in rows:
+            if get_object_size(content_hash, base_path) is None:
+                # Без содержимого запись из индекса не удалить - оставляем
+                continue
+            text = _read_text(content_hash, base_path)
+            if text is not None:
+                connection.execute(
+                    "INSERT INTO blobs_fts (blobs_fts, rowid, content) VALUES ('delete', ?, ?)",
+                    (blob_id, text)
+                )
+            connection.execute('DELETE FROM blobs WHERE id = ?', (blob_id,))
+            removed += 1
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+    return removed
+
+
+def _quote_query(query):
+    """Запрос FTS5: вся строка - одна фраза, т.е. поиск подстроки"""
+    return '"' + query.replace('"', '""') + '"'
+
+def _find_line(text, query):
+    """Первая строка текста с вхождением запроса: (номер строки, строка)"""
+    needle = query.lower()
+    for number, line in enumerate(text.splitlines(), start=1):
+        if needle in line.lower():
+            return number, line.strip()[:300]
+    return None, None
+
+def search_files(query, repo_ids, limit=50, base_path='storage/repos'):
+    """Найти файлы репозиториев repo_ids, содержащие строку query
+
+    Регистр не учитывается. Возвращает [{'repo_id', 'path', 'hash',
+    'line_number', 'line'}] - до limit результатов.
+    """
+    if len(query) < MIN_QUERY_LENGTH or not repo_ids:
+        return []
+
+    # Список репозиториев передаётся одним JSON-параметром: их может
+    # быть больше, чем SQLite допускает параметров в запросе
+    connection = get_connection(base_path)
+    rows = connection.execute(
+        """SELECT files.repo_id, files.path, files.hash
+           FROM blobs_fts
+           JOIN blobs ON blobs.id = blobs_fts.rowid
+           JOIN files ON files.hash = blobs.hash
+           WHERE blobs_fts MATCH ? AND files.repo_id IN (SELECT value FROM json_each(?))
+           LIMIT ?""",
+        (_quote_query(query), json.dumps(list(repo_ids)), limit)
+    ).fetchall()
+
+    results = []
+    for repo_id, path, content_hash in rows:
+        text = _read_text(content_hash, base_path) or ''
+        line_number, line = _find_line(text, query)
+        results.append({
+            'repo_id': repo_id,
+            'path': path,
+            'hash': content_hash,
+            'line_number': line_number,
+            'line': line
+        })
+    return results
+
+def rebuild_search_index(base_path='storage/repos'):
+    """Заново заполнить список файлов индекса по RepoFile всех репозиториев"""
+    from server.models import RepoFile
+
+    connection = get_connection(base_path)
+    with connection:
+        connection.execute('DELETE FROM files')
+
+    rows = RepoFile.query.filter_by(is_directory=False).with_entities(
+        RepoFile.repo_id, RepoFile.filepath, RepoFile.content_hash
+    ).yield_per(1000)
+
+    batch = []
+    count = 0
+    for repo_id, path, content_hash in rows:
+        batch.append(('put', repo_id, path, content_hash))
+        count += 1
+        if len(batch) >= 1000:
+            apply_search_updates(batch, base_path)
+            batch = []
+    apply_search_updates(batch, base_path)
+    return count
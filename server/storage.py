@@ -0,0 +1,216 @@
+import os
+import io
+import re
+import hashlib
+import shutil
+import uuid
+
+# Хранилище объектов (content-addressable storage).
+# Каждый объект лежит в storage/objects/<2 символа хэша>/<остаток хэша>,
+# записывается один раз и больше никогда не меняется. Одинаковое
+# содержимое из разных репозиториев и версий хранится в одном экземпляре.
+
+# Хэш объекта - SHA-256 в шестнадцатеричном виде (нижний регистр)
+OBJECT_HASH_RE = re.compile(r'[0-9a-f]{64}')
+
+
+def get_objects_path(base_path='storage/repos'):
+    """Получить путь к хранилищу объектов (рядом с папкой репозиториев)"""
+    storage_root = os.path.dirname(os.path.normpath(base_path))
+    return os.path.join(storage_root, 'objects')
+
+def is_object_hash(value):
+    """Проверить, что значение - хэш объекта"""
+    return isinstance(value, str) and OBJECT_HASH_RE.fullmatch(value) is not None
+
+def get_object_path(content_hash, base_path='storage/repos'):
+    """Получить путь к объекту по его хэшу
+
+    Хэш становится частью пути к файлу, поэтому всё, что не похоже на
+    хэш (в том числе '..' и '/'), отклоняется с ValueError.
+    """
+    if not is_object_hash(content_hash):
+        raise ValueError(f'Неверный хэш объекта: {content_hash!r}')
+    return os.path.join(get_objects_path(base_path), content_hash[:2], content_hash[2:])
+
+def get_objects_tmp_path(base_path='storage/repos'):
+    """Получить путь к папке временных файлов хранилища"""
+    tmp_path = os.path.join(get_objects_path(base_path), 'tmp')
+    os.makedirs(tmp_path, exist_ok=True)
+    return tmp_path
+
+def get_uploads_path(base_path='storage/repos'):
+    """Получить путь к папке незавершённых загрузок"""
+    uploads_path = os.path.join(os.path.dirname(get_objects_path(base_path)), 'uploads')
+    os.makedirs(uploads_path, exist_ok=True)
+    return uploads_path
+
+def get_archives_path(base_path='storage/repos'):
+    """Получить путь к кэшу архивов версий"""
+    archives_path = os.path.join(os.path.dirname(get_objects_path(base_path)), 'archives')
+    os.makedirs(archives_path, exist_ok=True)
+    return archives_path
+
+def object_exists(content_hash, base_path='storage/repos'):
+    """Проверить, есть ли объект в хранилище"""
+    from server.packs import packed_object_exists
+    
+    return (os.path.exists(get_object_path(content_hash, base_path))
+            or packed_object_exists(content_hash, base_path))
+
+def freshen_object(content_hash, base_path='storage/repos'):
+    """Проверить, есть ли объект, и обновить время его изменения
+
+    Сборщик мусора (server/cleanup.py) не удаляет недавно изменённые
+    объекты, поэтому объект, на который вот-вот сошлётся новый коммит,
+    не пропадёт, даже если сейчас на него никто не ссылается. Для
+    упакованного объекта обновляется время пак-файла.
+    """
+    from server.packs import load_pack_index
+
+    if _touch(get_object_path(content_hash, base_path)):
+        return True
+    entry = load_pack_index(base_path).get(content_hash)
+    return entry is not None and _touch(entry[0])
+
+def _touch(path):
+    """Обновить время изменения файла; False, если файла нет"""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+def write_object(content, base_path='storage/repos'):
+    """Записать объект в хранилище и вернуть его хэш
+
+    Если объект уже есть, повторно он не записывается.
+    """
+    content_hash = hashlib.sha256(content).hexdigest()
+    object_path = get_object_path(content_hash, base_path)
+
+    if _touch(object_path):
+        return content_hash
+
+    # Пишем во временный файл и атомарно переносим на место,
+    # чтобы читатели никогда не увидели недописанный объект
+    tmp_file = os.path.join(get_objects_tmp_path(base_path), uuid.uuid4().hex)
+    with open(tmp_file, 'wb') as f:
+        f.write(content)
+
+    os.makedirs(os.path.dirname(object_path), exist_ok=True)
+    os.replace(tmp_file, object_path)
+
+    return content_hash
+
+def store_object_file(tmp_file, content_hash, base_path='storage/repos'):
+    """Перенести готовый файл в хранилище под известным хэшем
+
+    Файл должен лежать на той же файловой системе, что и хранилище.
+    """
+    object_path = get_object_path(content_hash, base_path)
+
+    if _touch(object_path):
+        os.remove(tmp_file)
+    else:
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        os.replace(tmp_file, object_path)
+
+    return content_hash
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """Посчитать хэш файла по частям (как calculate_file_hash), вернуть (хэш, размер)"""
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+            size += len(chunk)
+    return hasher.hexdigest(), size
+
+def write_object_stream(stream, base_path='storage/repos', chunk_size=1024 * 1024):
+    """Записать объект из потока, не держа его в памяти целиком
+
+    Данные пишутся во временный файл по частям, хэш считается по ходу
+    чтения. Возвращает (хэш, размер).
+    """
+    return write_object_chunks(iter(lambda: stream.read(chunk_size), b''), base_path)
+
+def write_object_chunks(chunks, base_path='storage/repos'):
+    """Записать объект из последовательности блоков байт, вернуть (хэш, размер)"""
+    tmp_file = os.path.join(get_objects_tmp_path(base_path), uuid.uuid4().hex)
+    hasher = hashlib.sha256()
+    size = 0
+
+    try:
+        with open(tmp_file, 'wb') as f:
+            for chunk in chunks:
+                hasher.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        os.remove(tmp_file)
+        raise
+
+    return store_object_file(tmp_file, hasher.hexdigest(), base_path), size
+
+def read_object(content_hash, base_path='storage/repos'):
+    """Прочитать объект из хранилища (отдельный файл или пак-файл)"""
+    from server.packs import read_packed_object
+
+    object_path = get_object_path(content_hash, base_path)
+
+    try:
+        with open(object_path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return read_packed_object(content_hash, base_path)
+
+def open_object(content_hash, base_path='storage/repos'):
+    """Открыть объект для чтения по частям
+
+    Отдельный файл открывается с диска, упакованный объект
+    распаковывается в память.
+    """
+    try:
+        return open(get_object_path(content_hash, base_path), 'rb')
+    except FileNotFoundError:
+        content = read_object(content_hash, base_path)
+        if content is None:
+            raise LookupError(f'Объект {content_hash} не найден')
+        return io.BytesIO(content)
+
+def get_object_size(content_hash, base_path='storage/repos'):
+    """Размер объекта в байтах или None, если объекта нет"""
+    try:
+        return os.path.getsize(get_object_path(content_hash, base_path))
+    except FileNotFoundError:
+        content = read_object(content_hash, base_path)
+        return None if content is None else len(content)
+
+def link_object(content_hash, dest_path, base_path='storage/repos'):
+    """Поместить объект в рабочую копию репозитория
+
+    Рабочая копия - это жёсткая ссылка на объект, поэтому место на диске
+    не расходуется повторно. Файлы рабочей копии можно только заменять
+    целиком, но не дописывать на месте. Если файловая система не
+    поддерживает жёсткие ссылки, объект копируется.
+    """
+    object_path = get_object_path(content_hash, base_path)
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+
+    if not os.path.exists(object_path):
+        # Объект упакован - распаковываем его обратно в отдельный файл
+        content = read_object(content_hash, base_path)
+        if content is None:
+            raise LookupError(f'Объект {content_hash} не найден')
+        write_object(content, base_path)
+
+    tmp_link = f"{dest_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.link(object_path, tmp_link)
+    except OSError:
+        shutil.copyfile(object_path, tmp_link)
+
+    os.replace(tmp_link, dest_path)
+    return dest_path
@@ -0,0 +1,131 @@
+import os
+import zlib
+import struct
+import hashlib
+import uuid
+
+from server.storage import read_object, freshen_object, store_object_file, get_objects_tmp_path
+from server.trees import read_tree, TREE_DIR
+
+# Поток объектов для синхронизации с клиентом scvp.
+#
+# MAGIC, затем для каждого объекта:
+#   32 байта  - SHA-256 содержимого
+#   8 байт    - длина сжатых данных (big-endian)
+#   N байт    - содержимое, сжатое zlib
+# Конец потока - 32 нулевых байта.
+
+STREAM_MAGIC = b'SCVP-OBJECTS-1\n'
+END_MARKER = b'\0' * 32
+READ_CHUNK = 64 * 1024
+
+
+def collect_tree_objects(tree_hash, have, base_path='storage/repos', seen=None, base=None):
+    """Перечислить объекты дерева, которых нет у клиента
+
+    have - множество хэшей, которые у клиента уже есть. Поддерево,
+    которое есть у клиента, пропускается целиком.
+    base - дерево версии, которая уже есть у клиента: записи, совпадающие
+    с ним по имени и хэшу, пропускаются, а изменённые папки сравниваются
+    с теми же папками base. Так клиенту не нужно перечислять свои объекты.
+    """
+    seen = set() if seen is None else seen
+
+    if not tree_hash or tree_hash in have or tree_hash in seen or tree_hash == base:
+        return
+    seen.add(tree_hash)
+    yield tree_hash
+
+    old_entries = read_tree(base, base_path) if base else {}
+    for name, entry in read_tree(tree_hash, base_path).items():
+        old_entry = old_entries.get(name)
+        if old_entry is not None and old_entry['hash'] == entry['hash']:
+            continue
+        if entry['type'] == TREE_DIR:
+            old_tree = old_entry['hash'] if old_entry is not None and old_entry['type'] == TREE_DIR else None
+            yield from collect_tree_objects(entry['hash'], have, base_path, seen, old_tree)
+        elif entry['hash'] not in have and entry['hash'] not in seen:
+            seen.add(entry['hash'])
+            yield entry['hash']
+
+def find_missing_tree_objects(tree_hash, base_path='storage/repos'):
+    """Найти объекты, на которые ссылается дерево, но которых нет в хранилище
+
+    Найденные объекты помечаются свежими, чтобы сборщик мусора не удалил
+    их до фиксации коммита.
+    """
+    missing = []
+    if not freshen_object(tree_hash, base_path):
+        return [tree_hash]
+
+    for entry in read_tree(tree_hash, base_path).values():
+        if entry['type'] == TREE_DIR:
+            missing.extend(find_missing_tree_objects(entry['hash'], base_path))
+        elif not freshen_object(entry['hash'], base_path):
+            missing.append(entry['hash'])
+    return missing
+
+def generate_object_stream(object_hashes, base_path='storage/repos'):
+    """Сформировать поток объектов (генератор для потокового ответа)"""
+    yield STREAM_MAGIC
+
+    for object_hash in object_hashes:
+        content = read_object(object_hash, base_path)
+        if content is None:
+            raise LookupError(f'Объект {object_hash} не найден')
+        packed = zlib.compress(content)
+        yield bytes.fromhex(object_hash) + struct.pack('>Q', len(packed)) + packed
+
+    yield END_MARKER
+
+def _read_exact(stream, size):
+    data = b''
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            raise ValueError('Поток объектов оборван')
+        data += chunk
+    return data
+
+def receive_object_stream(stream, base_path='storage/repos'):
+    """Принять поток объектов и записать их в хранилище
+
+    Каждый объект распаковывается во временный файл по частям, его хэш
+    сверяется с заявленным. Возвращает список принятых хэшей.
+    """
+    if _read_exact(stream, len(STREAM_MAGIC)) != STREAM_MAGIC:
+        raise ValueError('Неизвестный формат потока объектов')
+
+    received = []
+    while True:
+        digest = _read_exact(stream, 32)
+        if digest == END_MARKER:
+            return received
+
+        object_hash = digest.hex()
+        remaining, = struct.unpack('>Q', _read_exact(stream, 8))
+
+        tmp_file = os.path.join(get_objects_tmp_path(base_path), uuid.uuid4().hex)
+        hasher = hashlib.sha256()
+        decompressor = zlib.decompressobj()
+
+        with open(tmp_file, 'wb') as f:
+            while remaining:
+                chunk = stream.read(min(READ_CHUNK, remaining))
+                if not chunk:
+                    os.remove(tmp_file)
+                    raise ValueError('Поток объектов оборван')
+                remaining -= len(chunk)
+                data = decompressor.decompress(chunk)
+                hasher.update(data)
+                f.write(data)
+            data = decompressor.flush()
+            hasher.update(data)
+            f.write(data)
+
+        if hasher.hexdigest() != object_hash:
+            os.remove(tmp_file)
+            raise ValueError(f'Хэш объекта {object_hash} не совпадает с содержимым')
+
+        store_object_file(tmp_file, object_hash, base_path)
+        received.append(object_hash)
@@ -0,0 +1,144 @@
+from array import array
+
+from server.cache import TTLCache
+from server.storage import open_object, write_object_chunks
+
+# Редактирование больших текстовых файлов по частям.
+#
+# Для объекта строится индекс строк - смещения начала каждой строки в
+# байтах. По нему редактор читает окно строк, не загружая файл целиком,
+# а сохраняет только изменённые диапазоны строк (патч). Новый объект
+# собирается потоком: неизменённые участки копируются из старого
+# объекта, вместо изменённых пишутся новые строки. Объекты неизменны,
+# поэтому индекс кэшируется по хэшу.
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+_line_index_cache = TTLCache(maxsize=32, ttl=3600)
+
+
+class PatchError(ValueError):
+    """Патч не подходит к файлу"""
+
+
+class LineIndex:
+    """Смещения строк объекта
+
+    Строка i занимает байты [offsets[i], offsets[i + 1]) (последняя - до
+    конца файла) вместе со своим переводом строки.
+    """
+
+    def __init__(self, offsets, size, newline, ends_with_newline):
+        self.offsets = offsets
+        self.size = size
+        self.newline = newline
+        self.ends_with_newline = ends_with_newline
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def offset(self, line):
+        """Смещение начала строки line; для line == числу строк - конец файла"""
+        return self.offsets[line] if line < len(self.offsets) else self.size
+
+
+def get_line_index(content_hash, base_path='storage/repos'):
+    """Индекс строк объекта (строится одним проходом по файлу и кэшируется)"""
+    index = _line_index_cache.get(content_hash)
+    if index is not None:
+        return index
+
+    offsets = array('Q')
+    size = 0
+    newline = b'\n'
+    last_byte = b''
+    with open_object(content_hash, base_path) as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+            if size == 0:
+                offsets.append(0)
+                first_end = chunk.find(b'\n')
+                if first_end > 0 and chunk[first_end - 1:first_end] == b'\r':
+                    newline = b'\r\n'
+            position = chunk.find(b'\n')
+            while position != -1:
+                offsets.append(size + position + 1)
+                position = chunk.find(b'\n', position + 1)
+            size += len(chunk)
+            last_byte = chunk[-1:]
+
+    # После завершающего перевода строки новой строки нет
+    if offsets and offsets[-1] == size:
+        offsets.pop()
+
+    index = LineIndex(offsets, size, newline, last_byte == b'\n')
+    _line_index_cache.set(content_hash, index)
+    return index
+
+def read_lines(content_hash, start, count, base_path='storage/repos'):
+    """Прочитать строки [start, start + count) объекта без перевода строки"""
+    index = get_line_index(content_hash, base_path)
+    end = min(start + count, len(index))
+    if start >= end:
+        return []
+
+    with open_object(content_hash, base_path) as f:
+        f.seek(index.offset(start))
+        data = f.read(index.offset(end) - index.offset(start))
+
+    # Делим только по \n, как и индекс (splitlines делит ещё и по \r)
+    lines = data.split(b'\n')
+    if data.endswith(b'\n'):
+        lines.pop()
+    return [
+        (line[:-1] if line.endswith(b'\r') else line).decode('utf-8', errors='replace')
+        for line in lines
+    ]
+
+
+def _copy_range(f, start, end):
+    f.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        chunk = f.read(min(READ_CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
+
+def _patched_chunks(content_hash, index, patches, base_path):
+    total = len(index)
+    with open_object(content_hash, base_path) as f:
+        position = 0
+        for start, end, lines in patches:
+            yield from _copy_range(f, position, index.offset(start))
+
+            if lines:
+                text = index.newline.join(line.encode('utf-8') for line in lines)
+                if start == total and total and not index.ends_with_newline:
+                    # Дописываем в конец файла без перевода строки в конце
+                    yield index.newline + text
+                elif end < total or index.ends_with_newline or not total:
+                    yield text + index.newline
+                else:
+                    yield text
+            position = index.offset(end)
+        yield from _copy_range(f, position, index.size)
+
+def apply_line_patch(content_hash, patches, base_path='storage/repos'):
+    """Применить патч к объекту и записать результат новым объектом
+
+    patches - [(start, end, строки)]: строки [start, end) исходного
+    объекта (с нуля) заменяются новыми строками. Диапазоны не должны
+    пересекаться. Неизменённые участки копируются блоками, без разбора
+    на строки и перекодирования. Возвращает (хэш, размер).
+    """
+    index = get_line_index(content_hash, base_path)
+    patches = sorted((int(start), int(end), list(lines)) for start, end, lines in patches)
+
+    previous_end = 0
+    for start, end, lines in patches:
+        if not 0 <= start <= end <= len(index) or start < previous_end:
+            raise PatchError(f'Неверный диапазон строк: {start}-{end}')
+        previous_end = end
+
+    return write_object_chunks(_patched_chunks(content_hash, index, patches, base_path), base_path)
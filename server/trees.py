@@ -0,0 +1,196 @@
+import os
+import json
+import shutil
+from functools import lru_cache
+
+from werkzeug.security import safe_join
+
+from server.storage import write_object, read_object, link_object, is_object_hash
+
+# Дерево - неизменяемый объект хранилища с описанием одной папки:
+# имя -> (тип, хэш, размер). Вложенные папки ссылаются на свои деревья,
+# поэтому неизменённые поддеревья у соседних версий общие, а хэш
+# корневого дерева однозначно задаёт состояние всего репозитория.
+
+TREE_BLOB = 'blob'
+TREE_DIR = 'tree'
+TREE_TYPES = (TREE_BLOB, TREE_DIR)
+
+
+def write_tree(entries, base_path='storage/repos'):
+    """Записать дерево в хранилище и вернуть его хэш"""
+    data = [
+        [name, entry['type'], entry['hash'], entry['size']]
+        for name, entry in sorted(entries.items())
+    ]
+    content = json.dumps({'entries': data}, separators=(',', ':'), ensure_ascii=False)
+    return write_object(content.encode('utf-8'), base_path)
+
+def is_valid_entry_name(name):
+    """Может ли имя быть записью дерева (одна часть пути, без '..' и '/')"""
+    return (isinstance(name, str) and name not in ('', '.', '..')
+            and '/' not in name and '\0' not in name)
+
+def _check_tree_entry(name, entry_type, entry_hash, size):
+    # Деревья приходят и от клиентов (push), а имена записей становятся
+    # путями рабочей копии - поэтому проверяется каждая запись
+    if not is_valid_entry_name(name):
+        raise ValueError(f'Недопустимое имя в дереве: {name!r}')
+    if entry_type not in TREE_TYPES or not is_object_hash(entry_hash):
+        raise ValueError(f'Неверная запись дерева: {name!r}')
+    if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+        raise ValueError(f'Неверный размер в дереве: {name!r}')
+
+@lru_cache(maxsize=4096)
+def read_tree(tree_hash, base_path='storage/repos'):
+    """Прочитать дерево из хранилища
+
+    Деревья неизменяемы, поэтому результат кэшируется.
+    Возвращаемый словарь нельзя изменять. Для испорченного или
+    недопустимого дерева бросается ValueError.
+    """
+    if not tree_hash:
+        return {}
+
+    content = read_object(tree_hash, base_path)
+    if content is None:
+        raise LookupError(f'Дерево {tree_hash} не найдено')
+
+    try:
+        data = json.loads(content)['entries']
+    except (ValueError, KeyError, TypeError):
+        raise ValueError(f'Объект {tree_hash} не является деревом')
+
+    entries = {}
+    for entry in data:
+        if not isinstance(entry, list) or len(entry) != 4:
+            raise ValueError(f'Неверная запись дерева {tree_hash}')
+        name, entry_type, entry_hash, size = entry
+        _check_tree_entry(name, entry_type, entry_hash, size)
+        entries[name] = {'type': entry_type, 'hash': entry_hash, 'size': size}
+    return entries
+
+def update_tree(tree_hash, changes, base_path='storage/repos'):
+    """Построить новое дерево, применив изменения к существующему
+
+    changes - словарь {путь: (хэш, размер)} для добавленных и изменённых
+    файлов или {путь: None} для удалённых файлов и папок. Перезаписываются
+    только деревья папок на пути к изменённым файлам.
+    """
+    entries = dict(read_tree(tree_hash, base_path))
+    nested = {}
+
+    for path, value in changes.items():
+        name, _, rest = path.strip('/').partition('/')
+        if rest:
+            nested.setdefault(name, {})[rest] = value
+        elif value is None:
+            entries.pop(name, None)
+        else:
+            content_hash, size = value
+            entries[name] = {'type': TREE_BLOB, 'hash': content_hash, 'size': size}
+
+    for name, sub_changes in nested.items():
+        current = entries.get(name)
+        sub_hash = current['hash'] if current and current['type'] == TREE_DIR else None
+        new_sub_hash = update_tree(sub_hash, sub_changes, base_path)
+        sub_entries = read_tree(new_sub_hash, base_path)
+
+        if sub_entries:
+            entries[name] = {
+                'type': TREE_DIR,
+                'hash': new_sub_hash,
+                'size': sum(entry['size'] for entry in sub_entries.values())
+            }
+        elif current is not None and current['type'] == TREE_DIR:
+            # Пустые папки в дерево не попадают
+            del entries[name]
+
+    return write_tree(entries, base_path)
+
+def build_tree(files, base_path='storage/repos'):
+    """Построить дерево из полного списка {путь: (хэш, размер)}"""
+    return update_tree(None, files, base_path)
+
+def walk_tree(tree_hash, base_path='storage/repos', prefix=''):
+    """Обойти все файлы дерева, возвращая (путь, хэш, размер)"""
+    for name, entry in sorted(read_tree(tree_hash, base_path).items()):
+        path = f"{prefix}{name}"
+        if entry['type'] == TREE_DIR:
+            yield from walk_tree(entry['hash'], base_path, path + '/')
+        else:
+            yield path, entry['hash'], entry['size']
+
+def diff_trees(old_hash, new_hash, base_path='storage/repos', prefix=''):
+    """Сравнить два дерева
+
+    Возвращает (путь, старая запись, новая запись) для каждого
+    изменённого файла. Поддеревья с одинаковым хэшем пропускаются.
+    """
+    if old_hash == new_hash:
+        return
+
+    old_entries = read_tree(old_hash, base_path)
+    new_entries = read_tree(new_hash, base_path)
+
+    for name in sorted(set(old_entries) | set(new_entries)):
+        old_entry = old_entries.get(name)
+        new_entry = new_entries.get(name)
+        path = f"{prefix}{name}"
+
+        if old_entry == new_entry:
+            continue
+
+        old_is_dir = old_entry is not None and old_entry['type'] == TREE_DIR
+        new_is_dir = new_entry is not None and new_entry['type'] == TREE_DIR
+        old_file = None if old_is_dir else old_entry
+        new_file = None if new_is_dir else new_entry
+
+        # Удалённый файл идёт раньше папки с тем же именем, а
+        # добавленный - позже удалённой папки
+        if old_file is not None and new_file is None:
+            yield path, old_file, None
+
+        if old_is_dir or new_is_dir:
+            yield from diff_trees(
+                old_entry['hash'] if old_is_dir else None,
+                new_entry['hash'] if new_is_dir else None,
+                base_path, path + '/'
+            )
+
+        if new_file is not None and old_file != new_file:
+            yield path, old_file, new_file
+
+def checkout_tree(repo_id, old_hash, new_hash, base_path='storage/repos', record=True):
+    """Перевести рабочую копию репозитория из одного дерева в другое
+
+    Затрагиваются только изменившиеся файлы. С record=False меняются
+    только файлы, а RepoFile остаётся как есть (откат рабочей копии).
+    Возвращает словарь изменений в формате update_tree.
+    """
+    from server.utils import get_repo_storage_path, record_repo_file, forget_repo_file
+
+    repo_path = get_repo_storage_path(repo_id, base_path)
+    changes = {}
+    for path, old_entry, new_entry in diff_trees(old_hash, new_hash, base_path):
+        full_path = safe_join(repo_path, path)
+        if full_path is None:
+            raise ValueError(f'Путь {path!r} выходит за пределы репозитория')
+
+        if new_entry is None:
+            if os.path.isfile(full_path):
+                os.remove(full_path)
+            if record:
+                forget_repo_file(repo_id, path)
+            changes[path] = None
+        else:
+            if os.path.isdir(full_path):
+                shutil.rmtree(full_path)
+                if record:
+                    forget_repo_file(repo_id, path)
+            link_object(new_entry['hash'], full_path, base_path)
+            if record:
+                record_repo_file(repo_id, path, new_entry['hash'], new_entry['size'])
+            changes[path] = (new_entry['hash'], new_entry['size'])
+
+    return changes
@@ -2,6 +2,10 @@ import os
 import hashlib
 import shutil
 from datetime import datetime
+from werkzeug.security import safe_join
+
+from server.storage import write_object, write_object_stream, link_object
+from server.search import schedule_search_update
 
 def get_repo_storage_path(repo_id, base_path='storage/repos'):
     """Получить путь к папке репозитория"""
@@ -22,17 +26,136 @@ def calculate_file_hash(content):
     """Рассчитать хэш содержимого файла"""
     return hashlib.sha256(content).hexdigest()
 
+def normalize_repo_path(filepath):
+    """Привести путь внутри репозитория к виду 'папка/файл'"""
+    path = os.path.normpath(filepath).replace(os.sep, '/').strip('/')
+    return '' if path == '.' else path
+
+def safe_repo_path(repo_id, filepath, base_path='storage/repos'):
+    """Проверить, что путь не выходит за пределы репозитория
+    
+    Возвращает путь в общем виде или None для недопустимого пути.
+    """
+    if not filepath or safe_join(get_repo_storage_path(repo_id, base_path), filepath) is None:
+        return None
+    return normalize_repo_path(filepath) or None
+
+def get_parent_path(filepath):
+    """Папка, в которой лежит путь ('' - корень репозитория)"""
+    return filepath.rpartition('/')[0]
+
+def record_repo_directory(repo_id, dirpath):
+    """Записать папку и все её родительские папки в RepoFile (без фиксации сессии)"""
+    from server.models import db, RepoFile
+    
+    dirpath = normalize_repo_path(dirpath)
+    
+    # Поднимаемся вверх до первой уже известной папки
+    while dirpath:
+        if RepoFile.query.filter_by(repo_id=repo_id, filepath=dirpath).first() is not None:
+            break
+        
+        db.session.add(RepoFile(
+            repo_id=repo_id,
+            filename=os.path.basename(dirpath),
+            filepath=dirpath,
+            parent_path=get_parent_path(dirpath),
+            content_hash='',
+            size=0,
+            is_directory=True
+        ))
+        dirpath = get_parent_path(dirpath)
+
+def record_repo_file(repo_id, filepath, content_hash, size):
+    """Записать файл в таблицу RepoFile (без фиксации сессии)"""
+    from server.models import db, RepoFile
+    
+    filepath = normalize_repo_path(filepath)
+    repo_file = RepoFile.query.filter_by(repo_id=repo_id, filepath=filepath).first()
+    
+    if repo_file is None:
+        record_repo_directory(repo_id, get_parent_path(filepath))
+        repo_file = RepoFile(repo_id=repo_id, filepath=filepath)
+        db.session.add(repo_file)
+    
+    repo_file.filename = os.path.basename(filepath)
+    repo_file.parent_path = get_parent_path(filepath)
+    repo_file.content_hash = content_hash
+    repo_file.size = size
+    repo_file.is_directory = False
+    
+    # Поисковый индекс обновится после фиксации транзакции
+    schedule_search_update('put', repo_id, filepath, content_hash)
+    return repo_file
+
+def forget_repo_file(repo_id, filepath):
+    """Удалить файл (или папку со всем содержимым) из таблицы RepoFile"""
+    from server.models import RepoFile
+    
+    filepath = normalize_repo_path(filepath)
+    RepoFile.query.filter(
+        RepoFile.repo_id == repo_id,
+        (RepoFile.filepath == filepath) | RepoFile.filepath.startswith(filepath + '/')
+    ).delete(synchronize_session=False)
+    schedule_search_update('forget', repo_id, filepath)
+
+def get_repo_index(repo_id):
+    """Получить все файлы репозитория из RepoFile: {путь: (хэш, размер)}"""
+    from server.models import RepoFile
+    
+    rows = RepoFile.query.filter_by(repo_id=repo_id, is_directory=False).with_entities(
+        RepoFile.filepath, RepoFile.content_hash, RepoFile.size
+    )
+    return {filepath: (content_hash, size) for filepath, content_hash, size in rows}
+
+def get_repo_changes(repo_id, paths):
+    """Получить текущее состояние изменённых путей для update_tree
+    
+    Путь, которого больше нет в RepoFile, считается удалённым.
+    """
+    from server.models import RepoFile
+    
+    paths = [normalize_repo_path(path) for path in paths]
+    changes = dict.fromkeys(paths)
+    
+    # Запрашиваем пачками, чтобы большой коммит не упёрся в лимит параметров
+    for start in range(0, len(paths), 500):
+        rows = RepoFile.query.filter(
+            RepoFile.repo_id == repo_id,
+            RepoFile.is_directory.is_(False),
+            RepoFile.filepath.in_(paths[start:start + 500])
+        ).with_entities(RepoFile.filepath, RepoFile.content_hash, RepoFile.size)
+        
+        for filepath, content_hash, size in rows:
+            changes[filepath] = (content_hash, size)
+    return changes
+
 def save_file_to_repo(repo_id, filepath, content, base_path='storage/repos'):
-    """Сохранить файл в репозитории"""
+    """Сохранить файл в репозитории
+    
+    Содержимое записывается в хранилище объектов, файл в папке
+    репозитория становится ссылкой на объект, а RepoFile.content_hash -
+    его хэшем. Сессию БД фиксирует вызывающий код.
+    """
+    # Сохраняем содержимое в хранилище объектов
+    content_hash = write_object(content, base_path)
+    
+    return place_object_in_repo(repo_id, filepath, content_hash, len(content), base_path)
+
+def save_stream_to_repo(repo_id, filepath, stream, base_path='storage/repos'):
+    """Сохранить файл в репозитории, читая содержимое из потока по частям"""
+    content_hash, size = write_object_stream(stream, base_path)
+    
+    return place_object_in_repo(repo_id, filepath, content_hash, size, base_path)
+
+def place_object_in_repo(repo_id, filepath, content_hash, size, base_path='storage/repos'):
+    """Сделать объект хранилища файлом репозитория"""
     repo_path = create_repo_directory(repo_id, base_path)
     full_path = os.path.join(repo_path, filepath)
     
-    # Создаем папки если нужно
-    os.makedirs(os.path.dirname(full_path), exist_ok=True)
-    
-    # Сохраняем файл
-    with open(full_path, 'wb') as f:
-        f.write(content)
+    # Рабочая копия - ссылка на объект
+    link_object(content_hash, full_path, base_path)
+    record_repo_file(repo_id, filepath, content_hash, size)
     
     return full_path
 
@@ -55,6 +178,7 @@ def delete_file_from_repo(repo_id, filepath, base_path='storage/repos'):
             shutil.rmtree(full_path)
         else:
             os.remove(full_path)
+        forget_repo_file(repo_id, filepath)
         return True
     return False
 
@@ -93,6 +217,108 @@ def scan_repo_directory(repo_id, base_path='storage/repos'):
     
     return files
 
+def list_repo_files(repo_id, path=None):
+    """Получить список файлов репозитория из RepoFile
+    
+    Без path возвращаются все файлы и папки, с path - только
+    содержимое этой папки (папки первыми). Формат такой же,
+    как у scan_repo_directory.
+    """
+    from server.models import RepoFile
+    
+    query = RepoFile.query.filter_by(repo_id=repo_id)
+    
+    if path is None:
+        query = query.order_by(RepoFile.filepath)
+    else:
+        query = query.filter_by(parent_path=normalize_repo_path(path))
+        query = query.order_by(RepoFile.is_directory.desc(), RepoFile.filename)
+    
+    rows = query.with_entities(RepoFile.filename, RepoFile.filepath, RepoFile.is_directory, RepoFile.size)
+    
+    return [
+        {
+            'name': filename,
+            'path': filepath,
+            'type': 'directory' if is_directory else 'file',
+            'size': size
+        }
+        for filename, filepath, is_directory, size in rows
+    ]
+
+def get_commit_history(repo_id, before=None, limit=50):
+    """Получить страницу истории коммитов (от новых к старым)
+    
+    Постраничный вывод по ключу: before - номер версии, с которой
+    начинается следующая страница. Возвращает (коммиты, before для
+    следующей страницы или None, если страница последняя).
+    """
+    from server.models import Commit
+    
+    query = Commit.query.filter(Commit.repo_id == repo_id)
+    if before is not None:
+        query = query.filter(Commit.version_number < before)
+    
+    commits = query.order_by(Commit.version_number.desc()).limit(limit + 1).all()
+    
+    if len(commits) > limit:
+        commits = commits[:limit]
+        return commits, commits[-1].version_number
+    return commits, None
+
+def get_version_trees(repo_id, versions):
+    """Получить корневые деревья версий одним запросом: {версия: хэш дерева}
+
+    Версия 0 - пустой репозиторий до первого коммита (дерево None).
+    Версий, которых нет, в результате тоже нет.
+    """
+    from server.models import Commit
+    
+    trees = {0: None} if 0 in versions else {}
+    rows = Commit.query.filter(
+        Commit.repo_id == repo_id, Commit.version_number.in_(list(versions))
+    ).with_entities(Commit.version_number, Commit.tree_hash).all()
+    
+    trees.update((version, tree_hash) for version, tree_hash in rows)
+    return trees
+
+def get_repo_or_404(repo_id):
+    """Получить репозиторий по номеру; удалённые репозитории не находятся (404)"""
+    from server.models import Repository
+    
+    return Repository.query.filter_by(id=repo_id, deleted_at=None).first_or_404()
+
+def get_visible_repo_ids(user_id, repo_id=None, owner_id=None):
+    """Номера репозиториев, которые пользователь может читать
+
+    Свои, публичные и те, где пользователь - участник. Можно сузить до
+    одного репозитория или до репозиториев одного владельца.
+    """
+    from server.models import db, Repository, Collaborator
+    
+    shared = db.select(Collaborator.repo_id).where(Collaborator.user_id == user_id)
+    query = Repository.query.filter(
+        (Repository.user_id == user_id) | Repository.is_public.is_(True) | Repository.id.in_(shared),
+        Repository.deleted_at.is_(None)
+    )
+    if repo_id is not None:
+        query = query.filter(Repository.id == repo_id)
+    if owner_id is not None:
+        query = query.filter(Repository.user_id == owner_id)
+    
+    return [row.id for row in query.with_entities(Repository.id)]
+
+def index_repo_directory(repo_id, base_path='storage/repos'):
+    """Заполнить RepoFile по файлам на диске (для репозиториев, созданных
+    до появления индекса). Сессию БД фиксирует вызывающий код.
+    """
+    for item in scan_repo_directory(repo_id, base_path):
+        if item['type'] == 'directory':
+            record_repo_directory(repo_id, item['path'])
+        else:
+            content = read_file_from_repo(repo_id, item['path'], base_path)
+            save_file_to_repo(repo_id, item['path'], content, base_path)
+
 def create_initial_readme(repo_id, repo_name, description, base_path='storage/repos'):
     """Создать начальный README.md файл"""
     now = datetime.now().strftime('%Y-%m-%d %H:%M')
@@ -0,0 +1,135 @@
+import os
+
+import pytest
+
+from server import create_app, db
+from server.config import TestingConfig
+from server.jobs import run_next_job
+from server.models import User, Repository
+from server.utils import create_repo_directory
+
+
+def _reset_process_caches():
+    """Сбросить кэши процесса, привязанные к путям хранилища
+
+    Пути хранилища относительные, а каждый тест работает в своей
+    временной папке: индекс пак-файлов и соединения с поисковой базой
+    предыдущего теста указывали бы на чужие файлы.
+    """
+    from server import packs, search, trees, preview, textedit
+
+    packs._index_cache.clear()
+    trees.read_tree.cache_clear()
+    preview._kind_cache.clear()
+    textedit._line_index_cache.clear()
+    for connection in getattr(search._local, 'connections', {}).values():
+        connection.close()
+    search._local.connections = {}
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Каждый тест работает в своей временной папке
+
+    Хранилище (storage/...) задаётся путями от текущей папки.
+    """
+    monkeypatch.chdir(tmp_path)
+    _reset_process_caches()
+    yield tmp_path
+    _reset_process_caches()
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    if not os.environ.get('TEST_DATABASE_URL'):
+        monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'scvp.db'}")
+
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def empty_app(tmp_path, monkeypatch):
+    """Приложение с пустой базой: таблицы не созданы (для init-db и миграций)"""
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'fresh.db'}")
+    app = create_app('testing')
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def ctx(app):
+    """Контекст запроса для тестов, работающих с моделями напрямую
+
+    Автор коммита берётся из current_user, поэтому тест входит через
+    login_user(пользователь).
+    """
+    with app.test_request_context():
+        yield
+        db.session.remove()
+
+
+def make_user(username, password='password123'):
+    user = User(username=username)
+    user.set_password(password)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+def make_repo(owner, name='project', is_public=False):
+    repo = Repository(name=name, user_id=owner.id, is_public=is_public)
+    db.session.add(repo)
+    db.session.commit()
+    create_repo_directory(repo.id)
+    return repo
+
+def login(client, username, password='password123'):
+    return client.post('/auth/login', data={'username': username, 'password': password})
+
+def run_jobs(app):
+    """Выполнить все готовые задачи очереди; вернуть их количество"""
+    count = 0
+    while run_next_job(app):
+        count += 1
+    return count
+
+def seed_repo(app, files, owner='owner', is_public=False):
+    """Создать репозиторий с файлами {путь: байты} одним коммитом; вернуть его id
+
+    Владелец создаётся, если его ещё нет.
+    """
+    from flask_login import login_user
+    from server.commits import create_commit
+    from server.utils import save_file_to_repo
+
+    with app.test_request_context():
+        user = User.query.filter_by(username=owner).first() or make_user(owner)
+        login_user(user)
+        repo = make_repo(user, is_public=is_public)
+        for path, content in files.items():
+            save_file_to_repo(repo.id, path, content)
+        create_commit(repo.id, 'Initial commit', list(files))
+        return repo.id
+
+def api_headers(app, username='owner'):
+    """Заголовок авторизации клиента scvp для пользователя"""
+    with app.app_context():
+        user = User.query.filter_by(username=username).one()
+        token = user.generate_api_token()
+        db.session.commit()
+    return {'Authorization': f'Bearer {token}'}
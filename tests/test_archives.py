@@ -0,0 +1,89 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from server.archives import generate_archive, prune_archive_cache, get_cached_archive
+from server.models import Job
+from server.storage import get_archives_path, write_object
+from server.trees import build_tree
+from tests.conftest import seed_repo, login
+
+FILES = {'README.md': b'# project\n', 'src/main.py': b'print(1)\n' * 1000, 'empty.txt': b''}
+
+
+@pytest.fixture
+def repo_id(app, client):
+    repo_id = seed_repo(app, FILES)
+    login(client, 'owner')
+    return repo_id
+
+
+def test_zip_archive(app, client, repo_id):
+    response = client.get(f'/repo/{repo_id}/archive/1.zip')
+
+    assert response.status_code == 200
+    assert response.headers['Content-Disposition'] == 'attachment; filename="project-v1.zip"'
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        assert {name: archive.read(name) for name in archive.namelist()} == FILES
+
+
+def test_tar_gz_archive(client, repo_id):
+    response = client.get(f'/repo/{repo_id}/archive/1.tar.gz')
+
+    with tarfile.open(fileobj=io.BytesIO(response.data), mode='r:gz') as archive:
+        assert {member.name: archive.extractfile(member).read() for member in archive} == FILES
+
+
+def test_second_download_comes_from_the_cache(app, client, repo_id, monkeypatch):
+    first = client.get(f'/repo/{repo_id}/archive/1.zip').data
+
+    def fail(*args, **kwargs):
+        raise AssertionError('archive generated again')
+
+    monkeypatch.setattr('server.routes.main.generate_archive', fail)
+    response = client.get(f'/repo/{repo_id}/archive/1.zip')
+
+    assert response.data == first
+    assert response.headers['ETag'] == client.get(f'/repo/{repo_id}/archive/1.zip').headers['ETag']
+    with app.app_context():
+        # Проверку размера кэша выполнит фоновая задача
+        assert Job.query.filter_by(kind='prune-archives').count() == 1
+
+
+def test_cache_is_shared_by_versions_with_the_same_tree(app, repo_id):
+    with app.app_context():
+        tree_hash = build_tree({path: (write_object(content), len(content)) for path, content in FILES.items()})
+
+    assert get_cached_archive(tree_hash, 'zip') is None
+    b''.join(generate_archive(tree_hash, 'zip', 0))
+    assert get_cached_archive(tree_hash, 'zip') == os.path.join(get_archives_path(), f'{tree_hash}.zip')
+
+
+def test_interrupted_download_is_not_cached(app, repo_id):
+    with app.app_context():
+        tree_hash = build_tree({'big.bin': (write_object(os.urandom(300000)), 300000)})
+
+    stream = generate_archive(tree_hash, 'tar.gz', 0)
+    next(stream)
+    stream.close()
+
+    assert os.listdir(get_archives_path()) == []
+    assert get_cached_archive(tree_hash, 'tar.gz') is None
+
+
+def test_prune_removes_least_recently_used_archives():
+    archives_path = get_archives_path()
+    for number, name in enumerate(['old.zip', 'recent.zip', 'newest.zip']):
+        path = os.path.join(archives_path, name)
+        with open(path, 'wb') as f:
+            f.write(b'x' * 100)
+        os.utime(path, (1000 + number, 1000 + number))
+    # Недавно запрошенный архив не вытесняется
+    os.utime(os.path.join(archives_path, 'old.zip'))
+
+    prune_archive_cache(250)
+
+    assert sorted(os.listdir(archives_path)) == ['newest.zip', 'old.zip']
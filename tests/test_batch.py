@@ -0,0 +1,147 @@
+import base64
+import io
+import zipfile
+
+import pytest
+
+from server.models import db, Repository, Commit
+from server.storage import write_object
+from server.utils import get_repo_index, read_file_from_repo
+from tests.conftest import seed_repo, api_headers
+
+
+@pytest.fixture
+def repo_id(app):
+    return seed_repo(app, {'old.txt': b'old\n', 'keep.txt': b'keep\n'})
+
+
+@pytest.fixture
+def headers(app, repo_id):
+    return api_headers(app)
+
+
+def head_version(app, repo_id):
+    with app.app_context():
+        return db.session.get(Repository, repo_id).head_version
+
+
+def encode(content):
+    return base64.b64encode(content).decode()
+
+
+def test_json_batch_is_one_commit(app, client, repo_id, headers):
+    with app.app_context():
+        existing = write_object(b'uploaded earlier\n')
+
+    response = client.post(f'/api/repo/{repo_id}/batch', headers=headers, json={
+        'message': 'batch',
+        'files': {
+            'src/a.py': {'content': encode(b'a = 1\n')},
+            'src/b.py': {'content': encode(b'b = 2\n')},
+            'ref.txt': {'hash': existing},
+            'old.txt': None,
+        },
+    })
+
+    assert response.status_code == 200
+    assert response.json['version'] == 2
+    with app.app_context():
+        assert set(get_repo_index(repo_id)) == {'keep.txt', 'ref.txt', 'src/a.py', 'src/b.py'}
+        assert read_file_from_repo(repo_id, 'ref.txt') == b'uploaded earlier\n'
+        assert Commit.query.filter_by(repo_id=repo_id).count() == 2
+
+
+@pytest.mark.parametrize('object_hash', ['../../scvp.db', 'A' * 64, 'ab', 42])
+def test_invalid_hash_is_rejected(app, client, repo_id, headers, object_hash):
+    response = client.post(f'/api/repo/{repo_id}/batch', headers=headers, json={
+        'files': {'new.txt': {'content': encode(b'new')}, 'ref.txt': {'hash': object_hash}},
+    })
+
+    assert response.status_code == 400
+    assert head_version(app, repo_id) == 1
+
+
+def test_unknown_object_is_rejected(app, client, repo_id, headers):
+    response = client.post(f'/api/repo/{repo_id}/batch', headers=headers, json={
+        'files': {'ref.txt': {'hash': '0' * 64}},
+    })
+
+    assert response.status_code == 422
+    assert head_version(app, repo_id) == 1
+
+
+def test_path_outside_repo_is_rejected(app, client, repo_id, headers):
+    response = client.post(f'/api/repo/{repo_id}/batch', headers=headers, json={
+        'files': {'fine.txt': {'content': encode(b'x')}, '../evil.txt': {'content': encode(b'x')}},
+    })
+
+    assert response.status_code == 400
+    assert head_version(app, repo_id) == 1
+
+
+def test_multipart_batch(app, client, repo_id, headers):
+    response = client.post(f'/api/repo/{repo_id}/batch', headers=headers, data={
+        'message': 'two files',
+        'files': [(io.BytesIO(b'one'), 'dir/one.txt'), (io.BytesIO(b'two'), 'dir/two.txt')],
+    })
+
+    assert response.json['files'] == 2
+    with app.app_context():
+        assert read_file_from_repo(repo_id, 'dir/two.txt') == b'two'
+        assert Commit.query.filter_by(repo_id=repo_id, version_number=2).one().message == 'two files'
+
+
+def test_archive_batch_skips_unsafe_members(app, client, repo_id, headers):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr('pkg/__init__.py', '')
+        zf.writestr('pkg/mod.py', 'x = 1\n')
+        zf.writestr('../escape.py', 'evil')
+
+    response = client.post(f'/api/repo/{repo_id}/batch?message=import', headers=headers,
+                           data=archive.getvalue(), content_type='application/zip')
+
+    assert response.json['files'] == 2
+    assert response.json['version'] == 2
+    with app.app_context():
+        assert set(get_repo_index(repo_id)) == {'old.txt', 'keep.txt', 'pkg/__init__.py', 'pkg/mod.py'}
+
+
+def test_empty_batch(client, repo_id, headers):
+    response = client.post(f'/api/repo/{repo_id}/batch', headers=headers, json={'files': {}})
+
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('body', [
+    [1],
+    {'files': ['x']},
+    {'files': {'x': 'abc'}},
+    {'files': {'x': {}}},
+    {'files': {'x': {'content': 42}}},
+    {'files': {'x': {'content': '!!!'}}},
+    {'files': {'x': {'content': 'YWJj'}}, 'message': ['not', 'text']},
+])
+def test_malformed_json_is_rejected(app, client, repo_id, headers, body):
+    response = client.post(f'/api/repo/{repo_id}/batch', headers=headers, json=body)
+
+    assert response.status_code == 400
+    assert head_version(app, repo_id) == 1
+
+
+def test_archive_has_its_own_size_limit(app, client, repo_id, headers):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_STORED) as zf:
+        zf.writestr('big.bin', b'x' * 5000)
+    app.config.update(MAX_CONTENT_LENGTH=1000, BATCH_ARCHIVE_MAX_SIZE=10000)
+
+    response = client.post(f'/api/repo/{repo_id}/batch', headers=headers,
+                           data=archive.getvalue(), content_type='application/zip')
+    assert response.status_code == 200
+    assert read_file_from_repo(repo_id, 'big.bin') == b'x' * 5000
+
+    app.config.update(BATCH_ARCHIVE_MAX_SIZE=4000)
+    response = client.post(f'/api/repo/{repo_id}/batch', headers=headers,
+                           data=archive.getvalue(), content_type='application/zip')
+    assert response.status_code == 413
+    assert head_version(app, repo_id) == 2
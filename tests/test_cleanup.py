@@ -0,0 +1,158 @@
+import os
+import time
+
+import pytest
+from flask_login import login_user
+
+from server.archives import generate_archive, get_cached_archive
+from server.cleanup import reclaim_repo, find_reachable_objects, collect_garbage
+from server.commits import create_commit
+from server.models import db, Job, Repository, Commit, RepoFile
+from server.packs import repack_objects, load_pack_index, get_packs_path
+from server.search import search_files
+from server.storage import write_object, read_object, object_exists, get_objects_tmp_path
+from server.utils import save_file_to_repo, get_repo_storage_path, calculate_file_hash
+from tests.conftest import make_user, make_repo, seed_repo, login, run_jobs
+
+GRACE = 3600
+
+
+def age_storage():
+    """Сделать все файлы хранилища старше GRACE"""
+    old = time.time() - 2 * GRACE
+    for folder, _, names in os.walk('storage'):
+        for name in names:
+            os.utime(os.path.join(folder, name), (old, old))
+
+
+def text_version(number):
+    return ''.join(f'line {i} of version {number if i % 50 == 0 else 1}\n' for i in range(400)).encode()
+
+
+@pytest.fixture
+def owner(ctx):
+    user = make_user('owner')
+    login_user(user)
+    return user
+
+
+def commit_files(repo, files, message='commit'):
+    for path, content in files.items():
+        save_file_to_repo(repo.id, path, content)
+    return create_commit(repo.id, message, list(files))
+
+
+def delete_and_reclaim(repo):
+    repo.deleted_at = db.func.now()
+    db.session.commit()
+    reclaim_repo(repo.id)
+
+
+def test_delete_repo_hides_it_and_cleanup_reclaims(app, client):
+    first = seed_repo(app, {'a.txt': b'unique words here'})
+    second = seed_repo(app, {'b.txt': b'b'})
+    run_jobs(app)
+    login(client, 'owner')
+
+    assert client.get(f'/repo/{first}/delete-repo').status_code == 302
+    assert client.get(f'/repo/{second}/delete-repo').status_code == 302
+    assert client.get(f'/repo/{first}').status_code == 404
+
+    with app.app_context():
+        # Пока очистка ждёт очереди, вторая не добавляется
+        assert Job.query.filter_by(kind='cleanup').count() == 1
+    run_jobs(app)
+
+    with app.app_context():
+        assert search_files('unique', [first]) == []
+        assert Repository.query.count() == 0
+        assert Commit.query.count() == RepoFile.query.count() == 0
+        assert Job.query.count() == 0
+    assert not os.path.exists(get_repo_storage_path(first))
+
+
+def test_old_versions_are_reachable(owner):
+    repo = make_repo(owner)
+    first = commit_files(repo, {'a.txt': b'one', 'dir/b.txt': b'b'})
+    second = commit_files(repo, {'a.txt': b'two'})
+
+    reachable = find_reachable_objects()
+
+    assert {first.tree_hash, second.tree_hash, calculate_file_hash(b'one'), calculate_file_hash(b'two')} <= reachable
+    assert write_object(b'orphan') not in reachable
+
+
+def test_gc_removes_objects_of_deleted_repos(owner):
+    mine = make_repo(owner)
+    commit_files(mine, {'shared.txt': b'shared', 'own.txt': b'only mine'})
+    commit_files(mine, {'own.txt': b'only mine, v2'})
+    theirs = make_repo(owner, name='other')
+    commit_files(theirs, {'shared.txt': b'shared'})
+
+    delete_and_reclaim(mine)
+    age_storage()
+    stats = collect_garbage(GRACE)
+
+    assert stats['objects'] > 2 and stats['bytes'] > 0
+    assert object_exists(calculate_file_hash(b'shared'))
+    assert not object_exists(calculate_file_hash(b'only mine'))
+    assert not object_exists(calculate_file_hash(b'only mine, v2'))
+    assert read_object(db.session.get(Repository, theirs.id).head_tree) is not None
+
+
+def test_grace_period_protects_fresh_objects(owner):
+    orphan = write_object(b'orphan')
+
+    assert collect_garbage(GRACE)['objects'] == 0
+    assert object_exists(orphan)
+
+    age_storage()
+    assert collect_garbage(GRACE)['objects'] == 1
+    assert not object_exists(orphan)
+
+
+def test_gc_keeps_packed_versions_and_removes_dead_packs(owner):
+    repo = make_repo(owner)
+    for number in range(1, 6):
+        commit_files(repo, {'file.txt': text_version(number)}, f'v{number}')
+    assert repack_objects() > 0
+    age_storage()
+
+    assert collect_garbage(GRACE)['packs'] == 0
+    for number in range(1, 6):
+        assert read_object(calculate_file_hash(text_version(number))) == text_version(number)
+
+    delete_and_reclaim(repo)
+    age_storage()
+    stats = collect_garbage(GRACE)
+
+    assert stats['packs'] == 1
+    assert load_pack_index() == {}
+    assert os.listdir(get_packs_path()) == []
+
+
+def test_gc_removes_stale_temporary_files(owner):
+    stale = os.path.join(get_objects_tmp_path(), 'upload.tmp')
+    with open(stale, 'wb') as f:
+        f.write(b'partial')
+
+    assert collect_garbage(GRACE)['tmp'] == 0
+    age_storage()
+    assert collect_garbage(GRACE)['tmp'] == 1
+    assert not os.path.exists(stale)
+
+
+def test_gc_removes_archives_of_deleted_repos(owner):
+    kept = make_repo(owner)
+    kept_tree = commit_files(kept, {'a.txt': b'kept'}).tree_hash
+    gone = make_repo(owner, name='gone')
+    gone_tree = commit_files(gone, {'a.txt': b'gone'}).tree_hash
+    for tree_hash in (kept_tree, gone_tree):
+        b''.join(generate_archive(tree_hash, 'zip', 0))
+
+    delete_and_reclaim(gone)
+    stats = collect_garbage(GRACE)
+
+    assert stats['archives'] == 1
+    assert get_cached_archive(kept_tree, 'zip') is not None
+    assert get_cached_archive(gone_tree, 'zip') is None
@@ -0,0 +1,205 @@
+import re
+import threading
+
+import pytest
+from flask_login import login_user
+
+from server import commits
+from server.commits import create_commit, compute_commit_hash
+from server.models import db, Commit, Repository, User
+from server.trees import build_tree
+from server.utils import save_file_to_repo, get_repo_index, read_file_from_repo
+from tests.conftest import make_user, make_repo, login
+
+
+@pytest.fixture
+def owner(ctx):
+    user = make_user('owner')
+    login_user(user)
+    return user
+
+
+@pytest.fixture
+def repo(owner):
+    return make_repo(owner)
+
+
+def test_commit_records_the_tree_of_the_working_copy(repo):
+    save_file_to_repo(repo.id, 'a.txt', b'a')
+    first = create_commit(repo.id, 'first', ['a.txt'])
+    save_file_to_repo(repo.id, 'dir/b.txt', b'b')
+    second = create_commit(repo.id, 'second', ['dir/b.txt'])
+
+    assert first.tree_hash == build_tree({'a.txt': get_repo_index(repo.id)['a.txt']})
+    assert second.tree_hash == build_tree(get_repo_index(repo.id))
+    assert second.parent_hash == first.commit_hash
+
+
+def make_two_versions(app):
+    with app.test_request_context():
+        user = make_user('owner')
+        login_user(user)
+        repo = make_repo(user)
+        save_file_to_repo(repo.id, 'a.txt', b'one')
+        create_commit(repo.id, 'v1', ['a.txt'])
+        save_file_to_repo(repo.id, 'a.txt', b'two')
+        save_file_to_repo(repo.id, 'b.txt', b'new')
+        create_commit(repo.id, 'v2', ['a.txt', 'b.txt'])
+        return repo.id
+
+
+def test_restore_version(app, client):
+    repo_id = make_two_versions(app)
+    login(client, 'owner')
+
+    assert f'action="/repo/{repo_id}/restore/1"' in client.get(f'/repo/{repo_id}').get_data(as_text=True)
+    response = client.post(f'/repo/{repo_id}/restore/1')
+
+    assert response.status_code == 302
+    with app.app_context():
+        repo = db.session.get(Repository, repo_id)
+        head = Commit.query.filter_by(repo_id=repo_id, version_number=3).one()
+        v1 = Commit.query.filter_by(repo_id=repo_id, version_number=1).one()
+
+        assert head.tree_hash == v1.tree_hash == repo.head_tree
+        assert read_file_from_repo(repo_id, 'a.txt') == b'one'
+        assert read_file_from_repo(repo_id, 'b.txt') is None
+        assert set(get_repo_index(repo_id)) == {'a.txt'}
+
+
+def test_restore_needs_a_form_with_csrf_token(app, client):
+    repo_id = make_two_versions(app)
+    login(client, 'owner')
+    app.config['WTF_CSRF_ENABLED'] = True
+
+    # Ссылка или картинка на чужой странице версию не восстановит
+    assert client.get(f'/repo/{repo_id}/restore/1').status_code == 405
+    assert client.post(f'/repo/{repo_id}/restore/1').status_code == 400
+
+    with app.app_context():
+        assert db.session.get(Repository, repo_id).head_version == 2
+    assert read_file_from_repo(repo_id, 'a.txt') == b'two'
+
+    # Форма на странице репозитория содержит токен
+    page = client.get(f'/repo/{repo_id}').get_data(as_text=True)
+    token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page).group(1)
+    assert client.post(f'/repo/{repo_id}/restore/1', data={'csrf_token': token}).status_code == 302
+    assert read_file_from_repo(repo_id, 'a.txt') == b'one'
+
+
+def test_failed_restore_keeps_the_working_copy(repo, monkeypatch):
+    save_file_to_repo(repo.id, 'a.txt', b'one')
+    v1 = create_commit(repo.id, 'v1', ['a.txt'])
+    save_file_to_repo(repo.id, 'a.txt', b'two')
+    save_file_to_repo(repo.id, 'b.txt', b'new')
+    create_commit(repo.id, 'v2', ['a.txt', 'b.txt'])
+    index = get_repo_index(repo.id)
+
+    def fail(*args):
+        raise RuntimeError('database went away')
+
+    monkeypatch.setattr(commits, '_record_commit', fail)
+    with pytest.raises(RuntimeError):
+        commits.commit_tree(repo.id, 'restore', v1.tree_hash)
+
+    assert read_file_from_repo(repo.id, 'a.txt') == b'two'
+    assert read_file_from_repo(repo.id, 'b.txt') == b'new'
+    assert get_repo_index(repo.id) == index
+    assert db.session.get(Repository, repo.id).head_version == 2
+
+
+def test_versions_are_numbered_in_order(repo):
+    numbers = []
+    for number in range(1, 6):
+        save_file_to_repo(repo.id, 'a.txt', str(number).encode())
+        numbers.append(create_commit(repo.id, f'v{number}', ['a.txt']).version_number)
+
+    assert numbers == [1, 2, 3, 4, 5]
+    assert db.session.get(Repository, repo.id).head_version == 5
+
+
+def test_concurrent_commits_get_distinct_versions(app):
+    with app.test_request_context():
+        user = make_user('owner')
+        repo_id = make_repo(user).id
+        user_id = user.id
+
+    errors = []
+
+    def writer(number):
+        try:
+            with app.test_request_context():
+                login_user(db.session.get(User, user_id))
+                for step in range(3):
+                    path = f'writer{number}/file{step}.txt'
+                    save_file_to_repo(repo_id, path, path.encode())
+                    create_commit(repo_id, path, [path])
+                db.session.remove()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(number,)) for number in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with app.app_context():
+        history = Commit.query.filter_by(repo_id=repo_id).order_by(Commit.version_number).all()
+        repo = db.session.get(Repository, repo_id)
+
+        assert [commit.version_number for commit in history] == list(range(1, 19))
+        # История линейная: каждый коммит построен поверх предыдущего
+        assert [commit.parent_hash for commit in history[1:]] == [commit.commit_hash for commit in history[:-1]]
+        assert repo.head_version == 18
+        assert repo.file_count == 18
+
+
+def test_commit_hash_is_derived_from_content(repo, owner):
+    save_file_to_repo(repo.id, 'a.txt', b'a')
+    first = create_commit(repo.id, 'first', ['a.txt'])
+    save_file_to_repo(repo.id, 'a.txt', b'b')
+    second = create_commit(repo.id, 'second', ['a.txt'])
+
+    assert first.commit_hash == compute_commit_hash(first.tree_hash, None, owner.id, 'first')
+    assert second.commit_hash == compute_commit_hash(second.tree_hash, first.commit_hash, owner.id, 'second')
+
+
+def test_commit_hash_depends_on_every_field():
+    base = compute_commit_hash('a' * 64, 'b' * 64, 1, 'message')
+
+    assert base == compute_commit_hash('a' * 64, 'b' * 64, 1, 'message')
+    assert len({
+        base,
+        compute_commit_hash('c' * 64, 'b' * 64, 1, 'message'),
+        compute_commit_hash('a' * 64, None, 1, 'message'),
+        compute_commit_hash('a' * 64, 'b' * 64, 2, 'message'),
+        compute_commit_hash('a' * 64, 'b' * 64, 1, 'other message'),
+    }) == 5
+
+
+def test_same_content_in_two_repositories_has_the_same_hash(owner):
+    hashes = []
+    for name in ('one', 'two'):
+        repo = make_repo(owner, name)
+        save_file_to_repo(repo.id, 'a.txt', b'a')
+        hashes.append(create_commit(repo.id, 'Initial commit', ['a.txt']).commit_hash)
+
+    assert hashes[0] == hashes[1]
+
+
+def test_commit_without_changes_returns_the_head(repo):
+    save_file_to_repo(repo.id, 'a.txt', b'a')
+    head = create_commit(repo.id, 'first', ['a.txt'])
+
+    save_file_to_repo(repo.id, 'a.txt', b'a')
+    again = create_commit(repo.id, 'nothing changed', ['a.txt'])
+
+    assert again.id == head.id
+    assert Commit.query.filter_by(repo_id=repo.id).count() == 1
+    assert db.session.get(Repository, repo.id).head_version == 1
+
+    # Пустой коммит не занимает номер версии
+    save_file_to_repo(repo.id, 'a.txt', b'b')
+    assert create_commit(repo.id, 'second', ['a.txt']).version_number == 2
@@ -0,0 +1,81 @@
+from flask import Flask
+from flask_migrate import upgrade
+
+from server import db
+from server.commands import detect_schema_revision, upgrade_database
+from server.database import configure_database
+from server.models import User, Repository
+
+HEAD_REVISION = 'd45a8f3c9e27'
+BASELINE_REVISION = '3f1c2a9b7d10'
+
+
+def configured(uri, **options):
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=uri,
+        SQLALCHEMY_ENGINE_OPTIONS={'pool_size': 10, 'max_overflow': 20, 'pool_timeout': 30, **options},
+        SQLITE_BUSY_TIMEOUT=30
+    )
+    configure_database(app)
+    return app.config['SQLALCHEMY_DATABASE_URI'], app.config['SQLALCHEMY_ENGINE_OPTIONS']
+
+
+def test_postgres_url_uses_psycopg2():
+    uri, options = configured('postgres://scvp:p%40ss@db:5432/scvp')
+
+    assert uri == 'postgresql+psycopg2://scvp:p%40ss@db:5432/scvp'
+    assert options['pool_size'] == 10 and 'connect_args' not in options
+
+    assert configured('postgresql+psycopg://db/scvp')[0] == 'postgresql+psycopg://db/scvp'
+
+
+def test_sqlite_options():
+    uri, options = configured('sqlite:///scvp.db')
+    assert uri == 'sqlite:///scvp.db'
+    assert options['connect_args'] == {'timeout': 30}
+    assert options['pool_size'] == 10
+
+    # Пул SQLite в памяти не принимает параметров QueuePool
+    _, options = configured('sqlite://', connect_args={'timeout': 5})
+    assert options == {'connect_args': {'timeout': 5}}
+
+
+def test_sqlite_uses_wal(app):
+    with app.app_context():
+        assert db.session.execute(db.text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert db.session.execute(db.text('PRAGMA synchronous')).scalar() == 1
+
+
+def test_detect_revision_of_create_all_database(app, empty_app):
+    with app.app_context():
+        assert detect_schema_revision(db.inspect(db.engine)) == HEAD_REVISION
+    with empty_app.app_context():
+        assert detect_schema_revision(db.inspect(db.engine)) is None
+
+
+def test_upgrade_create_all_database(app):
+    with app.app_context():
+        db.session.add(User(username='alice', password_hash='x'))
+        db.session.commit()
+
+        upgrade_database(app)
+
+        assert db.session.execute(db.text('SELECT version_num FROM alembic_version')).scalar() == HEAD_REVISION
+        assert User.query.filter_by(username='alice').count() == 1
+
+
+def test_upgrade_original_schema(empty_app):
+    with empty_app.app_context():
+        upgrade(revision=BASELINE_REVISION)
+        db.session.execute(db.text("INSERT INTO users (id, username, password_hash) VALUES (1, 'alice', 'x')"))
+        db.session.execute(db.text("INSERT INTO repositories (id, name, user_id, is_public) VALUES (1, 'project', 1, 0)"))
+        db.session.execute(db.text('DROP TABLE alembic_version'))
+        db.session.commit()
+
+        assert detect_schema_revision(db.inspect(db.engine)) == BASELINE_REVISION
+        upgrade_database(empty_app)
+
+        assert db.session.execute(db.text('SELECT version_num FROM alembic_version')).scalar() == HEAD_REVISION
+        repo = db.session.get(Repository, 1)
+        assert (repo.name, repo.owner.username, repo.head_version, repo.commit_count) == ('project', 'alice', 0, 0)
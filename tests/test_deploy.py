@@ -0,0 +1,64 @@
+import os
+import runpy
+import importlib
+
+from server import db
+from server.config import TestingConfig
+from server.models import User
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAD_REVISION = 'd45a8f3c9e27'
+
+
+def table_names(app):
+    with app.app_context():
+        return set(db.inspect(db.engine).get_table_names())
+
+
+def test_init_db_creates_schema_and_storage(empty_app):
+    result = empty_app.test_cli_runner().invoke(args=['init-db'])
+
+    assert result.exit_code == 0, result.output
+    assert 'пользователей: 0' in result.output
+    assert os.path.isdir('storage')
+    assert {'users', 'repositories', 'commits', 'jobs', 'collaborators', 'alembic_version'} <= table_names(empty_app)
+    with empty_app.app_context():
+        assert db.session.execute(db.text('SELECT version_num FROM alembic_version')).scalar() == HEAD_REVISION
+
+
+def test_init_db_is_repeatable(empty_app):
+    runner = empty_app.test_cli_runner()
+    runner.invoke(args=['init-db'])
+    with empty_app.app_context():
+        db.session.add(User(username='alice', password_hash='x'))
+        db.session.commit()
+
+    result = runner.invoke(args=['init-db'])
+
+    assert result.exit_code == 0, result.output
+    assert 'пользователей: 1' in result.output
+
+
+def test_wsgi_creates_app_from_environment(monkeypatch, tmp_path):
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'wsgi.db'}")
+    monkeypatch.setenv('SCVP_CONFIG', 'testing')
+    monkeypatch.syspath_prepend(ROOT)
+
+    wsgi = importlib.reload(importlib.import_module('wsgi'))
+
+    assert wsgi.app.config['TESTING']
+    # Таблицы создаёт init-db, а не запуск приложения
+    assert table_names(wsgi.app) == set()
+
+
+def test_gunicorn_config(monkeypatch):
+    monkeypatch.setenv('SCVP_WORKERS', '3')
+    monkeypatch.setenv('SCVP_THREADS', '8')
+    monkeypatch.setenv('SCVP_BIND', '127.0.0.1:9000')
+
+    settings = runpy.run_path(os.path.join(ROOT, 'gunicorn.conf.py'))
+
+    assert (settings['workers'], settings['threads'], settings['bind']) == (3, 8, '127.0.0.1:9000')
+    assert settings['worker_class'] == 'gthread'
+    assert settings['preload_app'] is False
+    assert settings['graceful_timeout'] >= settings['timeout']
@@ -0,0 +1,140 @@
+import pytest
+from flask_login import login_user
+
+from server import diffs
+from server.cache import WeightedCache
+from server.commits import create_commit
+from server.diffs import diff_blobs, diff_versions
+from server.models import User
+from server.storage import write_object
+from server.trees import build_tree
+from server.utils import save_file_to_repo
+from tests.conftest import seed_repo, login, api_headers
+
+OLD = ''.join(f'line {i}\n' for i in range(1, 21)).encode()
+NEW = OLD.replace(b'line 5\n', b'line five\n').replace(b'line 18\n', b'')
+
+
+@pytest.fixture(autouse=True)
+def diff_cache(monkeypatch):
+    cache = WeightedCache(diffs.DIFF_CACHE_MAX_WEIGHT)
+    monkeypatch.setattr(diffs, '_diff_cache', cache)
+    return cache
+
+
+def test_text_diff():
+    result = diff_blobs(write_object(OLD), write_object(NEW))
+
+    assert (result['kind'], result['added'], result['removed']) == ('text', 1, 2)
+    first, second = result['hunks']
+    assert (first['old_start'], first['old_count'], first['new_start'], first['new_count']) == (2, 7, 2, 7)
+    assert first['lines'][3:5] == [['-', 'line 5'], ['+', 'line five']]
+    assert ['-', 'line 18'] in second['lines']
+
+
+def test_added_and_removed_files():
+    content_hash = write_object(b'a\nb\n')
+
+    assert diff_blobs(None, content_hash)['added'] == 2
+    assert diff_blobs(content_hash, None)['removed'] == 2
+
+
+def test_binary_and_large_files(monkeypatch):
+    assert diff_blobs(write_object(b'\0\1\2'), write_object(b'\0\1\3'))['kind'] == 'binary'
+    assert diff_blobs(write_object(b'\xff\xfe'), write_object(b'text'))['kind'] == 'binary'
+
+    monkeypatch.setattr(diffs, 'DIFF_MAX_FILE_SIZE', 10)
+    assert diff_blobs(write_object(OLD), write_object(NEW + b'!'))['kind'] == 'too_large'
+
+
+def test_diff_is_cached(monkeypatch):
+    old_hash, new_hash = write_object(OLD), write_object(NEW)
+    first = diff_blobs(old_hash, new_hash)
+
+    def fail(*args):
+        raise AssertionError('object read again')
+
+    monkeypatch.setattr(diffs, 'read_object', fail)
+    assert diff_blobs(old_hash, new_hash) is first
+
+
+def test_diff_cache_evicts_least_recently_used(monkeypatch, diff_cache):
+    diff_cache.max_weight = 3000
+    pairs = [(write_object(OLD), write_object(NEW.replace(b'five', str(i).encode()))) for i in range(10)]
+
+    for pair in pairs:
+        diff_blobs(*pair)
+        diff_blobs(*pairs[0])  # Часто запрашиваемое сравнение остаётся в кэше
+
+    assert diff_cache.weight <= 3000
+    assert diff_cache.get(pairs[0] + (diffs.DIFF_CONTEXT_LINES,)) is not None
+    assert diff_cache.get(pairs[1] + (diffs.DIFF_CONTEXT_LINES,)) is None
+    assert diff_cache.weight == sum(weight for _, weight in diff_cache.entries.values())
+
+
+def test_weighted_cache():
+    cache = WeightedCache(10)
+    cache.put('a', 1, 4)
+    cache.put('b', 2, 4)
+    cache.get('a')
+    cache.put('c', 3, 4)
+    cache.put('huge', 4, 11)
+
+    assert (cache.get('a'), cache.get('b'), cache.get('c'), cache.get('huge')) == (1, None, 3, None)
+    assert cache.weight == 8
+
+
+def test_diff_versions(app):
+    def blob(content):
+        return write_object(content), len(content)
+
+    old = build_tree({'keep.txt': blob(b'keep'), 'src/a.py': blob(b'a'), 'src/gone.py': blob(b'gone')})
+    new = build_tree({'keep.txt': blob(b'keep'), 'src/a.py': blob(b'a2'), 'src/new.py': blob(b'new'),
+                      'docs/x.md': blob(b'x')})
+
+    changes = {change['path']: change['status'] for change in diff_versions(old, new)}
+    assert changes == {'docs/x.md': 'added', 'src/a.py': 'modified', 'src/gone.py': 'removed',
+                       'src/new.py': 'added'}
+    assert [change['path'] for change in diff_versions(old, new, path_prefix='src')] == [
+        'src/a.py', 'src/gone.py', 'src/new.py'
+    ]
+
+
+@pytest.fixture
+def repo_id(app):
+    repo_id = seed_repo(app, {'a.txt': OLD, 'b.txt': b'b\n'})
+    with app.test_request_context():
+        login_user(User.query.filter_by(username='owner').one())
+        save_file_to_repo(repo_id, 'a.txt', NEW)
+        save_file_to_repo(repo_id, 'c.txt', b'c\n')
+        create_commit(repo_id, 'v2', ['a.txt', 'c.txt'])
+    return repo_id
+
+
+def test_diff_api(app, client, repo_id):
+    response = client.get(f'/api/repo/{repo_id}/diff?from=1&to=2', headers=api_headers(app))
+
+    files = {change['path']: change for change in response.json['files']}
+    assert set(files) == {'a.txt', 'c.txt'}
+    assert files['a.txt']['diff']['added'] == 1
+    assert files['c.txt']['status'] == 'added'
+
+
+def test_diff_api_skips_lines_for_many_files(app, client, repo_id):
+    app.config['DIFF_MAX_FILES'] = 1
+
+    everything = client.get(f'/api/repo/{repo_id}/diff?from=1&to=2', headers=api_headers(app)).json
+    one_file = client.get(f'/api/repo/{repo_id}/diff?from=1&to=2&path=a.txt', headers=api_headers(app)).json
+
+    assert all('diff' not in change for change in everything['files'])
+    assert one_file['files'][0]['diff']['removed'] == 2
+
+
+def test_diff_page(client, repo_id):
+    login(client, 'owner')
+
+    response = client.get(f'/repo/{repo_id}/diff?from=0&to=2')
+
+    assert response.status_code == 200
+    assert 'line five' in response.get_data(as_text=True)
+    assert client.get(f'/repo/{repo_id}/diff?from=1&to=9').status_code == 404
@@ -0,0 +1,71 @@
+import hashlib
+
+import pytest
+
+from tests.conftest import seed_repo, login
+
+CONTENT = bytes(range(256)) * 64
+
+
+@pytest.fixture
+def repo_id(app, client):
+    repo_id = seed_repo(app, {'data/blob.bin': CONTENT})
+    login(client, 'owner')
+    return repo_id
+
+
+def test_download_whole_file(client, repo_id):
+    response = client.get(f'/repo/{repo_id}/download/data/blob.bin')
+
+    assert response.status_code == 200
+    assert response.data == CONTENT
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['Content-Disposition'] == 'attachment; filename=blob.bin'
+    assert response.headers['ETag'] == f'"{hashlib.sha256(CONTENT).hexdigest()}"'
+
+
+def test_download_range(client, repo_id):
+    response = client.get(f'/repo/{repo_id}/download/data/blob.bin', headers={'Range': 'bytes=1000-1999'})
+
+    assert response.status_code == 206
+    assert response.data == CONTENT[1000:2000]
+    assert response.headers['Content-Range'] == f'bytes 1000-1999/{len(CONTENT)}'
+
+
+def test_download_suffix_range(client, repo_id):
+    response = client.get(f'/repo/{repo_id}/download/data/blob.bin', headers={'Range': 'bytes=-10'})
+
+    assert response.status_code == 206
+    assert response.data == CONTENT[-10:]
+
+
+def test_unsatisfiable_range(client, repo_id):
+    response = client.get(f'/repo/{repo_id}/download/data/blob.bin',
+                          headers={'Range': f'bytes={len(CONTENT)}-'})
+
+    assert response.status_code == 416
+
+
+def test_etag_revalidation(client, repo_id):
+    etag = client.get(f'/repo/{repo_id}/download/data/blob.bin').headers['ETag']
+
+    response = client.get(f'/repo/{repo_id}/download/data/blob.bin', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+def test_x_sendfile(app, client, repo_id):
+    app.config['USE_X_SENDFILE'] = True
+
+    response = client.get(f'/repo/{repo_id}/download/data/blob.bin')
+
+    assert response.headers['X-Sendfile'].endswith('blob.bin')
+    assert response.data == b''
+
+
+def test_download_outside_repo(client, repo_id):
+    response = client.get(f'/repo/{repo_id}/download/..%2F..%2Fscvp.db')
+
+    assert response.status_code == 302
+    assert b'SQLite' not in response.data
@@ -0,0 +1,92 @@
+import io
+import os
+
+import pytest
+from flask_login import login_user
+
+from server.models import db, RepoFile, Repository
+from server.utils import save_file_to_repo, read_file_from_repo
+from server.commits import create_commit
+from server.storage import get_object_path
+from tests.conftest import make_user, make_repo, login
+
+
+@pytest.fixture
+def repo_id(app, client):
+    with app.test_request_context():
+        owner = make_user('owner')
+        login_user(owner)
+        repo = make_repo(owner)
+        save_file_to_repo(repo.id, 'docs/readme.txt', b'hello\n')
+        create_commit(repo.id, 'Initial commit', ['docs/readme.txt'])
+        repo_id = repo.id
+    login(client, 'owner')
+    return repo_id
+
+
+def test_saved_file_is_a_link_to_its_object(app, repo_id):
+    with app.app_context():
+        repo_file = RepoFile.query.filter_by(repo_id=repo_id, filepath='docs/readme.txt').one()
+
+        assert read_file_from_repo(repo_id, 'docs/readme.txt') == b'hello\n'
+        assert os.path.samefile(
+            os.path.join('storage', 'repos', str(repo_id), 'docs', 'readme.txt'),
+            get_object_path(repo_file.content_hash)
+        )
+
+
+def test_upload_file(app, client, repo_id):
+    response = client.post(f'/repo/{repo_id}/upload', data={
+        'file': (io.BytesIO(b'print(1)\n'), 'main.py'),
+        'filepath': 'src',
+    })
+
+    assert response.status_code == 302
+    with app.app_context():
+        assert read_file_from_repo(repo_id, 'src/main.py') == b'print(1)\n'
+        assert db.session.get(Repository, repo_id).head_version == 2
+
+
+@pytest.mark.parametrize('filepath', ['..', '../..', '/tmp/..', 'docs/../../..'])
+def test_upload_outside_repo_is_rejected(app, client, repo_id, filepath):
+    response = client.post(f'/repo/{repo_id}/upload', data={
+        'file': (io.BytesIO(b'x'), 'evil.txt'),
+        'filepath': filepath,
+    })
+
+    assert response.status_code == 400
+    assert not os.path.exists(os.path.join('storage', 'evil.txt'))
+    assert not os.path.exists(os.path.join('storage', 'repos', 'evil.txt'))
+
+
+@pytest.mark.parametrize('folder_path, folder_name', [('', '..'), ('..', 'escape'), ('docs', '../../escape')])
+def test_create_folder_outside_repo_is_rejected(client, repo_id, folder_path, folder_name):
+    response = client.post(f'/repo/{repo_id}/create-folder', data={
+        'folder_path': folder_path,
+        'folder_name': folder_name,
+    })
+
+    assert response.status_code == 400
+    assert not os.path.exists(os.path.join('storage', 'repos', 'escape'))
+    assert not os.path.exists(os.path.join('storage', 'escape'))
+
+
+def test_delete_outside_repo_is_rejected(client, repo_id):
+    other = os.path.join('storage', 'repos', str(repo_id + 1))
+    os.makedirs(other)
+
+    response = client.get(f'/repo/{repo_id}/delete/..%2F{repo_id + 1}')
+
+    assert response.status_code == 400
+    assert os.path.isdir(other)
+
+
+def test_edit_outside_repo_is_rejected(client, repo_id):
+    with open(os.path.join('storage', 'secret.txt'), 'w') as f:
+        f.write('secret')
+
+    response = client.post(f'/repo/{repo_id}/edit-file/..%2F..%2Fsecret.txt', data={'content': 'x'})
+
+    assert response.status_code == 400
+    with open(os.path.join('storage', 'secret.txt')) as f:
+        assert f.read() == 'secret'
@@ -0,0 +1,73 @@
+import pytest
+from flask_login import login_user
+
+from server.commits import create_commit
+from server.models import db
+from server.utils import save_file_to_repo, get_commit_history
+from tests.conftest import make_user, make_repo, api_headers
+
+
+def make_history(repo_id, count):
+    for number in range(1, count + 1):
+        save_file_to_repo(repo_id, 'file.txt', f'version {number}\n'.encode())
+        create_commit(repo_id, f'v{number}', ['file.txt'])
+
+
+@pytest.fixture
+def repo_id(app):
+    with app.test_request_context():
+        user = make_user('owner')
+        login_user(user)
+        repo = make_repo(user)
+        make_history(repo.id, 12)
+        return repo.id
+
+
+def test_history_pages(app, repo_id):
+    with app.app_context():
+        pages = []
+        before = None
+        while True:
+            commits, before = get_commit_history(repo_id, before, 5)
+            pages.append([commit.version_number for commit in commits])
+            if before is None:
+                break
+
+    assert pages == [[12, 11, 10, 9, 8], [7, 6, 5, 4, 3], [2, 1]]
+
+
+def test_history_page_of_exact_size_is_last(app, repo_id):
+    with app.app_context():
+        commits, before = get_commit_history(repo_id, 5, 4)
+
+    assert [commit.version_number for commit in commits] == [4, 3, 2, 1]
+    assert before is None
+
+
+def test_history_api(app, client, repo_id):
+    headers = api_headers(app)
+
+    first = client.get(f'/api/repo/{repo_id}/commits?limit=5', headers=headers).json
+    second = client.get(f"/api/repo/{repo_id}/commits?limit=5&before={first['next_before']}", headers=headers).json
+
+    assert [commit['version'] for commit in first['commits']] == [12, 11, 10, 9, 8]
+    assert [commit['version'] for commit in second['commits']] == [7, 6, 5, 4, 3]
+    assert first['commits'][1]['commit'] == first['commits'][0]['parent']
+    assert first['commits'][0]['message'] == 'v12'
+
+
+def test_history_api_limits_page_size(app, client, repo_id):
+    headers = api_headers(app)
+
+    assert len(client.get(f'/api/repo/{repo_id}/commits?limit=0', headers=headers).json['commits']) == 1
+    assert len(client.get(f'/api/repo/{repo_id}/commits?limit=100000', headers=headers).json['commits']) == 12
+
+
+def test_history_is_indexed(app):
+    with app.app_context():
+        inspector = db.inspect(db.engine)
+        indexes = {tuple(index['column_names']) for index in inspector.get_indexes('commits')}
+        unique = {tuple(constraint['column_names']) for constraint in inspector.get_unique_constraints('commits')}
+
+    assert ('repo_id', 'created_at') in indexes
+    assert ('repo_id', 'version_number') in unique
@@ -0,0 +1,259 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from server import jobs
+from server.jobs import enqueue_job, run_next_job
+from server.models import db, Job
+from tests.conftest import run_jobs
+
+
+@pytest.fixture
+def handlers(monkeypatch):
+    """Зарегистрировать обработчик на время теста: handlers('вид', функция)"""
+    def register(kind, func, serial=False):
+        monkeypatch.setitem(jobs._handlers, kind, func)
+        if serial:
+            monkeypatch.setattr(jobs, '_serial_kinds', jobs._serial_kinds | {kind})
+
+    return register
+
+
+def add_job(app, kind, payload=None, key=None):
+    with app.app_context():
+        job = enqueue_job(kind, payload, key=key)
+        db.session.commit()
+        return job.id
+
+
+def get_job(app, job_id):
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        if job is not None:
+            db.session.expunge(job)
+        return job
+
+
+def make_ready(app, job_id):
+    with app.app_context():
+        db.session.get(Job, job_id).run_after = datetime.utcnow()
+        db.session.commit()
+
+
+def test_job_is_saved_with_the_transaction(app, handlers):
+    calls = []
+    handlers('test-job', calls.append)
+
+    with app.app_context():
+        enqueue_job('test-job', {'n': 1})
+        db.session.rollback()
+        enqueue_job('test-job', {'n': 2})
+        db.session.commit()
+
+    assert run_jobs(app) == 1
+    assert calls == [{'n': 2}]
+    with app.app_context():
+        # Выполненные задачи удаляются
+        assert Job.query.count() == 0
+
+
+def test_failed_job_is_retried_with_backoff(app, handlers):
+    app.config.update(JOB_MAX_ATTEMPTS=3, JOB_RETRY_DELAY=10)
+    attempts = []
+
+    def flaky(payload):
+        attempts.append(len(attempts) + 1)
+        if len(attempts) < 3:
+            raise ValueError('not yet')
+
+    handlers('test-flaky', flaky)
+    job_id = add_job(app, 'test-flaky')
+
+    assert run_next_job(app)
+    job = get_job(app, job_id)
+    assert (job.status, job.attempts) == ('pending', 1)
+    assert 'ValueError: not yet' in job.last_error
+    assert timedelta(seconds=9) < job.run_after - datetime.utcnow() <= timedelta(seconds=10)
+
+    # Пауза ещё не прошла
+    assert not run_next_job(app)
+
+    make_ready(app, job_id)
+    assert run_next_job(app)
+    job = get_job(app, job_id)
+    assert timedelta(seconds=19) < job.run_after - datetime.utcnow() <= timedelta(seconds=20)
+
+    make_ready(app, job_id)
+    assert run_next_job(app)
+    assert attempts == [1, 2, 3]
+    assert get_job(app, job_id) is None
+
+
+def test_job_fails_after_max_attempts(app, handlers):
+    app.config.update(JOB_MAX_ATTEMPTS=2)
+
+    def broken(payload):
+        raise RuntimeError('broken')
+
+    handlers('test-broken', broken)
+    job_id = add_job(app, 'test-broken')
+
+    run_next_job(app)
+    make_ready(app, job_id)
+    run_next_job(app)
+
+    job = get_job(app, job_id)
+    assert (job.status, job.attempts, job.locked_at) == ('failed', 2, None)
+    assert 'RuntimeError: broken' in job.last_error
+    assert not run_next_job(app)
+
+    result = app.test_cli_runner().invoke(args=['jobs', 'retry'])
+    assert 'Возвращено в очередь: 1' in result.output
+    assert get_job(app, job_id).status == 'pending'
+
+
+def test_unknown_kind_fails(app):
+    app.config.update(JOB_MAX_ATTEMPTS=1)
+    job_id = add_job(app, 'test-unknown')
+
+    assert run_next_job(app)
+    assert 'Неизвестный вид задачи' in get_job(app, job_id).last_error
+
+
+def test_abandoned_job_is_requeued(app, handlers):
+    calls = []
+    handlers('test-job', calls.append)
+    stale = add_job(app, 'test-job', {'job': 'stale'})
+    alive = add_job(app, 'test-job', {'job': 'alive'})
+    with app.app_context():
+        now = datetime.utcnow()
+        db.session.get(Job, stale).status = 'running'
+        db.session.get(Job, stale).locked_at = now - timedelta(seconds=app.config['JOB_TIMEOUT'] + 1)
+        db.session.get(Job, alive).status = 'running'
+        db.session.get(Job, alive).locked_at = now - timedelta(seconds=app.config['JOB_TIMEOUT'] - 60)
+        db.session.commit()
+
+    assert run_jobs(app) == 1
+    assert calls == [{'job': 'stale'}]
+    assert get_job(app, alive).status == 'running'
+
+
+@pytest.fixture
+def statements(app):
+    """SQL-запросы, выполненные приложением во время теста"""
+    executed = []
+
+    def record(conn, cursor, statement, *args):
+        executed.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', record)
+
+
+def test_abandoned_jobs_are_looked_for_once_per_interval(app, handlers, statements):
+    handlers('test-job', lambda payload: None)
+    app.config.update(JOB_HEARTBEAT_INTERVAL=3600)
+
+    assert not run_next_job(app)
+    assert not run_next_job(app)
+    # Очередь пуста и брошенных задач нет - опрос ничего не пишет в базу
+    assert not [statement for statement in statements if not statement.startswith('SELECT')]
+
+    job_id = add_job(app, 'test-job')
+    with app.app_context():
+        db.session.get(Job, job_id).status = 'running'
+        db.session.get(Job, job_id).locked_at = datetime.utcnow() - timedelta(days=1)
+        db.session.commit()
+
+    assert not run_next_job(app)
+    app.extensions['jobs_requeue_check'] = 0
+    assert run_next_job(app)
+
+
+def test_heartbeat_keeps_long_job_claimed(app, handlers):
+    app.config.update(JOB_HEARTBEAT_INTERVAL=0.05)
+    seen = []
+
+    def slow(payload):
+        started = datetime.utcnow()
+        time.sleep(0.3)
+        db.session.expire_all()
+        seen.append(db.session.get(Job, job_id).locked_at - started)
+
+    handlers('test-slow', slow)
+    job_id = add_job(app, 'test-slow')
+
+    assert run_next_job(app)
+    # Отметка обновлялась, пока обработчик работал
+    assert seen[0] > timedelta(seconds=0.1)
+
+
+def test_serial_jobs_run_one_at_a_time_in_order(app, handlers):
+    calls = []
+    handlers('test-serial', lambda payload: calls.append(payload['n']), serial=True)
+    handlers('test-job', lambda payload: calls.append('other'))
+    first = add_job(app, 'test-serial', {'n': 1})
+    add_job(app, 'test-serial', {'n': 2})
+    add_job(app, 'test-job')
+
+    with app.app_context():
+        # Первая задача ещё выполняется в другом исполнителе
+        db.session.get(Job, first).status = 'running'
+        db.session.get(Job, first).locked_at = datetime.utcnow()
+        db.session.commit()
+
+    assert run_jobs(app) == 1
+    assert calls == ['other']
+
+    with app.app_context():
+        db.session.get(Job, first).status = 'pending'
+        db.session.commit()
+
+    assert run_jobs(app) == 2
+    assert calls == ['other', 1, 2]
+
+
+def test_serial_job_is_not_claimed_while_another_worker_claims_the_previous(app, handlers):
+    calls = []
+    handlers('test-serial', lambda payload: calls.append(payload['n']), serial=True)
+    first = add_job(app, 'test-serial', {'n': 1})
+    add_job(app, 'test-serial', {'n': 2})
+    with app.app_context():
+        engine = db.engine
+
+    claimed = []
+
+    def other_worker_claims_first(conn, cursor, statement, *args):
+        # Другой исполнитель берёт первую задачу, пока этот ищет готовые
+        if not claimed and statement.startswith('SELECT') and 'ORDER BY jobs.id' in statement:
+            claimed.append(first)
+            with engine.begin() as other:
+                other.execute(db.update(Job).where(Job.id == first).values(status='running', locked_at=datetime.utcnow()))
+
+    event.listen(engine, 'before_cursor_execute', other_worker_claims_first)
+    try:
+        assert not run_next_job(app)
+    finally:
+        event.remove(engine, 'before_cursor_execute', other_worker_claims_first)
+    assert claimed and calls == []
+
+
+def test_jobs_with_the_same_key_are_merged(app, handlers):
+    calls = []
+    handlers('test-job', calls.append)
+
+    with app.app_context():
+        enqueue_job('test-job', key='once')
+        enqueue_job('test-job', key='once')
+        db.session.commit()
+        enqueue_job('test-job', key='once')
+        db.session.commit()
+        assert Job.query.count() == 1
+
+    assert run_jobs(app) == 1
+    assert len(calls) == 1
@@ -0,0 +1,82 @@
+import os
+
+import pytest
+from flask_login import login_user
+
+from server.models import db
+from server.utils import (
+    save_file_to_repo, delete_file_from_repo, list_repo_files, scan_repo_directory, index_repo_directory,
+    record_repo_directory
+)
+from tests.conftest import make_user, make_repo, seed_repo, login
+
+
+@pytest.fixture
+def repo(ctx):
+    user = make_user('owner')
+    login_user(user)
+    repo = make_repo(user)
+    for path in ('b.txt', 'a/one.txt', 'a/deep/two.txt', 'c/three.txt'):
+        save_file_to_repo(repo.id, path, path.encode())
+    db.session.commit()
+    return repo
+
+
+def test_full_listing_matches_the_working_copy(repo):
+    listed = {item['path']: (item['type'], item['size']) for item in list_repo_files(repo.id)}
+    scanned = {item['path']: (item['type'], item['size']) for item in scan_repo_directory(repo.id)}
+
+    assert listed == scanned
+    assert [item['path'] for item in list_repo_files(repo.id)] == sorted(listed)
+
+
+def test_folder_listing_puts_folders_first(repo):
+    assert [(item['name'], item['type']) for item in list_repo_files(repo.id, '')] == [
+        ('a', 'directory'), ('c', 'directory'), ('b.txt', 'file')
+    ]
+    assert [item['path'] for item in list_repo_files(repo.id, 'a/')] == ['a/deep', 'a/one.txt']
+    assert list_repo_files(repo.id, 'missing') == []
+
+
+def test_deleting_a_folder_forgets_its_contents(repo):
+    assert delete_file_from_repo(repo.id, 'a')
+    db.session.commit()
+
+    assert [item['path'] for item in list_repo_files(repo.id)] == ['b.txt', 'c', 'c/three.txt']
+
+
+def test_empty_folder_is_listed(repo):
+    os.makedirs(os.path.join('storage', 'repos', str(repo.id), 'empty', 'nested'))
+    record_repo_directory(repo.id, 'empty/nested')
+    db.session.commit()
+
+    assert [item['path'] for item in list_repo_files(repo.id, 'empty')] == ['empty/nested']
+    assert 'empty' in [item['path'] for item in list_repo_files(repo.id, '')]
+
+
+def test_index_is_built_for_repositories_without_it(ctx):
+    user = make_user('owner')
+    repo = make_repo(user)
+    # Файлы репозитория, созданного до появления индекса
+    os.makedirs(os.path.join('storage', 'repos', str(repo.id), 'src'))
+    with open(os.path.join('storage', 'repos', str(repo.id), 'src', 'main.py'), 'wb') as f:
+        f.write(b'print(1)\n')
+
+    index_repo_directory(repo.id)
+    db.session.commit()
+
+    assert [(item['path'], item['size']) for item in list_repo_files(repo.id)] == [('src', 0), ('src/main.py', 9)]
+
+
+def test_large_repository_is_shown_by_folder(app, client):
+    repo_id = seed_repo(app, {f'dir{i}/file{i}.txt': b'x' for i in range(5)})
+    app.config['REPO_VIEW_FULL_LIST_LIMIT'] = 3
+    login(client, 'owner')
+
+    page = client.get(f'/repo/{repo_id}').get_data(as_text=True)
+
+    assert 'dir0' in page
+    assert 'file0.txt' not in page
+
+    page = client.get(f'/repo/{repo_id}?path=dir0').get_data(as_text=True)
+    assert 'file0.txt' in page
@@ -0,0 +1,107 @@
+import os
+import random
+
+import pytest
+from flask_login import login_user
+
+from server.commits import create_commit
+from server.packs import create_delta, apply_delta, repack_objects, load_pack_index, list_loose_objects
+from server.storage import write_object, read_object, get_object_path
+from server.utils import save_file_to_repo
+from tests.conftest import make_user, make_repo
+
+
+def text_version(number, lines=200):
+    return ''.join(
+        f'line {i} of version {number if i % 50 == number % 50 else 0}\n' for i in range(lines)
+    ).encode()
+
+
+@pytest.mark.parametrize('base, target', [
+    (b'', b''),
+    (b'', b'new file\n'),
+    (b'old file\n', b''),
+    (text_version(1), text_version(2)),
+    (text_version(1), text_version(1)[::-1]),
+    (bytes(range(256)) * 40, bytes(range(256)) * 20 + b'inserted' + bytes(range(256)) * 20),
+])
+def test_delta_round_trip(base, target):
+    assert apply_delta(base, create_delta(base, target)) == target
+
+
+def test_delta_round_trip_random_edits():
+    rng = random.Random(1)
+    base = bytes(rng.randrange(256) for _ in range(20000))
+    target = bytearray(base)
+    for _ in range(20):
+        position = rng.randrange(len(target))
+        target[position:position + rng.randrange(100)] = bytes(rng.randrange(256) for _ in range(rng.randrange(100)))
+    target = bytes(target)
+
+    assert apply_delta(base, create_delta(base, target)) == target
+
+
+def test_delta_of_similar_versions_is_small():
+    assert len(create_delta(text_version(1), text_version(2))) < len(text_version(2)) // 10
+
+
+def test_delta_for_another_base_is_rejected():
+    delta = create_delta(b'base one\n' * 10, b'target\n')
+
+    with pytest.raises(ValueError):
+        apply_delta(b'other base\n', delta)
+
+
+def real_depth(index, object_hash):
+    depth = 0
+    while object_hash in index and index[object_hash][3] is not None:
+        object_hash = index[object_hash][3]
+        depth += 1
+    return depth
+
+
+@pytest.fixture
+def repo(ctx):
+    user = make_user('owner')
+    login_user(user)
+    return make_repo(user)
+
+
+def test_repack_keeps_every_version_readable(repo):
+    hashes = []
+    for number in range(1, 8):
+        save_file_to_repo(repo.id, 'file.txt', text_version(number))
+        create_commit(repo.id, f'v{number}', ['file.txt'])
+        hashes.append(write_object(text_version(number)))
+
+    assert repack_objects() > 0
+
+    index = load_pack_index()
+    loose = set(list_loose_objects())
+    # Текущая версия остаётся отдельным файлом, старые упакованы дельтами
+    assert hashes[-1] in loose and hashes[-1] not in index
+    assert all(h in index and h not in loose for h in hashes[:-1])
+    assert any(index[h][3] is not None for h in hashes[:-1])
+    for number, content_hash in enumerate(hashes, 1):
+        assert read_object(content_hash) == text_version(number)
+
+    packs_path = os.path.join('storage', 'packs')
+    packs_size = sum(os.path.getsize(os.path.join(packs_path, name)) for name in os.listdir(packs_path))
+    assert packs_size < sum(len(text_version(number)) for number in range(1, 7)) // 3
+
+
+def test_repeated_repacks_respect_the_depth_cap(repo):
+    hashes = []
+    for number in range(1, 13):
+        save_file_to_repo(repo.id, 'file.txt', text_version(number))
+        create_commit(repo.id, f'v{number}', ['file.txt'])
+        hashes.append(write_object(text_version(number)))
+        # Бывшая текущая версия упаковывается следующим проходом
+        repack_objects(max_depth=2)
+
+    index = load_pack_index()
+    for object_hash, entry in index.items():
+        assert entry[4] == real_depth(index, object_hash) <= 2
+    for number, content_hash in enumerate(hashes, 1):
+        assert read_object(content_hash) == text_version(number)
+    assert os.path.exists(get_object_path(hashes[-1]))
@@ -0,0 +1,123 @@
+import threading
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from server import passwords
+from server.models import db, User
+from server.passwords import PasswordCheckBusy, hash_password, verify_password, needs_rehash, password_check_limit
+from tests.conftest import make_user, login
+
+
+@pytest.fixture
+def busy(monkeypatch):
+    """Все места для проверки пароля заняты"""
+    monkeypatch.setattr(passwords, '_get_pool', lambda: (None, threading.Semaphore(0)))
+
+
+def test_hash_and_verify(app):
+    with app.app_context():
+        password_hash = hash_password('secret')
+
+        assert password_hash.startswith('pbkdf2:sha256:1000$')
+        assert verify_password(password_hash, 'secret')
+        assert not verify_password(password_hash, 'wrong')
+        assert not needs_rehash(password_hash)
+
+
+def test_needs_rehash_on_changed_settings(app):
+    with app.app_context():
+        password_hash = hash_password('secret')
+
+        app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+        assert needs_rehash(password_hash)
+
+        app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+        app.config['PASSWORD_SALT_LENGTH'] = 24
+        assert needs_rehash(password_hash)
+
+
+def test_login_rehashes_old_password(app, client):
+    with app.app_context():
+        make_user('alice')
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+
+    assert login(client, 'alice').status_code == 302
+
+    with app.app_context():
+        user = User.query.filter_by(username='alice').one()
+        assert user.password_hash.startswith('pbkdf2:sha256:2000$')
+        assert user.check_password('password123')
+
+
+def test_wrong_password_is_not_rehashed(app, client):
+    with app.app_context():
+        old_hash = make_user('alice').password_hash
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+
+    assert login(client, 'alice', 'wrong').status_code == 200
+
+    with app.app_context():
+        assert User.query.filter_by(username='alice').one().password_hash == old_hash
+
+
+def test_busy_login_returns_429(app, client, busy):
+    with app.app_context():
+        db.session.add(User(username='alice', password_hash='pbkdf2:sha256:1000$x$y'))
+        db.session.commit()
+
+    assert login(client, 'alice').status_code == 429
+
+    response = client.post('/api/token', json={'username': 'alice', 'password': 'password123'})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '5'
+
+
+@pytest.mark.parametrize('workers, queue, threads, limit', [
+    (2, 0, 4, 2),
+    (2, 32, 4, 2),
+    (4, 4, 32, 8),
+    (2, 0, 1, 1),
+])
+def test_password_check_limit(workers, queue, threads, limit):
+    config = {'PASSWORD_HASH_WORKERS': workers, 'PASSWORD_HASH_QUEUE': queue, 'REQUEST_THREADS': threads}
+
+    assert password_check_limit(config) == limit
+
+
+def test_concurrent_checks_are_bounded(app, monkeypatch):
+    # Настройки по умолчанию: часть потоков запросов остаётся свободной
+    monkeypatch.setattr(passwords, '_pool', None)
+    monkeypatch.setattr(passwords, '_slots', None)
+    limit = password_check_limit(app.config)
+    assert limit < app.config['REQUEST_THREADS']
+    started, release = threading.Semaphore(0), threading.Event()
+    results = []
+    password_hash = generate_password_hash('secret', 'pbkdf2:sha256:1000')
+
+    def slow():
+        started.release()
+        release.wait(5)
+        return 'done'
+
+    with app.app_context():
+        pool, _ = passwords._get_pool()
+        threads = [threading.Thread(target=lambda: results.append(passwords._run_in_pool(slow)))
+                   for _ in range(limit)]
+        try:
+            for thread in threads:
+                thread.start()
+            for _ in range(limit):
+                assert started.acquire(timeout=5)
+
+            with pytest.raises(PasswordCheckBusy):
+                verify_password(password_hash, 'secret')
+
+            release.set()
+            for thread in threads:
+                thread.join(5)
+            assert results == ['done'] * limit
+            assert verify_password(password_hash, 'secret')
+        finally:
+            release.set()
+            pool.shutdown()
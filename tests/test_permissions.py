@@ -0,0 +1,140 @@
+from datetime import datetime
+
+import pytest
+
+from server.models import db, User, Repository, Collaborator
+from server.utils import read_file_from_repo
+from tests.conftest import make_user, seed_repo, login, api_headers, run_jobs
+
+USERS = ('owner', 'writer', 'reader', 'stranger')
+
+
+@pytest.fixture
+def repos(app):
+    """Приватный репозиторий с участниками writer и reader и публичный репозиторий владельца"""
+    private_id = seed_repo(app, {'a.txt': b'original'})
+    public_id = seed_repo(app, {'a.txt': b'public'}, is_public=True)
+    with app.app_context():
+        for username in USERS[1:]:
+            make_user(username)
+        for username, role in (('writer', 'write'), ('reader', 'read')):
+            user_id = User.query.filter_by(username=username).one().id
+            db.session.add(Collaborator(repo_id=private_id, user_id=user_id, role=role))
+        db.session.commit()
+    return private_id, public_id
+
+
+def can_read(client, headers, repo_id):
+    return client.get(f'/api/repo/{repo_id}/head', headers=headers).status_code
+
+
+def can_write(client, headers, repo_id):
+    # С правом записи запрос без пути отклоняется как неверный (400)
+    return client.post(f'/api/repo/{repo_id}/uploads', json={}, headers=headers).status_code
+
+
+@pytest.mark.parametrize('username, read, write', [
+    ('owner', 200, 400),
+    ('writer', 200, 400),
+    ('reader', 200, 403),
+    ('stranger', 403, 403),
+])
+def test_api_access_to_private_repo(app, client, repos, username, read, write):
+    headers = api_headers(app, username)
+
+    assert can_read(client, headers, repos[0]) == read
+    assert can_write(client, headers, repos[0]) == write
+
+
+def test_public_repo_is_readable_by_everyone(app, client, repos):
+    headers = api_headers(app, 'stranger')
+
+    assert can_read(client, headers, repos[1]) == 200
+    assert can_write(client, headers, repos[1]) == 403
+
+
+def test_anonymous_api_request(client, repos):
+    assert can_read(client, {}, repos[1]) == 401
+
+
+@pytest.mark.parametrize('username, location', [
+    ('owner', None),
+    ('writer', '/repo/{}'),
+    ('reader', '/repo/{}'),
+    ('stranger', '/dashboard'),
+])
+def test_owner_pages(client, repos, username, location):
+    login(client, username)
+
+    response = client.get(f'/repo/{repos[0]}/edit')
+
+    if location is None:
+        assert response.status_code == 200
+    else:
+        assert response.status_code == 302
+        assert response.headers['Location'].endswith(location.format(repos[0]))
+
+
+def test_reader_cannot_change_files(client, repos):
+    login(client, 'reader')
+
+    page = client.get(f'/repo/{repos[0]}/blob/a.txt').get_data(as_text=True)
+    assert 'Редактировать' not in page
+
+    response = client.post(f'/repo/{repos[0]}/edit-file/a.txt', data={'content': 'changed', 'filename': 'a.txt'},
+                           follow_redirects=True)
+    assert 'У вас нет прав для редактирования файлов' in response.get_data(as_text=True)
+    client.get(f'/repo/{repos[0]}/delete/a.txt')
+    assert read_file_from_repo(repos[0], 'a.txt') == b'original'
+
+
+def test_writer_can_change_files(client, repos):
+    login(client, 'writer')
+
+    client.post(f'/repo/{repos[0]}/edit-file/a.txt', data={'content': 'changed', 'filename': 'a.txt'})
+
+    assert read_file_from_repo(repos[0], 'a.txt') == b'changed'
+
+
+def test_upload_of_another_user_is_not_found(app, client, repos):
+    response = client.post(f'/api/repo/{repos[0]}/uploads', json={'path': 'big.bin'},
+                           headers=api_headers(app, 'writer'))
+    upload_id = response.get_json()['upload_id']
+
+    url = f'/api/repo/{repos[0]}/uploads/{upload_id}'
+    assert client.get(url, headers=api_headers(app, 'writer')).status_code == 200
+    assert client.get(url, headers=api_headers(app, 'owner')).status_code == 404
+    assert client.delete(url, headers=api_headers(app, 'owner')).status_code == 404
+
+
+def test_deleted_repo_is_not_found(app, client, repos):
+    with app.app_context():
+        db.session.get(Repository, repos[0]).deleted_at = datetime.utcnow()
+        db.session.commit()
+
+    assert can_read(client, api_headers(app, 'owner'), repos[0]) == 404
+
+
+def test_collaborator_changes_apply_at_once(app, client, repos):
+    reader = api_headers(app, 'reader')
+    assert can_write(client, reader, repos[0]) == 403
+    with app.app_context():
+        reader_id = User.query.filter_by(username='reader').one().id
+    # Владелец работает через сайт в отдельном клиенте: в этом клиенте
+    # его сессия заменила бы токен участника
+    owner = app.test_client()
+    login(owner, 'owner')
+
+    owner.post(f'/repo/{repos[0]}/collaborators', data={'username': 'reader', 'role': 'write'})
+    assert can_write(client, reader, repos[0]) == 400
+
+    owner.post(f'/repo/{repos[0]}/collaborators/{reader_id}/remove')
+    assert can_read(client, reader, repos[0]) == 403
+
+
+def test_collaborator_sees_shared_repo_in_search(app, client, repos):
+    run_jobs(app)
+
+    for username, visible in (('reader', True), ('stranger', False)):
+        results = client.get('/api/search?q=original', headers=api_headers(app, username)).get_json()['results']
+        assert bool(results) == visible
@@ -0,0 +1,154 @@
+import pytest
+
+from server import preview
+from server.preview import SNIFF_SIZE, sniff_object, render_preview
+from server.storage import write_object
+from tests.conftest import seed_repo, login
+
+
+@pytest.mark.parametrize('content, kind', [
+    (b'plain text\n', 'text'),
+    ('юникод\n'.encode(), 'text'),
+    (b'', 'text'),
+    (b'text\0with a zero byte', 'binary'),
+    (b'\xff\xfe\xfd', 'binary'),
+    # Оборванный символ в конце короткого файла - не UTF-8
+    ('ю'.encode()[:1], 'binary'),
+    # Символ, разрезанный границей образца, не делает файл двоичным
+    (b'a' * (SNIFF_SIZE - 1) + 'ю'.encode() * 10, 'text'),
+    # После образца файл не проверяется
+    (b'a' * SNIFF_SIZE + b'\0', 'text'),
+])
+def test_sniff(content, kind):
+    assert sniff_object(write_object(content)) == kind
+
+
+def test_sniff_is_cached(monkeypatch):
+    content_hash = write_object(b'text')
+    sniff_object(content_hash)
+
+    def fail(*args):
+        raise AssertionError('object read again')
+
+    monkeypatch.setattr(preview, 'open_object', fail)
+    assert sniff_object(content_hash) == 'text'
+
+
+def test_render_code_and_text():
+    code = render_preview(write_object(b'def main():\n    return 1\n'), 'src/main.py', 1000)
+    assert code['kind'] == 'code'
+    assert 'class="highlight"' in code['html'] and 'main' in code['html']
+
+    text = render_preview(write_object(b'<script>alert(1)</script>'), 'notes.unknown-ext', 1000)
+    assert text['kind'] == 'text'
+    assert '<script>' not in text['html'] and '&lt;script&gt;' in text['html']
+
+
+def test_render_binary_and_too_large():
+    assert render_preview(write_object(b'\0\1\2'), 'image.png', 1000) == {'kind': 'binary', 'html': None}
+    assert render_preview(write_object(b'x' * 1001), 'big.txt', 1000) == {'kind': 'too_large', 'html': None}
+    assert render_preview(write_object(b'x' * 1000), 'big.txt', 1000)['kind'] == 'code'
+
+
+def test_render_is_cached(monkeypatch):
+    content_hash = write_object(b'print(1)\n')
+    first = render_preview(content_hash, 'a.py', 1000)
+
+    def fail(*args):
+        raise AssertionError('object read again')
+
+    monkeypatch.setattr(preview, 'read_object', fail)
+    assert render_preview(content_hash, 'b/a.py', 1000) is first
+    # Другое расширение - другая отрисовка того же объекта
+    with pytest.raises(AssertionError):
+        render_preview(content_hash, 'a.unknown-ext', 1000)
+
+
+def test_markdown_without_the_package_is_shown_as_text(monkeypatch):
+    monkeypatch.setattr(preview, 'markdown', None)
+
+    result = render_preview(write_object(b'# Title\n<b>raw</b>\n'), 'README.md', 1000)
+
+    assert result['kind'] in ('code', 'text')
+    assert '<b>' not in result['html']
+
+
+def test_markdown_rendering():
+    pytest.importorskip('markdown')
+    content = b'# Title\n\n<script>alert(1)</script>\n\n[bad](javascript:alert(1)) [good](https://example.com)\n'
+
+    result = render_preview(write_object(content), 'README.md', 1000)
+
+    assert result['kind'] == 'markdown'
+    assert '<h1>Title</h1>' in result['html']
+    assert '<script>' not in result['html']
+    assert 'href="#"' in result['html'] and 'href="https://example.com"' in result['html']
+
+
+@pytest.mark.parametrize('link', [
+    '[x](&#x6A;avascript&#58;alert(1))',
+    '[x](&#x6A;avascript&colon;alert(1))',
+    '[x](&amp;#x6A;avascript&amp;#58;alert(1))',
+    '[x](java&#9;script:alert(1))',
+    '[x](<java\tscript:alert(1)>)',
+    '[x](&#1;javascript:alert(1))',
+    '![x](&#106;avascript:alert(1))',
+    '[x][ref]\n\n[ref]: &#x6A;avascript&#58;alert(1)',
+])
+def test_markdown_encoded_schemes_are_removed(link):
+    pytest.importorskip('markdown')
+
+    html = render_preview(write_object(link.encode()), 'README.md', 1000)['html']
+
+    assert 'href="#"' in html or 'src="#"' in html
+    assert 'avascript' not in html
+
+
+@pytest.mark.parametrize('link, href', [
+    ('[x](docs/a:b.md)', 'docs/a:b.md'),
+    ('[x](#section)', '#section'),
+    ('[x](HTTPS://example.com)', 'HTTPS://example.com'),
+    ('[x](mailto:me@example.com)', 'mailto:me@example.com'),
+])
+def test_markdown_safe_links_are_kept(link, href):
+    pytest.importorskip('markdown')
+
+    html = render_preview(write_object(link.encode()), 'README.md', 1000)['html']
+
+    assert f'href="{href}"' in html
+
+
+@pytest.fixture
+def repo_id(app, client):
+    repo_id = seed_repo(app, {
+        'README': b'Project readme text\n',
+        'main.py': b'print("hello")\n',
+        'data.bin': b'\0\1\2',
+        'big.txt': b'x' * 100,
+    })
+    login(client, 'owner')
+    return repo_id
+
+
+def test_file_view_page(app, client, repo_id):
+    app.config['PREVIEW_MAX_SIZE'] = 50
+
+    page = client.get(f'/repo/{repo_id}/blob/main.py').get_data(as_text=True)
+    assert 'hello' in page and 'Редактировать' in page
+
+    page = client.get(f'/repo/{repo_id}/blob/data.bin').get_data(as_text=True)
+    assert 'Двоичный файл не показывается' in page and 'Редактировать' not in page
+
+    page = client.get(f'/repo/{repo_id}/blob/big.txt').get_data(as_text=True)
+    assert 'Файл слишком большой для просмотра' in page
+
+
+def test_binary_file_is_not_editable(client, repo_id):
+    response = client.get(f'/repo/{repo_id}/edit-file/data.bin')
+
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith(f'/repo/{repo_id}/blob/data.bin')
+
+
+def test_readme_on_repo_page(client, repo_id):
+    assert 'Project readme text' in client.get(f'/repo/{repo_id}').get_data(as_text=True)
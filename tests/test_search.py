@@ -0,0 +1,130 @@
+from server import db
+from server.models import Job
+from server.search import get_connection, search_files, prune_search_index, rebuild_search_index
+from server.utils import delete_file_from_repo
+from tests.conftest import seed_repo, run_jobs, api_headers, make_user
+
+FILES = {
+    'src/main.py': b'import os\n\ndef Launch_Rocket():\n    return 42\n',
+    'docs/notes.txt': b'nothing interesting here\n',
+    'data.bin': b'\0\1launch_rocket\2',
+}
+
+
+def test_index_updated_by_job_after_commit(app):
+    repo_id = seed_repo(app, FILES)
+
+    with app.app_context():
+        assert Job.query.filter_by(kind='search-index').count() == 1
+        assert search_files('rocket', [repo_id]) == []
+
+    run_jobs(app)
+
+    with app.app_context():
+        results = search_files('launch_rocket', [repo_id])
+
+    # Регистр не учитывается, двоичные файлы не индексируются
+    assert results == [{
+        'repo_id': repo_id,
+        'path': 'src/main.py',
+        'hash': results[0]['hash'],
+        'line_number': 3,
+        'line': 'def Launch_Rocket():'
+    }]
+
+
+def test_short_query_and_missing_repos(app):
+    repo_id = seed_repo(app, FILES)
+    run_jobs(app)
+
+    with app.app_context():
+        assert search_files('os', [repo_id]) == []
+        assert search_files('rocket', []) == []
+        assert search_files('rocket', [repo_id + 1]) == []
+        assert search_files('"rocket', [repo_id]) == []
+
+
+def test_deleted_files_are_forgotten(app):
+    repo_id = seed_repo(app, FILES)
+    run_jobs(app)
+
+    with app.app_context():
+        delete_file_from_repo(repo_id, 'src')
+        db.session.commit()
+    run_jobs(app)
+
+    with app.app_context():
+        assert search_files('rocket', [repo_id]) == []
+        assert [r['path'] for r in search_files('interesting', [repo_id])] == ['docs/notes.txt']
+
+
+def test_rollback_discards_updates(app):
+    repo_id = seed_repo(app, FILES)
+    run_jobs(app)
+
+    with app.app_context():
+        delete_file_from_repo(repo_id, 'src/main.py')
+        db.session.rollback()
+        db.session.commit()
+        assert Job.query.filter_by(kind='search-index', status='pending').count() == 0
+
+
+def test_shared_blob_indexed_once(app):
+    first = seed_repo(app, FILES)
+    second = seed_repo(app, FILES, owner='other')
+    run_jobs(app)
+
+    with app.app_context():
+        connection = get_connection()
+        assert connection.execute('SELECT COUNT(*) FROM blobs').fetchone()[0] == 3
+        found = {r['repo_id'] for r in search_files('rocket', [first, second])}
+    assert found == {first, second}
+
+
+def test_prune_removes_unreferenced_blobs(app):
+    repo_id = seed_repo(app, FILES)
+    run_jobs(app)
+
+    with app.app_context():
+        delete_file_from_repo(repo_id, 'src/main.py')
+        db.session.commit()
+    run_jobs(app)
+
+    with app.app_context():
+        assert prune_search_index() == 1
+        assert prune_search_index() == 0
+        assert get_connection().execute('SELECT COUNT(*) FROM blobs').fetchone()[0] == 2
+
+
+def test_rebuild_restores_file_list(app):
+    repo_id = seed_repo(app, FILES)
+    run_jobs(app)
+
+    with app.app_context():
+        get_connection().execute('DELETE FROM files')
+        get_connection().commit()
+        assert search_files('rocket', [repo_id]) == []
+
+        assert rebuild_search_index() == len(FILES)
+        assert [r['path'] for r in search_files('rocket', [repo_id])] == ['src/main.py']
+
+
+def test_api_search_respects_visibility(app, client):
+    private_id = seed_repo(app, {'secret.py': b'rocket launch codes\n'}, owner='owner')
+    public_id = seed_repo(app, {'open.py': b'rocket science\n'}, owner='owner', is_public=True)
+    run_jobs(app)
+    with app.app_context():
+        make_user('stranger')
+
+    response = client.get('/api/search?q=ROCKET', headers=api_headers(app, 'stranger'))
+    assert response.status_code == 200
+    assert [(r['repo_id'], r['path']) for r in response.get_json()['results']] == [(public_id, 'open.py')]
+
+    response = client.get('/api/search?q=rocket', headers=api_headers(app, 'owner'))
+    assert {r['repo_id'] for r in response.get_json()['results']} == {private_id, public_id}
+
+    response = client.get(f'/api/search?q=rocket&repo_id={private_id}', headers=api_headers(app, 'stranger'))
+    assert response.get_json()['results'] == []
+
+    response = client.get('/api/search?q=ro', headers=api_headers(app, 'owner'))
+    assert response.status_code == 400
@@ -0,0 +1,124 @@
+from datetime import datetime
+
+import pytest
+from flask_login import login_user
+from sqlalchemy import event
+
+from server.commits import create_commit
+from server.models import db, Repository, Collaborator
+from server.utils import save_file_to_repo, delete_file_from_repo
+from tests.conftest import make_user, make_repo, login
+
+
+@pytest.fixture
+def repo(ctx):
+    user = make_user('owner')
+    login_user(user)
+    return make_repo(user)
+
+
+def stats(repo_id):
+    db.session.expire_all()
+    repo = db.session.get(Repository, repo_id)
+    return repo.commit_count, repo.file_count, repo.total_size
+
+
+def test_counters_follow_commits(repo):
+    save_file_to_repo(repo.id, 'a.txt', b'12345')
+    save_file_to_repo(repo.id, 'dir/b.txt', b'123')
+    first = create_commit(repo.id, 'first', ['a.txt', 'dir/b.txt'])
+    assert stats(repo.id) == (1, 2, 8)
+    assert db.session.get(Repository, repo.id).head_hash == first.commit_hash
+
+    save_file_to_repo(repo.id, 'a.txt', b'1')
+    delete_file_from_repo(repo.id, 'dir')
+    save_file_to_repo(repo.id, 'c.txt', b'1234567')
+    create_commit(repo.id, 'second', ['a.txt', 'dir/b.txt', 'c.txt'])
+    assert stats(repo.id) == (2, 2, 8)
+
+    # Пустой коммит счётчики не меняет
+    create_commit(repo.id, 'nothing', ['a.txt'])
+    assert stats(repo.id) == (2, 2, 8)
+
+
+def test_recount_stats_command(app, repo):
+    save_file_to_repo(repo.id, 'a.txt', b'12345')
+    create_commit(repo.id, 'first', ['a.txt'])
+    db.session.execute(db.update(Repository).values(commit_count=0, file_count=9, total_size=1))
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['recount-stats'])
+
+    assert 'Пересчитано репозиториев: 1' in result.output
+    assert stats(repo.id) == (1, 1, 5)
+
+
+def seed_dashboard(app, count):
+    with app.app_context():
+        owner = make_user('owner')
+        other = make_user('other')
+        for number in range(count):
+            make_repo(owner, name=f'mine-{number}')
+        shared = make_repo(other, name='shared-with-me')
+        db.session.add(Collaborator(repo_id=shared.id, user_id=owner.id, role='read'))
+        make_repo(other, name='not-mine')
+        deleted = make_repo(owner, name='deleted-repo')
+        deleted.deleted_at = datetime.utcnow()
+        db.session.commit()
+
+
+def test_dashboard_lists_own_and_shared_repos(app, client):
+    seed_dashboard(app, 2)
+    login(client, 'owner')
+
+    page = client.get('/dashboard').get_data(as_text=True)
+
+    assert 'mine-0' in page and 'mine-1' in page and 'shared-with-me' in page
+    assert 'not-mine' not in page and 'deleted-repo' not in page
+
+
+def test_dashboard_is_paginated(app, client):
+    app.config['REPOS_PER_PAGE'] = 2
+    seed_dashboard(app, 3)
+    login(client, 'owner')
+
+    first = client.get('/dashboard').get_data(as_text=True)
+    last = client.get('/dashboard?page=2').get_data(as_text=True)
+
+    assert 'Страница 1 из 2' in first and 'Всего репозиториев: <strong>4</strong>' in first
+    assert 'Страница 2 из 2' in last
+    names = ['mine-0', 'mine-1', 'mine-2', 'shared-with-me']
+    assert sum(name in first for name in names) == 2
+    assert sum(name in last for name in names) == 2
+
+
+def count_dashboard_queries(app, client):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        assert client.get('/dashboard').status_code == 200
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    return len(statements)
+
+
+def test_dashboard_query_count_does_not_grow(app, client):
+    seed_dashboard(app, 1)
+    login(client, 'owner')
+    # Первый запрос ещё загружает пользователя в кэш
+    client.get('/dashboard')
+    few = count_dashboard_queries(app, client)
+
+    with app.app_context():
+        owner = db.session.query(Repository).filter_by(name='mine-0').one().owner
+        for number in range(10):
+            make_repo(owner, name=f'more-{number}')
+    many = count_dashboard_queries(app, client)
+
+    assert many == few
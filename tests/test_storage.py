@@ -0,0 +1,69 @@
+import hashlib
+import os
+
+import pytest
+
+from server.storage import (
+    write_object, write_object_chunks, read_object, object_exists, get_object_path,
+    get_objects_tmp_path, link_object
+)
+
+
+def test_write_object_is_content_addressed():
+    content_hash = write_object(b'hello\n')
+
+    assert content_hash == hashlib.sha256(b'hello\n').hexdigest()
+    assert read_object(content_hash) == b'hello\n'
+    assert get_object_path(content_hash) == os.path.join(
+        'storage', 'objects', content_hash[:2], content_hash[2:]
+    )
+
+
+def test_same_content_is_stored_once():
+    first = write_object(b'same bytes')
+    second = write_object(b'same bytes')
+
+    assert first == second
+    objects = os.listdir(os.path.join('storage', 'objects', first[:2]))
+    assert objects == [first[2:]]
+
+
+def test_failed_write_leaves_nothing_behind():
+
+    def chunks():
+        yield b'partial '
+        raise OSError('connection reset')
+
+    with pytest.raises(OSError):
+        write_object_chunks(chunks())
+
+    assert os.listdir(get_objects_tmp_path()) == []
+    assert not object_exists(hashlib.sha256(b'partial ').hexdigest())
+
+
+def test_streamed_write_matches_whole_write():
+    content_hash, size = write_object_chunks(iter([b'abc', b'def', b'']))
+
+    assert (content_hash, size) == (write_object(b'abcdef'), 6)
+    assert os.listdir(get_objects_tmp_path()) == []
+
+
+def test_working_copies_share_the_object():
+    content_hash = write_object(b'shared\n')
+    link_object(content_hash, os.path.join('storage', 'repos', '1', 'a.txt'))
+    link_object(content_hash, os.path.join('storage', 'repos', '2', 'b', 'c.txt'))
+
+    inodes = {
+        os.stat(path).st_ino for path in (
+            get_object_path(content_hash),
+            os.path.join('storage', 'repos', '1', 'a.txt'),
+            os.path.join('storage', 'repos', '2', 'b', 'c.txt'),
+        )
+    }
+    assert len(inodes) == 1
+
+
+@pytest.mark.parametrize('bad_hash', ['../../etc/passwd', 'ab/../..', 'A' * 64, 'a' * 63, '', None])
+def test_object_path_rejects_non_hashes(bad_hash):
+    with pytest.raises(ValueError):
+        get_object_path(bad_hash)
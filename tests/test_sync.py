@@ -0,0 +1,322 @@
+import base64
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+from scvp import cli
+from scvp.objects import ObjectStore, TREE_BLOB, TREE_DIR
+from scvp.remote import Remote
+from server.models import db, Repository
+from server.storage import object_exists
+from server.sync import receive_object_stream
+from server.trees import read_tree, walk_tree
+from server.utils import get_repo_index, read_file_from_repo, calculate_file_hash
+from tests.conftest import seed_repo, api_headers
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FILES = {'README.md': b'# project\n', 'src/main.py': b'print(1)\n', 'src/util.py': b'x = 1\n'}
+
+
+@pytest.fixture
+def repo_id(app):
+    return seed_repo(app, FILES)
+
+
+@pytest.fixture
+def headers(app, repo_id):
+    return api_headers(app)
+
+
+@pytest.fixture
+def head(app, repo_id):
+    with app.app_context():
+        repo = db.session.get(Repository, repo_id)
+        return {'version': repo.head_version, 'commit': repo.head_hash, 'tree': repo.head_tree}
+
+
+def fetch(client, repo_id, headers, have, base=None):
+    response = client.post(f'/api/repo/{repo_id}/fetch', json={'want': None, 'have': have, 'base': base},
+                           headers=headers)
+    assert response.status_code == 200
+    return receive_object_stream(io.BytesIO(response.data), base_path='client/repos')
+
+
+def test_fetch_sends_everything_to_an_empty_client(app, client, repo_id, headers, head):
+    received = fetch(client, repo_id, headers, [])
+
+    with app.app_context():
+        files = {content_hash for _, content_hash, _ in walk_tree(head['tree'])}
+    # Корень, папка src и три файла
+    assert len(received) == 5
+    assert files < set(received)
+    assert head['tree'] in received
+
+
+def test_fetch_skips_objects_and_subtrees_the_client_has(app, client, repo_id, headers, head):
+    with app.app_context():
+        src_tree = read_tree(head['tree'])['src']['hash']
+        readme = read_tree(head['tree'])['README.md']['hash']
+
+    assert fetch(client, repo_id, headers, [src_tree, readme]) == [head['tree']]
+
+
+def test_fetch_sends_only_changes_since_the_base_version(app, client, repo_id, headers, head):
+    client.post(f'/api/repo/{repo_id}/batch', headers=headers,
+                json={'files': {'src/main.py': {'content': base64.b64encode(b'print(2)\n').decode()}}})
+    with app.app_context():
+        tree = db.session.get(Repository, repo_id).head_tree
+        src_tree = read_tree(tree)['src']['hash']
+
+    received = fetch(client, repo_id, headers, [], base=head['tree'])
+
+    # Новый корень, новая папка src и изменённый файл; util.py и README.md у клиента есть
+    assert received == [tree, src_tree, calculate_file_hash(b'print(2)\n')]
+    # Неизвестное серверу дерево не мешает: клиент получает версию целиком
+    assert len(fetch(client, repo_id, headers, [], base='e' * 64)) == 5
+
+
+@pytest.mark.parametrize('have', [['../../etc/passwd'], 'not a list', [None]])
+def test_fetch_rejects_invalid_hashes(client, repo_id, headers, have):
+    response = client.post(f'/api/repo/{repo_id}/fetch', json={'have': have}, headers=headers)
+
+    assert response.status_code == 400
+
+
+def test_negotiate_reports_missing_objects(client, repo_id, headers, head):
+    unknown = 'f' * 64
+
+    response = client.post(f'/api/repo/{repo_id}/negotiate', json={'objects': [head['tree'], unknown]},
+                           headers=headers)
+
+    assert response.json == {'missing': [unknown]}
+    assert client.post(f'/api/repo/{repo_id}/negotiate', json={'objects': ['..']},
+                       headers=headers).status_code == 400
+
+
+def push(client, repo_id, headers, store, objects, tree, parent, message='push'):
+    stream = io.BytesIO()
+    store.write_stream(objects, stream)
+    return client.post(f'/api/repo/{repo_id}/push', data=stream.getvalue(), headers=headers,
+                       query_string={'tree': tree, 'parent': parent, 'message': message},
+                       content_type='application/octet-stream')
+
+
+@pytest.fixture
+def store():
+    return ObjectStore(os.path.join('client', 'objects'))
+
+
+def blob(store, content):
+    return store.write(content), len(content)
+
+
+def test_push_creates_a_version(app, client, repo_id, headers, head, store):
+    files = {path: blob(store, content) for path, content in FILES.items()}
+    files['src/main.py'] = blob(store, b'print(2)\n')
+    del files['src/util.py']
+    tree = store.build_tree(files)
+
+    response = push(client, repo_id, headers, store, sorted(store.tree_objects(tree)), tree, head['commit'])
+
+    assert response.status_code == 200
+    assert response.json['version'] == 2
+    assert response.json['tree'] == tree
+    with app.app_context():
+        assert read_file_from_repo(repo_id, 'src/main.py') == b'print(2)\n'
+        assert read_file_from_repo(repo_id, 'src/util.py') is None
+        assert set(get_repo_index(repo_id)) == {'README.md', 'src/main.py'}
+
+
+def test_push_of_the_same_tree_is_not_a_new_version(client, repo_id, headers, head, store):
+    tree = store.build_tree({path: blob(store, content) for path, content in FILES.items()})
+
+    response = push(client, repo_id, headers, store, [], tree, head['commit'])
+
+    assert response.status_code == 200
+    assert response.json == {'version': 1, 'commit': head['commit'], 'tree': head['tree']}
+
+
+def test_push_from_a_stale_parent_conflicts(app, client, repo_id, headers, head, store):
+    tree = store.build_tree({'other.txt': blob(store, b'other')})
+    assert push(client, repo_id, headers, store, sorted(store.tree_objects(tree)), tree,
+                head['commit']).status_code == 200
+
+    stale = store.build_tree({'stale.txt': blob(store, b'stale')})
+    response = push(client, repo_id, headers, store, sorted(store.tree_objects(stale)), stale, head['commit'])
+
+    assert response.status_code == 409
+    assert response.json['version'] == 2
+    with app.app_context():
+        assert read_file_from_repo(repo_id, 'stale.txt') is None
+        assert db.session.get(Repository, repo_id).head_version == 2
+
+
+def test_push_with_missing_objects(client, repo_id, headers, head, store):
+    content_hash, size = blob(store, b'new')
+    tree = store.build_tree({'new.txt': (content_hash, size)})
+
+    response = push(client, repo_id, headers, store, [tree], tree, head['commit'])
+
+    assert response.status_code == 422
+    assert response.json['missing'] == [content_hash]
+
+
+def test_objects_are_sent_before_the_push(app, client, repo_id, headers, head, store):
+    tree = store.build_tree({'big.bin': blob(store, os.urandom(5000))})
+    # Поток объектов принимается на диск и ограничен своим пределом, а не MAX_CONTENT_LENGTH
+    app.config.update(MAX_CONTENT_LENGTH=1000)
+    stream = io.BytesIO()
+    store.write_stream(sorted(store.tree_objects(tree)), stream)
+
+    response = client.post(f'/api/repo/{repo_id}/objects', data=stream.getvalue(), headers=headers,
+                           content_type='application/octet-stream')
+    assert response.json == {'received': 2}
+
+    response = push(client, repo_id, headers, store, [], tree, head['commit'])
+    assert response.status_code == 200 and response.json['version'] == 2
+
+    app.config.update(PUSH_MAX_SIZE=1000)
+    response = client.post(f'/api/repo/{repo_id}/objects', data=stream.getvalue(), headers=headers,
+                           content_type='application/octet-stream')
+    assert response.status_code == 413
+
+
+@pytest.mark.parametrize('name', ['..', '.', '', 'a/b', 'nul\0'])
+def test_push_with_unsafe_tree_entry(app, client, repo_id, headers, head, store, name):
+    content_hash, size = blob(store, b'overwritten')
+    tree = store.write_tree({name: {'type': TREE_BLOB, 'hash': content_hash, 'size': size}})
+
+    response = push(client, repo_id, headers, store, [tree, content_hash], tree, head['commit'])
+
+    assert response.status_code == 400
+    with app.app_context():
+        assert db.session.get(Repository, repo_id).head_version == 1
+
+
+def test_push_with_nested_traversal(app, client, repo_id, headers, head, store):
+    content_hash, size = blob(store, b'evil')
+    inner = store.write_tree({'..': {'type': TREE_DIR, 'hash': store.write_tree({}), 'size': 0},
+                              'x': {'type': TREE_BLOB, 'hash': content_hash, 'size': size}})
+    tree = store.write_tree({'dir': {'type': TREE_DIR, 'hash': inner, 'size': size}})
+
+    response = push(client, repo_id, headers, store, sorted(store.all_hashes()), tree, head['commit'])
+
+    assert response.status_code == 400
+    assert not os.path.exists(os.path.join('storage', 'repos', 'x'))
+
+
+@pytest.mark.parametrize('params', [{'tree': '../x'}, {'tree': 'a' * 64, 'parent': 'zz'}, {}])
+def test_push_with_invalid_parameters(client, repo_id, headers, params):
+    response = client.post(f'/api/repo/{repo_id}/push', data=b'', headers=headers, query_string=params)
+
+    assert response.status_code == 400
+
+
+def test_push_with_corrupt_object(client, repo_id, headers, head, store):
+    tree = store.build_tree({'new.txt': blob(store, b'new')})
+    stream = io.BytesIO()
+    store.write_stream(sorted(store.tree_objects(tree)), stream)
+    data = bytearray(stream.getvalue())
+    data[-40] ^= 0xff
+
+    response = client.post(f'/api/repo/{repo_id}/push', data=bytes(data), headers=headers,
+                           query_string={'tree': tree, 'parent': head['commit']})
+
+    assert response.status_code == 400
+
+
+@pytest.fixture
+def server_url(app):
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    thread.join()
+
+
+@pytest.fixture
+def scvp(app, repo_id, server_url, headers):
+    """Запуск клиента scvp (отдельным процессом) с токеном владельца
+
+    Клиент работает в текущей папке, а сервер в том же процессе
+    разрешает пути хранилища от неё же - поэтому процесс отдельный.
+    """
+    home = os.path.abspath('home')
+    os.makedirs(os.path.join(home, '.scvp'))
+    with open(os.path.join(home, '.scvp', 'credentials.json'), 'w') as f:
+        json.dump({server_url: headers['Authorization'][len('Bearer '):]}, f)
+    env = dict(os.environ, HOME=home, PYTHONPATH=ROOT)
+
+    def run(*args, cwd='.', check=True):
+        result = subprocess.run([sys.executable, '-m', 'scvp', *args], cwd=cwd, env=env,
+                                capture_output=True, text=True)
+        if check:
+            assert result.returncode == 0, result.stderr
+        return result
+    return run
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_clone_commit_push_and_pull(app, repo_id, server_url, scvp):
+    scvp('clone', str(repo_id), 'one', '-s', server_url)
+    scvp('clone', str(repo_id), 'two', '-s', server_url)
+    assert read(os.path.join('one', 'src', 'main.py')) == FILES['src/main.py']
+
+    with open(os.path.join('one', 'src', 'main.py'), 'wb') as f:
+        f.write(b'print(3)\n')
+    os.remove(os.path.join('one', 'README.md'))
+    scvp('commit', '-m', 'from one', cwd='one')
+    scvp('push', cwd='one')
+
+    with app.app_context():
+        assert read_file_from_repo(repo_id, 'src/main.py') == b'print(3)\n'
+        assert db.session.get(Repository, repo_id).head_version == 2
+
+    scvp('pull', cwd='two')
+    assert read(os.path.join('two', 'src', 'main.py')) == b'print(3)\n'
+    assert not os.path.exists(os.path.join('two', 'README.md'))
+
+
+def test_push_after_someone_else_pushed(app, repo_id, server_url, scvp):
+    scvp('clone', str(repo_id), 'one', '-s', server_url)
+    scvp('clone', str(repo_id), 'two', '-s', server_url)
+    for name in ('one', 'two'):
+        with open(os.path.join(name, f'{name}.txt'), 'w') as f:
+            f.write(name)
+        scvp('commit', '-m', name, cwd=name)
+
+    scvp('push', cwd='one')
+    result = scvp('push', cwd='two', check=False)
+
+    assert result.returncode != 0
+    assert 'scvp pull' in result.stderr
+    with app.app_context():
+        assert 'two.txt' not in get_repo_index(repo_id)
+
+
+def test_push_sends_objects_in_batches(app, repo_id, server_url, headers, store, monkeypatch):
+    app.config.update(PUSH_MAX_SIZE=3000)
+    monkeypatch.setattr(cli, 'PUSH_BATCH_SIZE', 1000)
+    objects = [store.write(os.urandom(1200)) for _ in range(3)]
+    remote = Remote(server_url, headers['Authorization'][len('Bearer '):])
+    batches = []
+    send = remote.send_objects
+    monkeypatch.setattr(remote, 'send_objects', lambda *args: batches.append(send(*args)))
+    working_copy = type('WorkingCopy', (), {'objects': store, 'config': {'repo_id': repo_id}})
+
+    cli.send_objects(working_copy, remote, objects)
+
+    # Всё сразу не уместилось бы в PUSH_MAX_SIZE
+    assert batches == [{'received': 1}] * 3
+    assert all(object_exists(object_hash) for object_hash in objects)
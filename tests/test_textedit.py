@@ -0,0 +1,132 @@
+import pytest
+
+from server import textedit
+from server.models import Commit
+from server.storage import write_object, read_object
+from server.textedit import get_line_index, read_lines, apply_line_patch, PatchError
+from server.utils import read_file_from_repo, calculate_file_hash
+from tests.conftest import seed_repo, login, api_headers
+
+TEXT = b''.join(b'line %d\n' % number for number in range(10))
+
+
+def patched(content, patches):
+    content_hash, size = apply_line_patch(write_object(content), patches)
+    result = read_object(content_hash)
+    assert size == len(result)
+    return result
+
+
+def test_line_index(monkeypatch):
+    # Переводы строк попадают на границы блоков чтения
+    monkeypatch.setattr(textedit, 'READ_CHUNK_SIZE', 7)
+
+    index = get_line_index(write_object(TEXT))
+    assert len(index) == 10 and index.size == len(TEXT)
+    assert [index.offset(line) for line in (0, 1, 10)] == [0, 7, len(TEXT)]
+    assert index.ends_with_newline and index.newline == b'\n'
+
+    index = get_line_index(write_object(b'a\r\nb\r\nlast'))
+    assert (len(index), index.newline, index.ends_with_newline) == (3, b'\r\n', False)
+
+    assert len(get_line_index(write_object(b''))) == 0
+
+
+def test_line_index_is_cached():
+    content_hash = write_object(TEXT)
+    assert get_line_index(content_hash) is get_line_index(content_hash)
+
+
+def test_read_lines():
+    content_hash = write_object(TEXT)
+
+    assert read_lines(content_hash, 2, 3) == ['line 2', 'line 3', 'line 4']
+    assert read_lines(content_hash, 8, 100) == ['line 8', 'line 9']
+    assert read_lines(content_hash, 10, 5) == []
+    assert read_lines(write_object(b'a\r\nb\rc\r\n'), 0, 5) == ['a', 'b\rc']
+
+
+@pytest.mark.parametrize('content, patches, expected', [
+    (TEXT, [(2, 4, ['two', 'three'])], TEXT.replace(b'line 2\nline 3', b'two\nthree')),
+    (TEXT, [(0, 9, [])], b'line 9\n'),
+    (TEXT, [(5, 5, ['new'])], TEXT.replace(b'line 5', b'new\nline 5')),
+    (TEXT, [(10, 10, ['end'])], TEXT + b'end\n'),
+    (TEXT, [(9, 10, ['x']), (0, 1, ['y'])], TEXT.replace(b'line 0', b'y').replace(b'line 9', b'x')),
+    (b'a\nb', [(1, 2, ['c'])], b'a\nc'),
+    (b'a\nb', [(2, 2, ['c'])], b'a\nb\nc'),
+    (b'a\r\nb\r\n', [(1, 1, ['x', 'y'])], b'a\r\nx\r\ny\r\nb\r\n'),
+    (b'', [(0, 0, ['first'])], b'first\n'),
+    ('привет\n'.encode(), [(0, 1, ['мир'])], 'мир\n'.encode()),
+])
+def test_apply_line_patch(content, patches, expected):
+    assert patched(content, patches) == expected
+
+
+@pytest.mark.parametrize('patches', [
+    [(3, 2, [])],
+    [(0, 11, [])],
+    [(-1, 1, [])],
+    [(1, 4, []), (3, 5, ['overlap'])],
+])
+def test_invalid_patch(patches):
+    with pytest.raises(PatchError):
+        apply_line_patch(write_object(TEXT), patches)
+
+
+@pytest.fixture
+def big_file(app, client):
+    app.config.update(EDIT_INLINE_MAX_SIZE=10, EDIT_WINDOW_LINES=4)
+    repo_id = seed_repo(app, {'big.txt': TEXT})
+    login(client, 'owner')
+    return repo_id
+
+
+def test_edit_window_page(client, big_file):
+    page = client.get(f'/repo/{big_file}/edit-file/big.txt?start=3').get_data(as_text=True)
+
+    assert 'line 2\nline 3\nline 4\nline 5' in page
+    assert 'line 6' not in page and 'line 1\n' not in page
+
+
+def test_edit_window_saves_only_the_window(app, client, big_file):
+    response = client.post(f'/repo/{big_file}/edit-file/big.txt', data={
+        'content': 'two\r\nthree', 'base_hash': calculate_file_hash(TEXT),
+        'start': 2, 'end': 6, 'filename': 'big.txt'
+    })
+
+    assert response.status_code == 302
+    expected = TEXT.replace(b'line 2\nline 3\nline 4\nline 5', b'two\nthree')
+    assert read_file_from_repo(big_file, 'big.txt') == expected
+    with app.app_context():
+        assert Commit.query.filter_by(repo_id=big_file).count() == 2
+
+
+def test_edit_window_rejects_stale_base(app, client, big_file):
+    response = client.post(f'/repo/{big_file}/edit-file/big.txt', data={
+        'content': 'lost update', 'base_hash': calculate_file_hash(b'older version'),
+        'start': 0, 'end': 4, 'filename': 'big.txt'
+    }, follow_redirects=True)
+
+    assert 'Файл изменился' in response.get_data(as_text=True)
+    assert read_file_from_repo(big_file, 'big.txt') == TEXT
+    with app.app_context():
+        assert Commit.query.filter_by(repo_id=big_file).count() == 1
+
+
+def test_api_lines_and_patch(app, client, big_file):
+    headers = api_headers(app)
+
+    window = client.get(f'/api/repo/{big_file}/lines/big.txt?start=8&count=100', headers=headers).get_json()
+    assert (window['total_lines'], window['lines']) == (10, ['line 8', 'line 9'])
+
+    body = {'base': window['hash'], 'patches': [{'start': 9, 'end': 10, 'lines': ['last']}]}
+    response = client.post(f'/api/repo/{big_file}/patch/big.txt', json=body, headers=headers)
+    assert response.status_code == 200 and response.get_json()['version'] == 2
+    assert read_file_from_repo(big_file, 'big.txt') == TEXT.replace(b'line 9', b'last')
+
+    # Та же правка поверх устаревшей версии
+    response = client.post(f'/api/repo/{big_file}/patch/big.txt', json=body, headers=headers)
+    assert response.status_code == 409
+
+    body = {'base': response.get_json()['hash'], 'patches': [{'start': 5, 'end': 50}]}
+    assert client.post(f'/api/repo/{big_file}/patch/big.txt', json=body, headers=headers).status_code == 400
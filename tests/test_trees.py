@@ -0,0 +1,65 @@
+from server.storage import write_object
+from server.trees import build_tree, update_tree, read_tree, walk_tree, diff_trees
+
+
+def blob(content):
+    return write_object(content), len(content)
+
+
+def test_tree_hash_does_not_depend_on_order():
+    a, b = blob(b'a'), blob(b'b')
+
+    assert build_tree({'x/a.txt': a, 'b.txt': b}) == build_tree({'b.txt': b, 'x/a.txt': a})
+
+
+def test_update_tree_rewrites_only_changed_folders():
+    old = build_tree({'src/main.py': blob(b'v1'), 'docs/readme.md': blob(b'docs')})
+    new = update_tree(old, {'src/main.py': blob(b'v2')})
+
+    assert read_tree(new)['docs'] == read_tree(old)['docs']
+    assert read_tree(new)['src'] != read_tree(old)['src']
+    assert new == build_tree({'src/main.py': blob(b'v2'), 'docs/readme.md': blob(b'docs')})
+
+
+def test_folder_sizes_and_empty_folders():
+    tree = build_tree({'a/one': blob(b'1'), 'a/two': blob(b'22'), 'b/three': blob(b'333')})
+    assert read_tree(tree)['a']['size'] == 3
+
+    tree = update_tree(tree, {'b/three': None})
+    assert set(read_tree(tree)) == {'a'}
+
+    tree = update_tree(tree, {'a': None})
+    assert read_tree(tree) == {}
+
+
+def test_walk_tree():
+    tree = build_tree({'z.txt': blob(b'z'), 'a/b/c.txt': blob(b'c')})
+
+    assert [path for path, _, _ in walk_tree(tree)] == ['a/b/c.txt', 'z.txt']
+
+
+def test_diff_trees():
+    old = build_tree({
+        'same/file': blob(b'same'),
+        'changed': blob(b'old'),
+        'removed': blob(b'gone'),
+        'becomes_dir': blob(b'file'),
+    })
+    new = build_tree({
+        'same/file': blob(b'same'),
+        'changed': blob(b'new'),
+        'added/deep/file': blob(b'added'),
+        'becomes_dir/inner': blob(b'inner'),
+    })
+
+    changes = {path: (old_entry and old_entry['hash'], new_entry and new_entry['hash'])
+               for path, old_entry, new_entry in diff_trees(old, new)}
+
+    assert changes == {
+        'changed': (blob(b'old')[0], blob(b'new')[0]),
+        'removed': (blob(b'gone')[0], None),
+        'becomes_dir': (blob(b'file')[0], None),
+        'becomes_dir/inner': (None, blob(b'inner')[0]),
+        'added/deep/file': (None, blob(b'added')[0]),
+    }
+    assert list(diff_trees(old, old)) == []
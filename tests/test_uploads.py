@@ -0,0 +1,149 @@
+import hashlib
+import os
+
+import pytest
+
+from server.models import db, UploadSession
+from server.storage import get_uploads_path, object_exists
+from server.utils import get_repo_index, read_file_from_repo
+from tests.conftest import seed_repo, api_headers
+
+CONTENT = os.urandom(3000)
+
+
+@pytest.fixture
+def repo_id(app):
+    return seed_repo(app, {'README.md': b'# project\n'})
+
+
+@pytest.fixture
+def headers(app, repo_id):
+    return api_headers(app)
+
+
+def test_put_file_streams_the_body(app, client, repo_id, headers):
+    response = client.put(f'/api/repo/{repo_id}/files/data/blob.bin', data=CONTENT, headers=headers)
+
+    assert response.status_code == 201
+    assert response.json == {'path': 'data/blob.bin', 'version': 2}
+    with app.app_context():
+        assert get_repo_index(repo_id)['data/blob.bin'] == (hashlib.sha256(CONTENT).hexdigest(), len(CONTENT))
+        assert read_file_from_repo(repo_id, 'data/blob.bin') == CONTENT
+    assert os.listdir(os.path.join('storage', 'objects', 'tmp')) == []
+
+
+def test_put_file_outside_repo(client, repo_id, headers):
+    response = client.put(f'/api/repo/{repo_id}/files/..%2F..%2Fevil.bin', data=b'x', headers=headers)
+
+    assert response.status_code == 400
+    assert not os.path.exists(os.path.join('storage', 'evil.bin'))
+
+
+def start(client, repo_id, headers, size=len(CONTENT)):
+    response = client.post(f'/api/repo/{repo_id}/uploads', json={'path': 'big/file.bin', 'size': size},
+                           headers=headers)
+    assert response.status_code == 201
+    return response.json['upload_id']
+
+
+def put_chunk(client, repo_id, headers, upload_id, start, end):
+    return client.put(f'/api/repo/{repo_id}/uploads/{upload_id}', data=CONTENT[start:end], headers={
+        **headers, 'Content-Range': f'bytes {start}-{end - 1}/{len(CONTENT)}'
+    })
+
+
+def test_resumable_upload(app, client, repo_id, headers):
+    upload_id = start(client, repo_id, headers)
+
+    assert put_chunk(client, repo_id, headers, upload_id, 0, 1000).json['offset'] == 1000
+    # Клиент потерял ответ и спрашивает, откуда продолжить
+    assert client.get(f'/api/repo/{repo_id}/uploads/{upload_id}', headers=headers).json['offset'] == 1000
+    assert put_chunk(client, repo_id, headers, upload_id, 1000, len(CONTENT)).json['offset'] == len(CONTENT)
+
+    response = client.post(f'/api/repo/{repo_id}/uploads/{upload_id}/complete',
+                           json={'sha256': hashlib.sha256(CONTENT).hexdigest()}, headers=headers)
+
+    assert response.status_code == 200
+    assert response.json['version'] == 2
+    assert not os.path.exists(os.path.join(get_uploads_path(), upload_id))
+    with app.app_context():
+        assert read_file_from_repo(repo_id, 'big/file.bin') == CONTENT
+        assert object_exists(hashlib.sha256(CONTENT).hexdigest())
+        assert db.session.get(UploadSession, upload_id) is None
+
+
+def test_chunk_at_wrong_offset_is_rejected(client, repo_id, headers):
+    upload_id = start(client, repo_id, headers)
+    put_chunk(client, repo_id, headers, upload_id, 0, 1000)
+
+    response = put_chunk(client, repo_id, headers, upload_id, 2000, 3000)
+
+    assert response.status_code == 409
+    assert response.json['offset'] == 1000
+
+
+def test_incomplete_upload_cannot_be_completed(client, repo_id, headers):
+    upload_id = start(client, repo_id, headers)
+    put_chunk(client, repo_id, headers, upload_id, 0, 1000)
+
+    response = client.post(f'/api/repo/{repo_id}/uploads/{upload_id}/complete', json={}, headers=headers)
+
+    assert response.status_code == 409
+    assert response.json['offset'] == 1000
+
+
+def test_hash_mismatch_is_rejected(app, client, repo_id, headers):
+    upload_id = start(client, repo_id, headers)
+    put_chunk(client, repo_id, headers, upload_id, 0, len(CONTENT))
+
+    response = client.post(f'/api/repo/{repo_id}/uploads/{upload_id}/complete',
+                           json={'sha256': '0' * 64}, headers=headers)
+
+    assert response.status_code == 422
+    with app.app_context():
+        assert 'big/file.bin' not in get_repo_index(repo_id)
+
+
+def test_cancel_upload(client, repo_id, headers):
+    upload_id = start(client, repo_id, headers)
+    put_chunk(client, repo_id, headers, upload_id, 0, 1000)
+
+    assert client.delete(f'/api/repo/{repo_id}/uploads/{upload_id}', headers=headers).status_code == 204
+    assert not os.path.exists(os.path.join(get_uploads_path(), upload_id))
+    assert client.get(f'/api/repo/{repo_id}/uploads/{upload_id}', headers=headers).status_code == 404
+
+
+def test_upload_path_outside_repo(client, repo_id, headers):
+    response = client.post(f'/api/repo/{repo_id}/uploads', json={'path': '../escape.bin'}, headers=headers)
+
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('size', ['abc', -1, 1.5, True, [3000]])
+def test_invalid_upload_size(client, repo_id, headers, size):
+    response = client.post(f'/api/repo/{repo_id}/uploads', json={'path': 'big/file.bin', 'size': size},
+                           headers=headers)
+
+    assert response.status_code == 400
+
+
+def test_chunk_past_the_declared_size_is_rejected(client, repo_id, headers):
+    upload_id = start(client, repo_id, headers, size=2000)
+    url = f'/api/repo/{repo_id}/uploads/{upload_id}'
+    client.put(url, data=CONTENT[:1500], headers={**headers, 'Content-Range': 'bytes 0-1499/2000'})
+
+    response = client.put(url, data=CONTENT[1500:2500], headers={**headers, 'Content-Range': 'bytes 1500-2499/2000'})
+    assert response.status_code == 416
+    assert response.json['offset'] == 1500
+
+    # Без Content-Range лишние байты тоже не дописываются
+    response = client.put(url, data=CONTENT[1500:2500], headers=headers)
+    assert response.status_code == 416
+    assert response.json['offset'] == 1500
+
+    response = client.put(url, data=CONTENT[1500:2000], headers={**headers, 'Content-Range': 'bytes 1500-1999/3000'})
+    assert response.status_code == 400
+
+    assert client.put(url, data=CONTENT[1500:2000], headers=headers).json['offset'] == 2000
+    response = client.post(f'{url}/complete', json={}, headers=headers)
+    assert response.status_code == 200 and response.json['size'] == 2000
@@ -0,0 +1,106 @@
+import pytest
+from sqlalchemy import event
+
+from server.cache import TTLCache, load_cached_user, get_user_cache
+from server.models import db, User
+from tests.conftest import make_user, login
+
+
+@pytest.fixture
+def statements(app):
+    """SQL-запросы, выполненные за время теста"""
+    executed = []
+
+    def record(conn, cursor, statement, *args):
+        executed.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', record)
+
+
+def test_ttl_cache_expires_and_evicts(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('server.cache.time.monotonic', lambda: now[0])
+    cache = TTLCache(maxsize=2, ttl=10)
+
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+
+    now[0] += 11
+    assert cache.get('a') is None
+
+
+def test_cached_user_skips_the_database(app, statements):
+    with app.app_context():
+        user_id = make_user('alice').id
+
+    with app.app_context():
+        del statements[:]
+        assert load_cached_user(user_id).username == 'alice'
+        assert len(statements) == 1
+
+    with app.app_context():
+        user = load_cached_user(user_id)
+        assert user.username == 'alice'
+        assert user in db.session
+        assert len(statements) == 1
+
+
+def test_changes_to_cached_user_are_saved(app):
+    with app.app_context():
+        user_id = make_user('alice').id
+        load_cached_user(user_id)
+
+    with app.app_context():
+        user = load_cached_user(user_id)
+        user.theme = 'dark'
+        db.session.commit()
+        assert get_user_cache().get(user_id) is None
+
+    with app.app_context():
+        assert load_cached_user(user_id).theme == 'dark'
+        assert db.session.get(User, user_id).theme == 'dark'
+
+
+def test_update_and_delete_invalidate(app):
+    with app.app_context():
+        user_id = make_user('alice').id
+
+    with app.app_context():
+        load_cached_user(user_id)
+        db.session.execute(db.update(User).where(User.id == user_id).values(theme='dark'))
+        db.session.commit()
+        # Массовое обновление мимо ORM кэш не сбрасывает - до TTL
+        assert get_user_cache().get(user_id)['theme'] == 'light'
+
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        user.username = 'alicia'
+        db.session.commit()
+        assert get_user_cache().get(user_id) is None
+        assert load_cached_user(user_id).username == 'alicia'
+
+    with app.app_context():
+        db.session.delete(db.session.get(User, user_id))
+        db.session.commit()
+        assert get_user_cache().get(user_id) is None
+        assert load_cached_user(user_id) is None
+
+
+def test_toggle_theme_updates_cached_user(app, client):
+    with app.app_context():
+        user_id = make_user('alice').id
+    login(client, 'alice')
+    client.get('/about')
+
+    client.get('/toggle-theme')
+
+    with app.app_context():
+        assert get_user_cache().get(user_id) is None
+        assert load_cached_user(user_id).theme == 'dark'
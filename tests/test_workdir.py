@@ -0,0 +1,116 @@
+import hashlib
+import os
+import time
+
+import pytest
+
+from scvp import workdir
+from scvp.workdir import WorkingCopy
+
+PAST = time.time() - 3600
+
+
+@pytest.fixture
+def working_copy(tmp_path):
+    working_copy = WorkingCopy.init(str(tmp_path / 'wc'), 'http://localhost:5000', 1)
+    for path, content in {'a.txt': b'a', 'src/b.py': b'b = 1\n', 'src/c.py': b'c = 2\n'}.items():
+        write(working_copy, path, content)
+    return working_copy
+
+
+def write(working_copy, path, content, mtime=PAST):
+    full_path = os.path.join(working_copy.root, *path.split('/'))
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, 'wb') as f:
+        f.write(content)
+    # Файлы "старые": в кэше они не попадают под правило одновременного изменения
+    os.utime(full_path, (mtime, mtime))
+
+
+@pytest.fixture
+def hashed(monkeypatch):
+    """Пути файлов, хэш которых пересчитывался"""
+    paths = []
+    original = workdir.hash_file
+
+    def counting_hash_file(path):
+        paths.append(os.path.basename(path))
+        return original(path)
+
+    monkeypatch.setattr(workdir, 'hash_file', counting_hash_file)
+    return paths
+
+
+def commit(working_copy):
+    files = working_copy.scan()
+    for path, (content_hash, _) in files.items():
+        working_copy.objects.write_file(os.path.join(working_copy.root, *path.split('/')), content_hash)
+    working_copy.pending = [{'tree': working_copy.objects.build_tree(files), 'message': 'commit'}]
+
+
+def test_second_scan_uses_the_index(working_copy, hashed):
+    first = working_copy.scan()
+    assert sorted(hashed) == ['a.txt', 'b.py', 'c.py']
+
+    hashed.clear()
+    assert working_copy.scan() == first
+    assert hashed == []
+
+
+def test_changed_file_is_rehashed(working_copy, hashed):
+    working_copy.scan()
+    hashed.clear()
+
+    write(working_copy, 'src/b.py', b'b = 100\n', mtime=PAST + 10)
+    files = working_copy.scan()
+
+    assert hashed == ['b.py']
+    assert files['src/b.py'] == (hashlib.sha256(b'b = 100\n').hexdigest(), 8)
+
+
+def test_file_changed_in_the_same_instant_as_the_index_is_rehashed(working_copy, hashed):
+    # Файл записан "сейчас": его mtime не раньше кэша, и изменение того же
+    # размера в ту же единицу времени кэш бы не заметил
+    write(working_copy, 'a.txt', b'x', mtime=time.time() + 5)
+    working_copy.scan()
+    hashed.clear()
+
+    write(working_copy, 'a.txt', b'y', mtime=time.time() + 5)
+
+    assert working_copy.scan()['a.txt'][0] == hashlib.sha256(b'y').hexdigest()
+    assert hashed == ['a.txt']
+
+
+def test_status(working_copy):
+    commit(working_copy)
+    write(working_copy, 'new.txt', b'new')
+    write(working_copy, 'src/b.py', b'changed\n', mtime=PAST + 10)
+    os.remove(os.path.join(working_copy.root, 'src', 'c.py'))
+
+    assert working_copy.status() == (['new.txt'], ['src/b.py'], ['src/c.py'])
+
+
+def test_ignored_files(working_copy):
+    write(working_copy, '.scvpignore', b'*.log\nbuild/*\n')
+    write(working_copy, 'debug.log', b'log')
+    write(working_copy, 'build/out.bin', b'bin')
+    write(working_copy, 'src/trace.log', b'log')
+
+    assert sorted(working_copy.scan()) == ['.scvpignore', 'a.txt', 'src/b.py', 'src/c.py']
+
+
+def test_checkout_updates_the_index(working_copy, hashed):
+    commit(working_copy)
+    old_tree = working_copy.pending[0]['tree']
+    new_tree = working_copy.objects.build_tree({
+        'a.txt': (working_copy.objects.write(b'from server'), 11),
+        'src/b.py': working_copy.scan()['src/b.py'],
+    })
+    hashed.clear()
+
+    assert working_copy.checkout(old_tree, new_tree) == 2
+    files = working_copy.scan()
+
+    assert not os.path.exists(os.path.join(working_copy.root, 'src', 'c.py'))
+    assert files['a.txt'] == (working_copy.objects.write(b'from server'), 11)
+    assert 'a.txt' not in hashed
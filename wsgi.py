@@ -0,0 +1,15 @@
+import os
+
+from server import create_app
+
+# Точка входа для production-сервера (gunicorn, см. gunicorn.conf.py):
+#
+#     gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Приложение создаётся отдельно в каждом рабочем процессе, уже после
+# fork, поэтому соединения с базой, пулы потоков и кэши у процессов свои.
+# Таблицы здесь не создаются - перед первым запуском и после обновления:
+#
+#     flask --app wsgi init-db
+
+app = create_app(os.environ.get('SCVP_CONFIG', 'production'))